@@ -0,0 +1,191 @@
+import asyncio, concurrent.futures, multiprocessing, queue, time
+import sb.analysis, sb.backend, sb.cfg, sb.colors, sb.durations, sb.journal, sb.logging, sb.metrics, sb.profiling, sb.scheduler, sb.tasks, sb.timings, sb.trace
+
+
+
+class Pool:
+    """Execution engine driving all containers from one asyncio event loop.
+
+    Selected by --engine asyncio. Instead of one analyser process per running
+    container, the lifecycles of up to settings.processes containers (create,
+    start, wait, logs and archive, remove) are awaited concurrently in the main
+    process. The blocking calls of the Docker SDK run in a thread pool and
+    share one connection pool. Parsing and classification of the findings run
+    in a small pool of PARSER_PROCESSES processes, routing runs on a single
+    thread that owns the coordinator. Items wait in a sb.scheduler.Queue and
+    are started, by priority, whenever fewer than settings.processes run and
+    their resources are available.
+
+    Same interface as sb.analysis.Pool: run() a batch, close() at the end.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.concurrency = settings.processes
+
+        # start shared logging
+        self.logqueue = queue.SimpleQueue()
+        sb.logging.start(settings.log, settings.overwrite, self.logqueue)
+
+        # one connection for each container lifecycle in flight
+        sb.backend.get(self.settings).connect(max_pool_size=self.concurrency)
+        self.docker_threads = concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="docker")
+
+        # spawn processes (instead of forking), for identical behavior on Linux and MacOS
+        mp = multiprocessing.get_context("spawn")
+        self.parsers = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max(1, min(sb.cfg.PARSER_PROCESSES, self.concurrency)),
+            mp_context=mp, initializer=init_parser, initargs=(settings,))
+
+        # routing decisions are taken one at a time
+        self.router = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="router")
+        self.coordinator = sb.analysis.Coordinator(settings, self.enqueue)
+        self.progress = sb.analysis.Progress(mp, sb.durations.model(settings))
+        self.queue = sb.scheduler.Queue(settings, sb.durations.model(settings), self.concurrency)
+
+        self.loop = None
+
+
+    def run(self, tasks, label=None, extra_messages=None):
+        start_time = time.time()
+
+        # each batch starts with fresh accounting and routing state
+        self.progress.reset(tasks)
+        self.coordinator.scheduled.clear()
+
+        asyncio.run(self._run(tasks))
+        sb.logging.message("Join completed — all tasks finished or accounted for.", "DEBUG")
+
+        sb.analysis.completed(start_time, label, extra_messages, self.logqueue)
+
+
+    async def _run(self, tasks):
+        self.loop = asyncio.get_running_loop()
+        self.pending = 0
+        self.idle = asyncio.Event()
+        # tools with a batch size analyse several contracts per container
+        items = sb.tasks.batches(tasks)
+        self.pending += len(items)
+        self.queue.put_all(items)
+        self._dispatch()
+        if self.pending:
+            await self.idle.wait()
+        self.loop = None
+
+
+    def _spawn(self, item):
+        self.pending += 1
+        self.queue.put(item)
+        self._dispatch()
+
+
+    def _dispatch(self):
+        while True:
+            item = self.queue.pop()
+            if item is None:
+                return
+            self.loop.create_task(self._analyse(item))
+
+
+    def enqueue(self, task):
+        # Called by the coordinator on the routing thread. The task is added to
+        # the loop before the routing call returns, so a batch never ends
+        # while follow-ups are on their way.
+        self.progress.added(task)
+        self.loop.call_soon_threadsafe(self._spawn, task)
+
+
+    async def _analyse(self, item):
+        try:
+            if isinstance(item, sb.tasks.Batch):
+                await self._execute_batch(item)
+            else:
+                await self._execute(item)
+        except Exception as e:
+            sb.logging.message(sb.colors.error(f"While analyzing {item}:\n{e}"), "", self.logqueue)
+        finally:
+            self.queue.release(sb.scheduler.key_of(item))
+            self.pending -= 1
+            if not self.pending:
+                self.idle.set()
+            else:
+                self._dispatch()
+
+
+    async def _execute(self, task):
+        self.progress.started(task, self.logqueue)
+        sb.journal.started(task)
+        try:
+            outcome = await self.loop.run_in_executor(self.docker_threads, sb.trace.call, task, sb.analysis.execute, task, False)
+        except Exception as e:
+            outcome = e
+        await self._conclude(task, outcome)
+
+
+    async def _execute_batch(self, batch):
+        for task in batch.tasks:
+            self.progress.started(task, self.logqueue)
+            sb.journal.started(task)
+        try:
+            outcomes = await self.loop.run_in_executor(self.docker_threads, sb.trace.call, batch, sb.analysis.execute_batch, batch, False)
+        except Exception as e:
+            outcomes = [e] * len(batch.tasks)
+        for task,outcome in zip(batch.tasks, outcomes):
+            await self._conclude(task, outcome)
+
+
+    async def _conclude(self, task, outcome):
+        """Classify the findings of an executed task and route them.
+
+        Errors, unexpected ones included, are reported, and the task is
+        completed and journaled all the same.
+        """
+        loop = self.loop
+        vuln_list = None # unknown, if the task failed
+        run_duration = 0.0
+        timings = sb.timings.collect(task)
+        try:
+            if isinstance(outcome, Exception):
+                raise outcome
+            run_duration,_ = outcome
+            if sb.analysis.needs_findings(task) or self.settings.json or self.settings.sarif:
+                vuln_list, parse_timings = await loop.run_in_executor(self.parsers, sb.analysis.classify, task)
+                sb.timings.add(timings, parse_timings)
+        except Exception as e:
+            run_duration = 0.0
+            sb.logging.message(sb.colors.error(f"While analyzing {task.absfn} with {task.tool.id}:\n{sb.analysis.error_message(e)}"), "", self.logqueue)
+
+        # the routing thread owns the state of the coordinator
+        route_start = time.perf_counter()
+        await loop.run_in_executor(self.router, self.coordinator.complete, task,
+            vuln_list if sb.analysis.needs_findings(task) else None)
+        if task.dynamic:
+            added = await loop.run_in_executor(self.router, self.coordinator.propose, task, vuln_list)
+            sb.logging.message(sb.analysis.executed_message(task, run_duration, added), "INFO")
+        else:
+            sb.logging.message(sb.analysis.executed_message(task, run_duration), "INFO")
+        sb.timings.add(timings, {"route": time.perf_counter() - route_start})
+        # after the follow-ups, and off the event loop, as it waits for the disk
+        status = await loop.run_in_executor(self.router, sb.analysis.finish, task,
+            not isinstance(outcome, Exception), timings)
+        sb.metrics.completed(task.toolid, status, run_duration)
+
+        self.progress.completed(task, run_duration, self.concurrency)
+
+
+    def close(self):
+        try:
+            self.router.shutdown()
+            self.parsers.shutdown()
+            self.docker_threads.shutdown()
+            sb.backend.get(self.settings).shutdown()
+        finally:
+            sb.logging.stop(self.logqueue)
+
+
+
+def init_parser(settings):
+    """Set up a parser process for the tasks of the run."""
+    sb.tasks.bind(settings)
+    sb.trace.attach(settings, "parser")
+    sb.profiling.start(settings.profile, "parser")
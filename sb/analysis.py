@@ -1,6 +1,6 @@
-import multiprocessing, time, datetime, os, subprocess
-import sb.logging, sb.colors, sb.docker, sb.cfg, sb.io, sb.parsing, sb.sarif, sb.errors
-import sb.smartbugs, sb.vulnerability
+import multiprocessing, threading, time, datetime, os, pickle, traceback
+import sb.logging, sb.colors, sb.backend, sb.cfg, sb.io, sb.parsing, sb.sarif, sb.errors
+import sb.smartbugs, sb.vulnerability, sb.tasks, sb.aio, sb.cache, sb.index, sb.journal, sb.durations, sb.scheduler, sb.timings, sb.trace, sb.metrics, sb.profiling
 
 CORE_TOOLS = (
     ("slither", "", "fast"),
@@ -20,7 +20,7 @@ def task_log_dict(task, start_time, duration, exit_code, log, output, docker_arg
             "duration": duration,
             "exit_code": exit_code,
             "logs": sb.cfg.TOOL_LOG if log else None,
-            "output": sb.cfg.TOOL_OUTPUT if output else None},
+            "output": (sb.cfg.TOOL_OUTPUT_DIR if isinstance(output, str) else sb.cfg.TOOL_OUTPUT) if output else None},
         "solc": str(task.solc_version) if task.solc_version else None,
         "tool": task.tool.dict(),
         "tool_args": task.tool_args,
@@ -29,27 +29,51 @@ def task_log_dict(task, start_time, duration, exit_code, log, output, docker_arg
     }
 
 
-def call_reparse(results_directory):
-    try:
-        result = subprocess.run(
-            ["python3", "-m", "sb.reparse", results_directory],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=True,
-            text=True
-        )
-        if result.stderr:
-            sb.logging.message(f"DEBUG Reparse stderr:\n{result.stderr}", "DEBUG")
-    except subprocess.CalledProcessError as e:
-        sb.logging.message(f"[ERROR] Reparse failed: {e.stderr}", "ERROR")
-        return None
+def parse(task, task_log, tool_log, tool_output):
+    """Parse the output of a task in-process.
 
-    parsed_path = os.path.join(results_directory, sb.cfg.PARSER_OUTPUT)
-    if os.path.exists(parsed_path):
-        return sb.io.read_json(parsed_path)
+    The parsed result is written to result.json/result.sarif only if --json or
+    --sarif ask for it; for dynamic routing alone, it is just returned.
+    """
+    with sb.timings.phase("parse"):
+        write_files = task.settings.json or task.settings.sarif
+        try:
+            parsed_result = sb.parsing.parse(task_log, tool_log, tool_output)
+        except Exception as e:
+            if write_files:
+                raise
+            sb.logging.message(f"[ERROR] Parsing of {task.rdir} failed: {e}", "ERROR")
+            return None
+
+        if write_files:
+            sb.io.write_json(os.path.join(task.rdir, sb.cfg.PARSER_OUTPUT), parsed_result)
+            # Format parsed result as sarif
+            if task.settings.sarif:
+                with sb.timings.phase("sarif"):
+                    sarif_result = sb.sarif.sarify(task_log["tool"], parsed_result["findings"])
+                    sb.io.write_json(os.path.join(task.rdir, sb.cfg.SARIF_OUTPUT), sarif_result)
+        sb.index.add_parsed(task, parsed_result, write_files)
+        return parsed_result
 
-    sb.logging.message("Parsed output not found after reparse.", "ERROR")
-    return None
+
+def parse_stored(task):
+    """Parsed output of a task completed earlier, taken from result.json if
+    present, and otherwise parsed from the stored tool output."""
+    fn_parser_output = os.path.join(task.rdir, sb.cfg.PARSER_OUTPUT)
+    if os.path.exists(fn_parser_output):
+        try:
+            return sb.io.read_json(fn_parser_output)
+        except sb.errors.SmartBugsError:
+            pass # parse again
+    fn_tool_log = os.path.join(task.rdir, sb.cfg.TOOL_LOG)
+    try:
+        task_log = sb.io.read_json(os.path.join(task.rdir, sb.cfg.TASK_LOG))
+        tool_log = sb.io.LogLines(fn_tool_log)
+        tool_output = sb.parsing.stored_output(task.rdir)
+    except sb.errors.SmartBugsError as e:
+        sb.logging.message(f"[ERROR] Cannot read results in {task.rdir}: {e}", "ERROR")
+        return None
+    return parse(task, task_log, tool_log, tool_output)
 
 
 def analyze_parsed_results(parsed_output):
@@ -240,7 +264,28 @@ def route_next_tool(vuln_list, task_settings=None, scheduled_tools=None, absfn=N
     return scheduled
 
 
-def execute(task):    
+# files and directories in the result dir of a task
+RESULT_FILES = (sb.cfg.TASK_LOG, sb.cfg.TOOL_LOG, sb.cfg.TOOL_OUTPUT, sb.cfg.TOOL_OUTPUT_DIR, sb.cfg.PARSER_OUTPUT, sb.cfg.SARIF_OUTPUT)
+
+
+def needs_findings(task):
+    """Whether the findings of task are classified, for routing follow-up
+    tools or for comparing near-duplicates with their representative."""
+    return task.dynamic or task.settings.cluster
+
+
+def prepare(task, parse_output=True):
+    """Create the result dir of the task and clear old results.
+
+    Returns:
+        tuple or None: ``(0.0, parsed_result)`` if the task has been completed
+        before and is skipped, None if it needs to be run.
+    """
+    with sb.timings.phase("prepare"):
+        return __prepare(task, parse_output)
+
+
+def __prepare(task, parse_output):
     # create result dir if it doesn't exist
     if not os.path.exists(task.rdir):
         os.makedirs(task.rdir, exist_ok=True)
@@ -258,330 +303,781 @@ def execute(task):
                 and previous.get("tool_args", "") == task.tool_args
             ):
                 sb.logging.message(f"Skipping {task.tool.id} on {task.relfn} (already completed)", "INFO")
-                return 0.0
+                return 0.0, parse_stored(task) if needs_findings(task) and parse_output else None
         except Exception:
             pass  # fallback to running the tool
 
     # === Cleanup old results ===
-    fn_task_log = os.path.join(task.rdir, sb.cfg.TASK_LOG)
-    fn_tool_log = os.path.join(task.rdir, sb.cfg.TOOL_LOG)
-    fn_tool_output = os.path.join(task.rdir, sb.cfg.TOOL_OUTPUT)
-    fn_parser_output = os.path.join(task.rdir, sb.cfg.PARSER_OUTPUT)
-    fn_sarif_output = os.path.join(task.rdir, sb.cfg.SARIF_OUTPUT)
-    for fn in (fn_task_log, fn_tool_log, fn_tool_output, fn_parser_output, fn_sarif_output):
+    for name in RESULT_FILES:
+        fn = os.path.join(task.rdir, name)
         try:
-            os.remove(fn)
-        except Exception:
-            pass
-        if os.path.exists(fn):
+            if name == sb.cfg.TOOL_OUTPUT_DIR and task.tool.output_mount:
+                # written by the container, possibly as another user
+                sb.backend.get(task.settings).remove_output(task)
+            else:
+                sb.io.remove(fn)
+        except sb.errors.SmartBugsError:
             raise sb.errors.SmartBugsError(f"Cannot clear old output {fn}")
 
-    # Docker causes spurious connection errors
-    # Therefore try each tool 3 times before giving up
-    base_tool = task.tool.id.split("-")[0]
-    executed = False
-    tool_duration = 0.0
-    tool_log = tool_output = docker_args = None
+    # === Results of an identical task from an earlier run ===
+    if task.settings.cache and sb.cache.fetch(task):
+        sb.logging.message(f"Reusing cached result of {task.tool.id} for {task.relfn}", "INFO")
+        sb.index.add(task, sb.io.read_json(fn_task_log))
+        parse_now = parse_output and (task.settings.json or task.settings.sarif or needs_findings(task))
+        return 0.0, parse_stored(task) if parse_now else None
+    return None
+
+
+def attempt(base_tool, description, run, retry_delay):
+    """Call run(), retrying on errors after retry_delay seconds.
+
+    Docker causes spurious connection errors.
+    Therefore try each tool 3 times before giving up.
+
+    Returns:
+        tuple: ``(start_time, duration, result of run)``
+    """
     for attempt in range(3):
         now = time.localtime()
         now_str = str(now.tm_hour).zfill(2) + ":" + str(now.tm_min).zfill(2) + ":" + str(now.tm_sec).zfill(2)
-
-        args_message = f"args: {task.tool_args}" if task.tool_args.strip() else "no args"
-        sb.logging.message(f"\033[93mAttempt {attempt+1} of running {base_tool} with {args_message}. Current time: {now_str}\033[0m", "INFO")
+        sb.logging.message(f"\033[93mAttempt {attempt+1} of running {base_tool} with {description}. Current time: {now_str}\033[0m", "INFO")
         try:
             start_time = time.time()                    
-            exit_code,tool_log,tool_output,docker_args = sb.docker.execute(task)                    
-            duration = time.time() - start_time
-            tool_duration += duration
-            executed = True
-
-            sb.logging.message(f"{base_tool} executed in: {tool_duration} seconds with exit code {exit_code}", "INFO")
-            break       
+            result = run()
+            return start_time, time.time() - start_time, result
         
         except sb.errors.SmartBugsError as e:
             sb.logging.message(sb.colors.error(f"Error while running {base_tool}: {e}"), "ERROR")
             if attempt == 2:
                 raise                   
-            sleep_duration = 15
+            sleep_duration = retry_delay
             sb.logging.message(f"\033[93mSleeping for {sleep_duration} seconds before retry...\033[0m", "INFO")
             time.sleep(sleep_duration)    
 
-    if executed:
-        # Check whether result dir is empty,
-        # and if not, whether we are going to overwrite it
-        if os.path.exists(fn_task_log):
-            old = sb.io.read_json(fn_task_log)
-            old_fn = old["filename"]
-            old_toolid = old["tool"]["id"]
-            old_mode = old["tool"]["mode"]
-            old_args = old.get("tool_args", "")
-            if (task.relfn != old_fn 
-                or task.tool.id != old_toolid 
-                or task.tool.mode != old_mode 
-                or task.tool_args != old_args
-            ):
-                raise sb.errors.SmartBugsError(f"Result directory {task.rdir} occupied by another task: ({old_toolid}/{old_mode}, {old_fn})")
 
-        # write result to files
-        task_log = task_log_dict(task, start_time, duration, exit_code, tool_log, tool_output, docker_args)
-        if tool_log:
-            sb.io.write_txt(fn_tool_log, tool_log)
-        if tool_output:
-            sb.io.write_bin(fn_tool_output, tool_output)
+def store(task, start_time, duration, exit_code, tool_log, tool_output, docker_args, parse_output=True):
+    """Write the results of an executed task; returns the parsed result, if parsed."""
+    with sb.timings.phase("store"):
+        task_log = __store(task, start_time, duration, exit_code, tool_log, tool_output, docker_args)
+    if exit_code is None:
+        timed_out.add(task.rdir)
 
-        # Write fn_task_log, to indicate that this task is done
-        sb.io.write_json(fn_task_log, task_log)
-            
-        # Parse output of tool
-        # If parsing fails, run the reparse script; no need to redo the analysis
-        if task.settings.json or task.settings.sarif:
-            parsed_result = sb.parsing.parse(task_log, tool_log, tool_output)
-            sb.io.write_json(fn_parser_output,parsed_result)
+    # Parse output of tool, when needed for output files or routing
+    if parse_output and (task.settings.json or task.settings.sarif or needs_findings(task)):
+        return parse(task, task_log, tool_log, tool_output)
+    return None
 
-            # Format parsed result as sarif
-            if task.settings.sarif:
-                sarif_result = sb.sarif.sarify(task_log["tool"], parsed_result["findings"])
-                sb.io.write_json(fn_sarif_output, sarif_result)
 
-    return tool_duration
+def __store(task, start_time, duration, exit_code, tool_log, tool_output, docker_args):
+    fn_task_log = os.path.join(task.rdir, sb.cfg.TASK_LOG)
+    fn_tool_log = os.path.join(task.rdir, sb.cfg.TOOL_LOG)
+    fn_tool_output = os.path.join(task.rdir, sb.cfg.TOOL_OUTPUT)
 
+    # Check whether result dir is empty,
+    # and if not, whether we are going to overwrite it
+    if os.path.exists(fn_task_log):
+        old = sb.io.read_json(fn_task_log)
+        old_fn = old["filename"]
+        old_toolid = old["tool"]["id"]
+        old_mode = old["tool"]["mode"]
+        old_args = old.get("tool_args", "")
+        if (task.relfn != old_fn 
+            or task.tool.id != old_toolid 
+            or task.tool.mode != old_mode 
+            or task.tool_args != old_args
+        ):
+            raise sb.errors.SmartBugsError(f"Result directory {task.rdir} occupied by another task: ({old_toolid}/{old_mode}, {old_fn})")
+
+    # write result to files
+    task_log = task_log_dict(task, start_time, duration, exit_code, tool_log, tool_output, docker_args)
+    if isinstance(tool_log, list) and tool_log:
+        # streamed logs (sb.io.LogLines) are in place already
+        sb.io.write_txt(fn_tool_log, tool_log)
+    if isinstance(tool_output, bytes):
+        # mounted outputs (a directory) are in place already
+        sb.io.write_bin(fn_tool_output, tool_output)
+
+    # Write fn_task_log, to indicate that this task is done
+    sb.io.write_json(fn_task_log, task_log)
+    sb.index.add(task, task_log)
+
+    # Results of tasks that ran into a timeout or failed to run are not reused
+    if task.settings.cache and exit_code is not None:
+        with sb.timings.phase("cache"):
+            sb.cache.put(task)
+    return task_log
+
+
+def fan_out(task):
+    """Copy the results of task to the result dirs of its duplicates.
+
+    Logs and outputs are hardlinked if possible. The smartbugs.json of a
+    duplicate names its own file, and the analysed one under 'duplicate_of'.
+    """
+    fn_task_log = os.path.join(task.rdir, sb.cfg.TASK_LOG)
+    if not task.duplicates or not os.path.exists(fn_task_log):
+        return
+    with sb.timings.phase("fan_out"):
+        __fan_out(task, fn_task_log)
+
+
+def __fan_out(task, fn_task_log):
+    task_log = sb.io.read_json(fn_task_log)
+    write_files = task.settings.json or task.settings.sarif
+    if write_files:
+        fn_tool_log = os.path.join(task.rdir, sb.cfg.TOOL_LOG)
+        tool_log = sb.io.LogLines(fn_tool_log)
+        tool_output = sb.parsing.stored_output(task.rdir)
+    for absfn,relfn,rdir in task.duplicates:
+        os.makedirs(rdir, exist_ok=True)
+        for fn in RESULT_FILES:
+            sb.io.remove(os.path.join(rdir, fn))
+        for fn in (sb.cfg.TOOL_LOG, sb.cfg.TOOL_OUTPUT):
+            src = os.path.join(task.rdir, fn)
+            if os.path.exists(src):
+                sb.io.link_or_copy(src, os.path.join(rdir, fn))
+        src = os.path.join(task.rdir, sb.cfg.TOOL_OUTPUT_DIR)
+        if os.path.isdir(src):
+            sb.io.link_or_copy_tree(src, os.path.join(rdir, sb.cfg.TOOL_OUTPUT_DIR))
+        duplicate_log = dict(task_log, filename=relfn, duplicate_of=task.relfn)
+        sb.io.write_json(os.path.join(rdir, sb.cfg.TASK_LOG), duplicate_log)
+        duplicate = sb.tasks.Task(absfn, relfn, rdir, task.solc_version, task.solc_path,
+            task.tool, task.settings, task.tool_args, task.timeout)
+        sb.index.add(duplicate, duplicate_log)
+        if write_files:
+            parse(duplicate, duplicate_log, tool_log, tool_output)
+
+
+def execute(task, parse_output=True):
+    """Run the task, unless it has been completed before, and store its results.
 
+    Returns:
+        tuple: ``(duration, parsed_result)``, where ``parsed_result`` is None
+        unless the output was parsed for --json, --sarif or dynamic routing.
+        With ``parse_output`` False, parsing is left to the caller.
+        The durations of the phases are kept for sb.timings.collect.
+    """
+    sb.timings.start()
+    try:
+        outcome = prepare(task, parse_output)
+        if not outcome:
+            base_tool = task.tool.id.split("-")[0]
+            args_message = f"args: {task.tool_args}" if task.tool_args.strip() else "no args"
+            backend = sb.backend.get(task.settings)
+            start_time, tool_duration, (exit_code,tool_log,tool_output,docker_args) = attempt(base_tool, args_message, lambda: backend.execute(task), backend.RETRY_DELAY)
+            sb.logging.message(f"{base_tool} executed in: {tool_duration} seconds with exit code {exit_code}", "INFO")
 
-def analyser(logqueue, taskqueue, tasks_total, tasks_started, tasks_completed, time_completed, scheduled_tools):
-        
-    def pre_analysis():
-        with tasks_started.get_lock():
-            tasks_started_value = tasks_started.value + 1
-            tasks_started.value = tasks_started_value
+            parsed_result = store(task, start_time, tool_duration, exit_code, tool_log, tool_output, docker_args, parse_output)
+            outcome = tool_duration, parsed_result
+
+        fan_out(task)
+        return outcome
+    finally:
+        sb.timings.record(task, sb.timings.stop())
+
+
+def execute_batch(batch, parse_output=True):
+    """Run the tasks of a batch in one container, like execute() each.
+
+    Returns, for each task, ``(duration, parsed_result)`` or the error it
+    raised. The duration of the container, and of its phases, is split
+    evenly among its tasks. Tasks the container did not get to, because of a
+    timeout or failure, are executed on their own.
+    """
+    outcomes = [None] * len(batch.tasks)
+    pending = []
+    for i,task in enumerate(batch.tasks):
+        sb.timings.start()
+        try:
+            outcomes[i] = prepare(task, parse_output)
+            if outcomes[i]:
+                fan_out(task)
+        except Exception as e:
+            outcomes[i] = e
+        sb.timings.record(task, sb.timings.stop())
+        if outcomes[i] is None:
+            pending.append(i)
+
+    results = [None] * len(pending)
+    if len(pending) > 1:
+        tasks = [ batch.tasks[i] for i in pending ]
+        base_tool = tasks[0].tool.id.split("-")[0]
+        backend = sb.backend.get(tasks[0].settings)
+        sb.timings.start()
+        try:
+            start_time, duration, results = attempt(base_tool, f"{len(tasks)} contracts in one container", lambda: backend.execute_batch(tasks), backend.RETRY_DELAY)
+        except sb.errors.SmartBugsError as e:
+            sb.logging.message(sb.colors.error(f"Batch of {base_tool} failed, running its tasks one by one: {e}"), "")
+            container = sb.timings.split(sb.timings.stop(), len(tasks))
+            for task in tasks:
+                sb.timings.record(task, container)
+        else:
+            executed = sum(1 for result in results if result)
+            sb.logging.message(f"{base_tool} executed {executed} of {len(tasks)} contracts in: {duration} seconds", "INFO")
+            container = sb.timings.split(sb.timings.stop(), max(1, executed))
+            for i,result in zip(pending, results):
+                if result:
+                    exit_code,tool_log,tool_output,docker_args = result
+                    sb.timings.start()
+                    try:
+                        outcomes[i] = duration/executed, store(batch.tasks[i], start_time, duration/executed,
+                            exit_code, tool_log, tool_output, docker_args, parse_output)
+                        fan_out(batch.tasks[i])
+                    except Exception as e:
+                        outcomes[i] = e
+                    sb.timings.record(batch.tasks[i], sb.timings.add(sb.timings.stop(), container))
+
+    for i,result in zip(pending, results):
+        if not result:
+            try:
+                outcomes[i] = execute(batch.tasks[i], parse_output)
+            except Exception as e:
+                outcomes[i] = e
+    return outcomes
+
+
+
+class Progress:
+    """Task accounting of a batch, shared by the analysers of a pool.
+
+    The estimated time to completion adds up the expected durations of the
+    remaining tasks, from the duration model (sb.durations). Tasks without
+    history count with the mean duration of the tasks completed so far.
+    """
+
+    def __init__(self, mp, model):
+        self.model = model
+        self.tasks_total = mp.Value('L', 0)
+        self.tasks_started = mp.Value('L', 0)
+        self.tasks_completed = mp.Value('L', 0)
+        self.time_completed = mp.Value('d', 0.0)
+        # expected seconds of the remaining tasks with history, and number of those without
+        self.time_expected = mp.Value('d', 0.0)
+        self.tasks_unknown = mp.Value('L', 0)
+
+
+    def reset(self, tasks):
+        expected = [ self.model.task_expected(task) for task in tasks ]
+        with self.tasks_total.get_lock():
+            self.tasks_total.value = len(tasks)
+        with self.tasks_started.get_lock():
+            self.tasks_started.value = 0
+        with self.tasks_completed.get_lock(), self.time_completed.get_lock():
+            self.tasks_completed.value = 0
+            self.time_completed.value = 0.0
+        with self.time_expected.get_lock(), self.tasks_unknown.get_lock():
+            self.time_expected.value = sum(e for e in expected if e is not None)
+            self.tasks_unknown.value = sum(1 for e in expected if e is None)
+
+
+    def added(self, task):
+        expected = self.model.task_expected(task)
+        with self.tasks_total.get_lock():
+            self.tasks_total.value += 1
+        with self.time_expected.get_lock(), self.tasks_unknown.get_lock():
+            if expected is None:
+                self.tasks_unknown.value += 1
+            else:
+                self.time_expected.value += expected
+
+
+    def started(self, task, logqueue):
+        with self.tasks_started.get_lock():
+            tasks_started_value = self.tasks_started.value + 1
+            self.tasks_started.value = tasks_started_value
         args_str = task.tool_args.strip()
         args_info = f" with args {args_str}" if args_str else " with no args"
         timeout_info = f" and timeout {task.timeout}" if task.timeout else ""
-        count_str = f"{sb.colors.count(tasks_started_value)}/{sb.colors.count(tasks_total.value)}"
+        count_str = f"{sb.colors.count(tasks_started_value)}/{sb.colors.count(self.tasks_total.value)}"
         sb.logging.message(
             f"Starting task {count_str}: {sb.colors.tool(task.tool.id)}{args_info}{timeout_info} on {sb.colors.file(task.relfn)}",
             "", logqueue)
 
-    def post_analysis(duration, no_processes, timeout):
-        with tasks_completed.get_lock(), time_completed.get_lock():
-            tasks_completed_value = tasks_completed.value + 1
-            tasks_completed.value = tasks_completed_value
-            time_completed_value = time_completed.value + duration
-            time_completed.value = time_completed_value
-        # estimated time to completion evaluated as time_so_far / completed_tasks * remaining_tasks / no_processes
-        completed_tasks = tasks_completed_value
-        time_so_far = time_completed_value
-        with tasks_total.get_lock(), tasks_completed.get_lock():
-            remaining_tasks = tasks_total.value - tasks_completed_value
-        if timeout:
-            # Assume that the first round of processes all ran into a timeout
-            sb.logging.message(f"\033[95mConsidering timeout for ETC calculation\033[0m", "INFO")
-            completed_tasks += no_processes
-            time_so_far += timeout*no_processes
-        etc = time_completed_value / completed_tasks * remaining_tasks / no_processes
+
+    def completed(self, task, duration, no_processes):
+        expected = self.model.task_expected(task)
+        with self.tasks_completed.get_lock(), self.time_completed.get_lock():
+            tasks_completed_value = self.tasks_completed.value + 1
+            self.tasks_completed.value = tasks_completed_value
+            time_completed_value = self.time_completed.value + duration
+            self.time_completed.value = time_completed_value
+        with self.time_expected.get_lock(), self.tasks_unknown.get_lock():
+            if expected is None:
+                self.tasks_unknown.value = max(0, self.tasks_unknown.value - 1)
+            else:
+                self.time_expected.value = max(0.0, self.time_expected.value - expected)
+            time_expected = self.time_expected.value
+            tasks_unknown = self.tasks_unknown.value
+        # remaining tasks without history take as long as the average one so far
+        etc = (time_expected + tasks_unknown * time_completed_value / tasks_completed_value) / no_processes
         etc_fmt = datetime.timedelta(seconds=round(etc))
         duration_fmt = datetime.timedelta(seconds=round(duration))
-        sb.logging.message(f"{tasks_completed_value}/{tasks_total.value} completed in {duration_fmt}, ETC {etc_fmt}")
+        sb.logging.message(f"{tasks_completed_value}/{self.tasks_total.value} completed in {duration_fmt}, ETC {etc_fmt}")
+
+
+
+def executed_message(task, run_duration, added=None):
+    args_str = task.tool_args.strip()
+    args_info = f" with args {args_str}" if args_str else ""
+    if added is None:
+        return f"[{task.tool.id}{args_info}] executed in {run_duration}."
+    added_info = ', '.join(f"{t[0]}|{t[1]}" for t in added) if added else 'no tool'
+    return f"[{task.tool.id}{args_info}] executed in {run_duration}, and added {added_info}."
+
+
+
+def analyser(worker, settings, logqueue, taskqueue, done, progress, proposals, replies):
+    # settings are passed once per process, not with every task
+    sb.tasks.bind(settings)
+    sb.trace.attach(settings, f"analyser {worker}")
+    sb.profiling.start(settings.profile, f"analyser{worker}")
+    replies = replies[worker]
 
     while True:
-        task = taskqueue.get()
-        if task is None:
+        item = taskqueue.get()
+        if item is None:
             # Acknowledge the sentinel
+            sb.backend.get(settings).shutdown()
             taskqueue.task_done()
             return
-        sb.logging.quiet = task.settings.quiet
-        pre_analysis()
+        sb.logging.quiet = settings.quiet
+        item_start = time.time()
+        results = []
         try:
-            duration = 0.0
-            run_duration = execute(task)
-            duration += run_duration
-
-            if task.settings.dynamic:
-                # Call reparse after tool execution
-                tool_parsed_output = call_reparse(task.rdir)
-
-                # Analyze the parsed results and select next tool
-                vuln_list = analyze_parsed_results(tool_parsed_output)
-                next_tools = route_next_tool(vuln_list, task.settings, scheduled_tools, task.absfn)
-
-                # Prevent dynamic task duplication
-                new_tool_added = False
-                key_map = getattr(task.settings, "tool_keys", {})
-                if isinstance(key_map, set):
-                    key_map = {task.absfn: key_map}
-                    task.settings.tool_keys = key_map
-                elif not isinstance(key_map, dict):
-                    key_map = {}
-                    task.settings.tool_keys = key_map
-                existing_tool_keys = key_map.setdefault(task.absfn, set())
-                skip_after_no_args = getattr(task.settings, "skip_after_no_args", False)
-                for tool_name, tool_args, timeout in next_tools:
-                    base_name = tool_name.split("-")[0]
-                    tool_key = f"{base_name}|{tool_args.strip()}"
-                    scheduled_keys_for_file = scheduled_tools.get(task.absfn, [])
-                    if skip_after_no_args and (f"{base_name}|" in existing_tool_keys or f"{base_name}|" in scheduled_keys_for_file):
-                        sb.logging.message(f"Routing of {base_name} skipped: previous more complete execution already performed", "DEBUG")
-                        continue
-                    if tool_key in existing_tool_keys or tool_key in scheduled_keys_for_file:
-                        continue
-                    new_task = sb.smartbugs.collect_single_task(
-                        task.absfn, task.relfn, tool_name, task.settings, tool_args, timeout
-                    )
-                    if new_task:
-                        taskqueue.put(new_task)
-                        scheduled_keys_for_file.append(tool_key)
-                        if isinstance(scheduled_tools, list):
-                            scheduled_tools.append(tool_key)
-                        else:
-                            scheduled_tools[task.absfn] = scheduled_keys_for_file
-                        existing_tool_keys.add(tool_key)
-                        new_tool_added = True
-                        with tasks_total.get_lock():
-                            tasks_total.value += 1
-                
-                args_str = task.tool_args.strip()
-                args_info = f" with args {args_str}" if args_str else ""
-                added_info = ', '.join(f"{t[0]}|{t[1]}" for t in next_tools) if next_tools else 'no tool'
-                sb.logging.message(f"[{task.tool.id}{args_info}] executed in {run_duration}, and added {added_info}.", "INFO")
-            else:
-                args_str = task.tool_args.strip()
-                args_info = f" with args {args_str}" if args_str else ""
-                sb.logging.message(f"[{task.tool.id}{args_info}] executed in {run_duration}.", "INFO")
- 
-        except sb.errors.SmartBugsError as e:
-            duration = 0.0
-            sb.logging.message(sb.colors.error(f"While analyzing {task.absfn} with {task.tool.id}:\n{e}"), "", logqueue)
-        
+            # any error of a task is its outcome; the analyser carries on
+            tasks = item.tasks if isinstance(item, sb.tasks.Batch) else (item,)
+            for task in tasks:
+                progress.started(task, logqueue)
+                sb.journal.started(task)
+            try:
+                outcomes = execute_batch(item) if isinstance(item, sb.tasks.Batch) else [ execute(item) ]
+            except Exception as e:
+                outcomes = [ e ] * len(tasks)
+
+            for task,outcome in zip(tasks, outcomes):
+                vuln_list = None # unknown, if the task failed
+                run_duration = 0.0
+                sb.timings.start()
+                with sb.timings.phase("route"):
+                    if isinstance(outcome, Exception):
+                        sb.logging.message(sb.colors.error(f"While analyzing {task.absfn} with {task.tool.id}:\n{error_message(outcome)}"), "", logqueue)
+                    else:
+                        run_duration, tool_parsed_output = outcome
+                        if needs_findings(task):
+                            # Analyze the parsed results, to propose follow-up tools
+                            vuln_list = analyze_parsed_results(tool_parsed_output)
+
+                    if needs_findings(task):
+                        # One message to the coordinator, which replies with the follow-ups
+                        # it accepted and queued; they are queued before this task is done.
+                        proposals.put((worker, task, vuln_list))
+                        added = replies.get()
+                        sb.logging.message(executed_message(task, run_duration, added if task.dynamic else None), "INFO")
+                    else:
+                        proposals.put((None, task, None))
+                        sb.logging.message(executed_message(task, run_duration), "INFO")
+
+                # after the coordinator has recorded the follow-ups
+                timings = sb.timings.add(sb.timings.collect(task), sb.timings.stop())
+                status = finish(task, not isinstance(outcome, Exception), timings)
+                results.append((task.toolid, status, run_duration))
+                progress.completed(task, run_duration, task.settings.processes)
+
         finally:
-            # Ensure core tools are scheduled at least once per contract
-            key_map = getattr(task.settings, "tool_keys", {})
-            if isinstance(key_map, set):
-                key_map = {task.absfn: key_map}
-                task.settings.tool_keys = key_map
-            elif not isinstance(key_map, dict):
-                key_map = {}
-                task.settings.tool_keys = key_map
-
-            scheduled_base_tools = set()
-            key_set = key_map.get(task.absfn, set())
-            scheduled_base_tools.update(k.split("|")[0] for k in key_set)
-
-            file_sched = scheduled_tools.get(task.absfn, [])
-            scheduled_base_tools.update(k.split("|")[0] for k in file_sched)
-
-            if task.settings.dynamic:
-                missing_core_tools = [entry for entry in CORE_TOOLS if entry[0] not in scheduled_base_tools]
-                
-                if not new_tool_added and missing_core_tools:
-                    entry = missing_core_tools[0]
-                    next_tool = entry[0]
-                    next_args = entry[1] if len(entry) > 1 else ""
-                    timeout_label = entry[2] if len(entry) > 2 else None
-                    core_tool_key = f"{next_tool}|{next_args.strip()}"
-                    scheduled_keys_for_file = scheduled_tools.get(task.absfn, [])
-                    if core_tool_key in scheduled_keys_for_file:
-                        continue                   
-                    
-                    # Resolve timeout: prefer label from CORE_TOOLS, else numeric per-tool default
-                    core_timeout = None
-                    if timeout_label:
-                        core_timeout = sb.cfg.TIMEOUTS.get(timeout_label)
-                    if core_timeout is None:
-                        tcfg = sb.cfg.TIMEOUTS.get(next_tool)
-                        if isinstance(tcfg, (int, float)):
-                            core_timeout = tcfg
-                    # In time-budget mode, raise core timeout to at least the budget base
-                    if getattr(task.settings, "time_budget", None) is not None:
-                        base_boost = int(getattr(task.settings, "budget_core_timeout_base", 0) or 0)
-                        if isinstance(core_timeout, (int, float)):
-                            core_timeout = max(int(core_timeout), base_boost)
-                        else:
-                            core_timeout = base_boost if base_boost > 0 else None
-                    new_task = sb.smartbugs.collect_single_task(
-                        task.absfn, task.relfn, next_tool, task.settings, next_args, core_timeout
-                    )
-                    if new_task:
-                        sb.logging.message(f"CORE TOOL ROUTE: SCHEDULING {next_tool}","DEBUG",)
-                        taskqueue.put(new_task)
-                        scheduled_keys_for_file.append(core_tool_key)
-                        if isinstance(scheduled_tools, list):
-                            scheduled_tools.append(core_tool_key)
-                        else:
-                            scheduled_tools[task.absfn] = scheduled_keys_for_file
-                        with tasks_total.get_lock():
-                            tasks_total.value += 1
-                            existing_tool_keys.add(core_tool_key)
-            
-            # Always mark task as complete
+            # Always mark the queued item as complete, and return its resources
+            sb.trace.task_span(item, item_start, time.time() - item_start)
             taskqueue.task_done()
-        
-        
+            done.put((sb.scheduler.key_of(item), results))
 
-        post_analysis(duration, task.settings.processes, task.settings.timeout)
 
 
+def error_message(e):
+    """Text reporting an error of a task; with the traceback if the error is unexpected."""
+    if isinstance(e, sb.errors.SmartBugsError):
+        return str(e)
+    return "".join(traceback.format_exception(type(e), e, e.__traceback__)).rstrip()
 
-def run(tasks, settings, label=None, extra_messages=None):
-    # spawn processes (instead of forking), for identical behavior on Linux and MacOS
-    mp = multiprocessing.get_context("spawn")
 
-    # start shared logging
-    logqueue = mp.Queue()
-    sb.logging.start(settings.log, settings.overwrite, logqueue)
-    try:
-        start_time = time.time()
 
-        # fill task queue using a joinable queue to wait for all tasks
-        taskqueue = mp.JoinableQueue()
+# result dirs of the tasks stored by this process that ran into a timeout, until finished
+timed_out = set()
+
+def finish(task, ok, timings):
+    """Record the timings of a task done in this run, and journal it as finished.
+
+    Returns the status of the task for sb.metrics: ok, failed or timeout.
+    """
+    if ok and "store" in timings:
+        sb.timings.save(task, timings)
+    sb.journal.finished(task, ok, { k: round(v, 6) for k,v in timings.items() })
+    if task.rdir in timed_out:
+        timed_out.discard(task.rdir)
+        return "timeout" if ok else "failed"
+    return "ok" if ok else "failed"
+
+
+
+def classify(task):
+    """Parse the stored results of an executed task and classify its findings.
+
+    Used by engines that execute and parse tasks in different processes.
+    Returns the findings and the durations of the phases.
+    """
+    sb.timings.start()
+    with sb.timings.phase("route"):
+        vuln_list = analyze_parsed_results(parse_stored(task))
+    return vuln_list, sb.timings.stop()
+
+
+
+class Coordinator:
+    """Routing state of a run, owned by the main process.
+
+    Analysers submit the findings of a task as one message. The coordinator
+    decides on follow-up tools against the keys scheduled by all
+    workers and against settings.tool_keys/tool_arg_history (via
+    collect_single_task), queues the accepted tasks and replies with them.
+    A contract thus never gets the same follow-up twice, and routing costs
+    one round trip instead of several proxy calls.
+
+    With --cluster, the coordinator also compares the findings of near-duplicate
+    contracts with those of their representative, tool by tool. A member whose
+    findings diverge is promoted: its deferred tasks are queued, and its
+    findings are routed from then on.
+    """
+
+    def __init__(self, settings, enqueue):
+        self.settings = settings
+        self.enqueue_task = enqueue # callable queueing a task of the current batch
+        self.scheduled = {} # {absfn: {"tool|args", ...}} routed in the current batch
+        self.findings = {} # {(absfn, base tool): {category, ...}} of clustered contracts
+        self.members = {} # {absfn of representative: [absfn of member, ...]}
+        for member,representative in settings.clusters.items():
+            self.members.setdefault(representative, []).append(member)
+        self.promoted = set()
+
+
+    def serve(self, proposals, replies):
+        """Answer the proposals of the analysers, until receiving None."""
+        while True:
+            message = proposals.get()
+            if message is None:
+                return
+            worker, task, vuln_list = message
+            added = []
+            try:
+                self.complete(task, vuln_list)
+                if task.dynamic:
+                    added = self.propose(task, vuln_list)
+            except Exception as e:
+                # the worker waits for a reply in any case
+                sb.logging.message(sb.colors.error(f"Coordination after {task.toolid} on {task.relfn} failed: {error_message(e)}"), "")
+            if worker is not None:
+                replies[worker].put(added)
+
+
+    def complete(self, task, vuln_list=None):
+        """Record the finding categories of a task on a clustered contract, and compare them."""
+        base_name = task.toolid.split("-")[0]
+        if vuln_list is None:
+            return
+        absfn = task.absfn
+        categories = { c for vuln in vuln_list for c in vuln.get("categories", ()) }
+        if absfn in self.settings.clusters:
+            self.findings[(absfn, base_name)] = categories
+            self.compare(absfn, base_name)
+        elif absfn in self.members:
+            self.findings[(absfn, base_name)] = categories
+            for member in self.members[absfn]:
+                self.compare(member, base_name)
+
+
+    def compare(self, member, base_name):
+        """Promote member if its findings by a tool differ from those of its representative."""
+        if member in self.promoted:
+            return
+        own = self.findings.get((member, base_name))
+        representative = self.findings.get((self.settings.clusters[member], base_name))
+        if own is None or representative is None or own == representative:
+            return
+        self.promoted.add(member)
+        deferred = self.settings.deferred.pop(member, [])
+        sb.logging.message(f"Findings of {base_name} on {member} diverge from its cluster, promoting it ({len(deferred)} deferred task(s))", "INFO")
+        sb.trace.instant("promote", {"file": member, "tool": base_name, "deferred": len(deferred)})
+        for task in deferred:
+            self.enqueue(task, f"{task.toolid.split('-')[0]}|{task.tool_args.strip()}")
+
+
+    def propose(self, task, vuln_list):
+        """Route, logging instead of raising errors; returns the accepted follow-ups."""
+        try:
+            added = self.route(task, vuln_list)
+            sb.trace.instant(f"route {task.toolid.split('-')[0]}", {
+                "file": task.relfn,
+                "categories": sorted({ c for vuln in vuln_list or [] for c in vuln.get("categories", []) }),
+                "added": [ f"{tool}|{args.strip()}" for tool,args,_ in added ]})
+            return added
+        except Exception as e:
+            sb.logging.message(sb.colors.error(f"Routing after {task.toolid} on {task.relfn} failed: {e}"), "")
+            return []
+
+
+    def enqueue(self, task, tool_key):
+        self.scheduled.setdefault(task.absfn, set()).add(tool_key)
+        sb.journal.enqueued(self.settings, [task])
+        self.enqueue_task(task)
+
+    def route(self, task, vuln_list):
+        """Queue the follow-up tools for the findings of task; returns the accepted ones."""
+        settings = self.settings
+        absfn = task.absfn
+        if absfn in settings.clusters and absfn not in self.promoted:
+            # near-duplicates follow their representative
+            return []
+        next_tools = route_next_tool(vuln_list, settings, self.scheduled, absfn)
+
+        # Prevent dynamic task duplication
+        added = []
+        existing_tool_keys = settings.tool_keys.setdefault(absfn, set())
+        scheduled_keys_for_file = self.scheduled.get(absfn, set())
+        for tool_name, tool_args, timeout in next_tools:
+            base_name = tool_name.split("-")[0]
+            tool_key = f"{base_name}|{tool_args.strip()}"
+            if settings.skip_after_no_args and (f"{base_name}|" in existing_tool_keys or f"{base_name}|" in scheduled_keys_for_file):
+                sb.logging.message(f"Routing of {base_name} skipped: previous more complete execution already performed", "DEBUG")
+                continue
+            if tool_key in existing_tool_keys or tool_key in scheduled_keys_for_file:
+                continue
+            new_task = sb.smartbugs.collect_single_task(absfn, task.relfn, tool_name, settings, tool_args, timeout)
+            if new_task:
+                self.enqueue(new_task, tool_key)
+                added.append((tool_name, tool_args, timeout))
+        if added:
+            return added
+
+        # Ensure core tools are scheduled at least once per contract
+        scheduled_base_tools = {k.split("|")[0] for k in settings.tool_keys.get(absfn, set())}
+        scheduled_base_tools.update(k.split("|")[0] for k in self.scheduled.get(absfn, set()))
+        missing_core_tools = [entry for entry in CORE_TOOLS if entry[0] not in scheduled_base_tools]
+        if not missing_core_tools:
+            return added
+        entry = missing_core_tools[0]
+        next_tool = entry[0]
+        next_args = entry[1] if len(entry) > 1 else ""
+        timeout_label = entry[2] if len(entry) > 2 else None
+        core_tool_key = f"{next_tool}|{next_args.strip()}"
+        if core_tool_key in self.scheduled.get(absfn, set()):
+            return added
+
+        # Resolve timeout: prefer label from CORE_TOOLS, else numeric per-tool default
+        core_timeout = None
+        if timeout_label:
+            core_timeout = sb.cfg.TIMEOUTS.get(timeout_label)
+        if core_timeout is None:
+            tcfg = sb.cfg.TIMEOUTS.get(next_tool)
+            if isinstance(tcfg, (int, float)):
+                core_timeout = tcfg
+        # In time-budget mode, raise core timeout to at least the budget base
+        if getattr(settings, "time_budget", None) is not None:
+            base_boost = int(getattr(settings, "budget_core_timeout_base", 0) or 0)
+            if isinstance(core_timeout, (int, float)):
+                core_timeout = max(int(core_timeout), base_boost)
+            else:
+                core_timeout = base_boost if base_boost > 0 else None
+        new_task = sb.smartbugs.collect_single_task(absfn, task.relfn, next_tool, settings, next_args, core_timeout)
+        if new_task:
+            sb.logging.message(f"CORE TOOL ROUTE: SCHEDULING {next_tool}","DEBUG",)
+            self.enqueue(new_task, core_tool_key)
+            added.append((next_tool, next_args, core_timeout))
+        return added
 
-        for task in tasks:
-            taskqueue.put(task)
- 
-        # accounting
-        tasks_total = mp.Value('L', len(tasks))
-        tasks_started = mp.Value('L', 0)
-        tasks_completed = mp.Value('L', 0)
-        time_completed = mp.Value('f', 0.0)
 
-        # Use a multiprocessing.Manager for shared dict of scheduled tools per file
-        manager = mp.Manager()
-        scheduled_tools = manager.dict()
 
+class Pool:
+    """Long-lived analysers, started once and fed by consecutive calls to run().
+
+    Starting spawned interpreters, importing the sb modules and setting up the
+    coordinator and the logger is paid once per SmartBugs invocation, instead of
+    once for the core run and once again for every budget batch.
+
+    Tasks wait in a sb.scheduler.Queue. A dispatcher thread moves the item of
+    the highest priority to the task queue whenever an analyser is free and
+    the resources of the item are available, so the analysers pick up items
+    in the order of the --schedule policy. Analysers report the items they
+    are done with, and a reaper thread returns their resources to the queue
+    and counts their tasks for the live metrics (sb.metrics).
+    """
+
+    def __init__(self, settings):
+        # spawn processes (instead of forking), for identical behavior on Linux and MacOS
+        mp = multiprocessing.get_context("spawn")
+        self.processes = settings.processes
+
+        # start shared logging
+        self.logqueue = mp.Queue()
+        sb.logging.start(settings.log, settings.overwrite, self.logqueue)
+
+        # joinable queue, to wait for all tasks of a batch, holding at most one
+        # item per free analyser; the others wait in the scheduler's queue
+        self.taskqueue = mp.JoinableQueue()
+        self.queue = sb.scheduler.Queue(settings, sb.durations.model(settings), self.processes)
+        self.done = mp.SimpleQueue()
+        self.dispatcher = threading.Thread(target=self.dispatch, daemon=True)
+        self.dispatcher.start()
+        self.reaper = threading.Thread(target=self.reap, daemon=True)
+        self.reaper.start()
+
+        # accounting, reset at the start of each batch
+        self.progress = Progress(mp, sb.durations.model(settings))
+
+        # routing proposals from the analysers, and one reply queue per analyser
+        self.proposals = mp.SimpleQueue()
+        replies = [ mp.SimpleQueue() for _ in range(self.processes) ]
+        self.coordinator = Coordinator(settings, self.enqueue)
+        self.coordinator_thread = threading.Thread(target=self.coordinator.serve, args=(self.proposals, replies), name="coordinator", daemon=True)
+        self.coordinator_thread.start()
 
         # start analysers
-        shared = (logqueue, taskqueue, tasks_total, tasks_started, tasks_completed, time_completed, scheduled_tools)
-        analysers = [ mp.Process(target=analyser, args=shared) for _ in range(settings.processes) ]
-        
-        for a in analysers:
+        shared = (settings, self.logqueue, self.taskqueue, self.done, self.progress, self.proposals, replies)
+        self.analysers = [ mp.Process(target=analyser, args=(i,)+shared) for i in range(self.processes) ]
+        for a in self.analysers:
             a.start()
 
-        # wait for all tasks to be marked as done
-        taskqueue.join()
+
+    def dispatch(self):
+        """Hand the next item to the first free analyser, until the queue is closed."""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            self.taskqueue.put(item)
+            self.queue.dispatched()
+
+
+    def reap(self):
+        """Release the items the analysers are done with, and count their
+        tasks for sb.metrics, until receiving None."""
+        while True:
+            message = self.done.get()
+            if message is None:
+                return
+            key, results = message
+            for toolid, status, duration in results:
+                sb.metrics.completed(toolid, status, duration)
+            self.queue.release(key)
+
+
+    def enqueue(self, task):
+        self.queue.put(task)
+        self.progress.added(task)
+
+
+    def run(self, tasks, label=None, extra_messages=None):
+        start_time = time.time()
+
+        # each batch starts with fresh accounting and routing state
+        self.progress.reset(tasks)
+        self.coordinator.scheduled.clear()
+
+        if sb.cfg.DEBUG and tasks:
+            sample = tasks[:100]
+            size = sum(len(pickle.dumps(task)) for task in sample) // len(sample)
+            sb.logging.message(f"Queueing {len(tasks)} tasks, ~{size} bytes pickled per task", "DEBUG")
+
+        # tools with a batch size analyse several contracts per container
+        self.queue.put_all(sb.tasks.batches(tasks))
+
+        # wait for all tasks, including dynamically added ones, to be marked as done.
+        # Follow-ups are queued before the task routing them is done, so the
+        # batch is over once no item was queued while the task queue drained.
+        while True:
+            queued = self.queue.drained()
+            self.taskqueue.join()
+            if self.queue.put_total == queued:
+                break
         sb.logging.message("Join completed — all tasks finished or accounted for.", "DEBUG")
-        
-        # now shut down workers
-        for _ in range(settings.processes):
-            taskqueue.put(None)
-        # wait for analysers to finish
-        for a in analysers:
-            a.join()
-
-        # good bye
-        duration = datetime.timedelta(seconds=round(time.time()-start_time))
-        if label:
-            sb.logging.message(f"{label} completed in {duration}.", "", logqueue)
+
+        completed(start_time, label, extra_messages, self.logqueue)
+
+
+    def close(self):
+        try:
+            # shut down dispatcher and workers
+            self.queue.close()
+            for _ in self.analysers:
+                self.taskqueue.put(None)
+            # wait for analysers to finish
+            for a in self.analysers:
+                a.join()
+            self.proposals.put(None)
+            self.coordinator_thread.join()
+            self.done.put(None)
+            self.reaper.join()
+        finally:
+            sb.logging.stop(self.logqueue)
+
+
+
+def completed(start_time, label, extra_messages, logqueue):
+    """Log the end of a batch."""
+    duration = datetime.timedelta(seconds=round(time.time()-start_time))
+    if label:
+        sb.logging.message(f"{label} completed in {duration}.", "", logqueue)
+    else:
+        sb.logging.message(f"Analysis completed in {duration}.", "", logqueue)
+
+    # Optional extra footer messages to appear in the same logging session
+    if extra_messages:
+        messages = extra_messages if isinstance(extra_messages, (list, tuple)) else [extra_messages]
+        for msg in messages:
+            try:
+                text = msg() if callable(msg) else msg
+            except Exception:
+                text = msg
+            if text:
+                sb.logging.message(str(text), "", logqueue)
+
+
+
+_pool = None
+
+def start(settings):
+    """Start the analyser pool used by all subsequent calls to run()."""
+    global _pool
+    if _pool is None:
+        if settings.engine == "asyncio":
+            _pool = sb.aio.Pool(settings)
         else:
-            sb.logging.message(f"Analysis completed in {duration}.", "", logqueue)
-
-        # Optional extra footer messages to appear in the same logging session
-        if extra_messages:
-            messages = extra_messages if isinstance(extra_messages, (list, tuple)) else [extra_messages]
-            for msg in messages:
-                try:
-                    text = msg() if callable(msg) else msg
-                except Exception:
-                    text = msg
-                if text:
-                    sb.logging.message(str(text), "", logqueue)
+            _pool = Pool(settings)
+        sb.metrics.start(settings, _pool)
+    return _pool
 
+
+def stop():
+    """Shut down the analyser pool, if one is running."""
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        try:
+            pool.close()
+        finally:
+            sb.metrics.stop()
+
+
+def run(tasks, settings, label=None, extra_messages=None):
+    """Execute tasks and return once all of them, including follow-ups, are done.
+
+    Uses the pool started by start(). Without one, a pool is started for this
+    call only.
+    """
+    sb.journal.enqueued(settings, tasks)
+    start_time = time.time()
+    own_pool = _pool is None
+    if own_pool:
+        start(settings)
+    try:
+        _pool.run(tasks, label, extra_messages)
     finally:
-        sb.logging.stop(logqueue)
+        if own_pool:
+            stop()
+        sb.trace.span(label or "Analysis", start_time, time.time() - start_time, {"tasks": len(tasks)}, cat="run")
@@ -0,0 +1,40 @@
+"""Execution backends, selectable with --backend.
+
+A backend is a module providing
+
+    connect(max_pool_size)  prepare for as many concurrent executions
+    shutdown()              release what this process holds
+    is_loaded(image)        whether the image of a tool is available
+    load(image)             make it available
+    image_id(image)         identifies the image, for the result cache
+    execute(task)           exit code (None on timeout), log, output, arguments
+    execute_batch(tasks)    the same for each task, or None if it did not run
+    remove_output(task)     remove the mounted output of an earlier execution
+    RETRY_DELAY             seconds to wait before retrying a failed execution
+
+The backends are
+
+    docker  containers, via the Docker SDK (sb.docker, default)
+    fake    canned logs and outputs of recorded results, with simulated
+            latencies, failures and timeouts (sb.fake), to exercise and
+            benchmark SmartBugs without Docker
+"""
+
+import sb.docker, sb.fake
+
+BACKENDS = {
+    "docker": sb.docker,
+    "fake": sb.fake,
+}
+
+
+
+def get(settings):
+    """The backend module of settings."""
+    return BACKENDS[settings.backend]
+
+
+def check(settings):
+    """Report errors in the configuration of the backend before the analysers start."""
+    if settings.backend == "fake":
+        sb.fake.config(settings)
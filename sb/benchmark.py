@@ -0,0 +1,250 @@
+"""Throughput of the orchestration, with the fake backend (sb.fake) standing in for Docker.
+
+Runs sb.smartbugs.main on N synthetic contracts (random bytecode, so that no
+compiler is needed) in a scratch directory, and reports from the journal of
+the run (sb.journal, sb.timings)
+
+    tasks/s         tasks done per second of wall time
+    overhead/task   time of the worker slots not spent in tasks: collecting
+                    files, assembling tasks, starting the workers, dispatch,
+                    queueing and reporting, per task
+    in-task/task    phases of a task other than the tool running ('wait'):
+                    preparing, storing, parsing, routing
+    routing/task    the 'route' phase: classifying findings, routing follow-ups
+    memory          growth and peak of the resident memory of the main process,
+                    and the peak of the largest worker
+
+Without --fake-config, the tools replay a recorded Mythril result with
+findings that dynamic routing follows up on, without latency. Simulated
+timeouts last the task timeout times --time-scale, which is 0 without
+--latency, so that the benchmark measures the orchestration, not sleeps.
+"""
+
+import argparse, json, os, random, resource, shutil, sys, tempfile, threading, time
+import sb.cfg, sb.errors, sb.io, sb.journal, sb.settings, sb.smartbugs, sb.timings
+
+# recorded result replayed without --fake-config: reentrancy and selfdestruct
+# findings, routed to Mythril's ExternalCalls module and to Maian
+FIXTURE_TOOL = { "id": "mythril-0.24.7", "mode": "bytecode" }
+FIXTURE_ISSUES = [
+    { "title": "External Call To User-Supplied Address", "swc-id": "107", "severity": "Low",
+      "contract": "MAIN", "function": "fallback", "address": 142, "description": "A call to a user-supplied address is executed." },
+    { "title": "Unprotected Selfdestruct", "swc-id": "106", "severity": "High",
+      "contract": "MAIN", "function": "kill()", "address": 311, "description": "Any sender can cause the contract to self-destruct." },
+]
+
+
+
+def contracts(directory, n, seed):
+    """Write n distinct contracts of random bytecode to directory."""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    for i in range(n):
+        code = "6080604052" + rng.randbytes(128).hex()
+        sb.io.write_txt(os.path.join(directory, f"c{i:06}.hex"), code)
+
+
+def fixtures(directory):
+    """Write a results tree with the recorded result of FIXTURE_TOOL to directory."""
+    rdir = os.path.join(directory, FIXTURE_TOOL["id"], "recorded", "fixture.hex")
+    os.makedirs(rdir, exist_ok=True)
+    sb.io.write_txt(os.path.join(rdir, sb.cfg.TOOL_LOG),
+        [ json.dumps({ "error": None, "issues": FIXTURE_ISSUES, "success": True }) ])
+    sb.io.write_json(os.path.join(rdir, sb.cfg.TASK_LOG), {
+        "filename": "fixture.hex",
+        "result": { "duration": 0.0, "exit_code": 1, "logs": sb.cfg.TOOL_LOG, "output": None },
+        "tool": FIXTURE_TOOL,
+    })
+
+
+
+def rss():
+    """Resident memory of this process in bytes, or None if unknown."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def maxrss(who):
+    """Peak resident memory in bytes of this process or its largest child, as getrusage reports it."""
+    return resource.getrusage(who).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+class Memory(threading.Thread):
+    """Samples the resident memory of this process until stopped."""
+
+    def __init__(self, interval=0.5):
+        super().__init__(name="memory", daemon=True)
+        self.interval = interval
+        self.start_rss = rss()
+        self.peak = self.start_rss
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            current = rss()
+            if current is not None:
+                self.peak = max(self.peak, current)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        current = rss()
+        if current is not None:
+            self.peak = max(self.peak, current)
+        return current
+
+
+
+def mb(n):
+    return "?" if n is None else f"{n / 2**20:.1f} MB"
+
+
+def report(settings, wall, start_rss, end_rss, peak_rss):
+    replay = sb.journal.Replay(sb.journal.path(settings))
+    tasks = len(replay.enqueued)
+    if not tasks:
+        raise sb.errors.SmartBugsError("Benchmark: no tasks were run")
+    timed = replay.timings.values()
+    busy = sum(sum(t.values()) for t in timed)
+    in_task = sum(v for t in timed for k,v in t.items() if k != "wait")
+    routing = sum(t.get("route", 0.0) for t in timed)
+    tools = {}
+    for task in replay.enqueued.values():
+        tool = task.toolid.split("-")[0]
+        tools[tool] = tools.get(tool, 0) + 1
+
+    lines = [
+        f"Tasks:          {tasks} ({len(replay.finished)} ok; {', '.join(f'{t} {n}' for t,n in sorted(tools.items()))})",
+        f"Wall time:      {wall:.2f}s with {settings.processes} {'containers' if settings.engine == 'asyncio' else 'processes'} ({settings.engine})",
+        f"Throughput:     {tasks / wall:.1f} tasks/s",
+        f"Overhead/task:  {1000 * max(0.0, settings.processes * wall - busy) / tasks:.2f} ms",
+        f"In-task/task:   {1000 * in_task / tasks:.2f} ms",
+        f"Routing/task:   {1000 * routing / tasks:.3f} ms",
+        f"Memory (main):  {mb(start_rss)} at start, {mb(end_rss)} at end (+{mb(None if None in (start_rss, end_rss) else end_rss - start_rss)}), peak {mb(peak_rss)}",
+        f"Memory (worker): peak {mb(maxrss(resource.RUSAGE_CHILDREN))}",
+    ]
+    summary = sb.timings.summary(settings)
+    if summary:
+        lines.append(summary)
+    return "\n".join(lines)
+
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        prog="benchmark",
+        description="Measure the throughput of SmartBugs' orchestration on synthetic contracts, with the fake backend in place of Docker.")
+    argparser.add_argument("--contracts",
+        type=int,
+        metavar="N",
+        default=10000,
+        help="number of synthetic contracts (default: 10000)")
+    argparser.add_argument("-t", "--tools",
+        nargs="+",
+        metavar="TOOL",
+        default=["mythril"],
+        help="tools to run on each contract (default: mythril)")
+    argparser.add_argument("--processes",
+        type=int,
+        metavar="N",
+        default=os.cpu_count() or 1,
+        help="number of parallel processes, or of concurrent containers for the asyncio engine (default: number of CPUs)")
+    argparser.add_argument("--engine",
+        choices=sb.cfg.ENGINES,
+        default="processes",
+        help="execution engine (default: processes)")
+    argparser.add_argument("--schedule",
+        choices=sb.cfg.SCHEDULES,
+        default="fifo",
+        help="order of the tasks (default: fifo)")
+    argparser.add_argument("--static",
+        action="store_true",
+        help="run the selected tools only, without dynamic routing")
+    argparser.add_argument("--latency",
+        type=float,
+        nargs=2,
+        metavar=("MEDIAN", "SIGMA"),
+        help="log-normal latency of the simulated tools in seconds (default: none)")
+    argparser.add_argument("--failures",
+        type=float,
+        metavar="P",
+        default=0.0,
+        help="share of simulated executions that fail (default: 0)")
+    argparser.add_argument("--timeouts",
+        type=float,
+        metavar="P",
+        default=0.0,
+        help="share of simulated executions that time out (default: 0)")
+    argparser.add_argument("--time-scale",
+        type=float,
+        metavar="F",
+        help="factor applied to the simulated latencies and timeouts (default: 1 with --latency, else 0)")
+    argparser.add_argument("--fake-config",
+        metavar="FILE",
+        help="configuration of the fake backend, replacing --latency, --failures, --timeouts and --time-scale")
+    argparser.add_argument("--seed",
+        type=int,
+        default=0,
+        help="seed of the contracts and of the simulation (default: 0)")
+    argparser.add_argument("--dir",
+        metavar="DIR",
+        help="directory for contracts, results and logs, kept afterwards (default: a temporary one, removed)")
+    argparser.add_argument("--profile",
+        metavar="DIR",
+        help="profile all processes, writing their stats and a summary to DIR")
+    args = argparser.parse_args()
+
+    work = os.path.abspath(args.dir) if args.dir else tempfile.mkdtemp(prefix="sb-benchmark-")
+    try:
+        contracts(os.path.join(work, "contracts"), args.contracts, args.seed)
+        fake_config = args.fake_config
+        if not fake_config:
+            fixtures(os.path.join(work, "fixtures"))
+            fake_config = os.path.join(work, "fake.yaml")
+            time_scale = args.time_scale if args.time_scale is not None else 1.0 if args.latency else 0.0
+            if time_scale < 0:
+                raise sb.errors.SmartBugsError("Benchmark: --time-scale needs to be non-negative")
+            c = { "fixtures": os.path.join(work, "fixtures"), "seed": args.seed,
+                "failures": args.failures, "timeouts": args.timeouts, "time_scale": time_scale }
+            if args.latency:
+                c["latency"] = args.latency
+            sb.io.write_json(fake_config, c) # JSON is YAML
+
+        settings = sb.settings.Settings()
+        settings.update({
+            "files": [ os.path.join(work, "contracts", "*.hex") ],
+            "tools": args.tools,
+            "backend": "fake",
+            "fake_config": fake_config,
+            "processes": args.processes,
+            "engine": args.engine,
+            "schedule": args.schedule,
+            "dynamic": not args.static,
+            "runid": "benchmark",
+            "results": os.path.join(work, "results", "${TOOL}", "${RUNID}", "${FILENAME}"),
+            "log": os.path.join(work, "logs", "${RUNID}.log"),
+            "overwrite": True,
+            "quiet": True,
+            "profile": args.profile,
+        })
+
+        memory = Memory()
+        memory.start()
+        start = time.perf_counter()
+        sb.smartbugs.main(settings)
+        wall = time.perf_counter() - start
+        end_rss = memory.stop()
+        print(report(settings, wall, memory.start_rss, end_rss, memory.peak))
+    except sb.errors.SmartBugsError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if not args.dir:
+            shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
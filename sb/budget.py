@@ -1,5 +1,5 @@
 import math, os, datetime, time
-import sb.analysis, sb.logging, sb.colors, sb.smartbugs, sb.cfg, sb.io
+import sb.analysis, sb.logging, sb.colors, sb.smartbugs, sb.cfg, sb.io, sb.index, sb.durations, sb.trace
 
 def _read_all_tools_alias():
     """Return the list of tool base names declared in tools/all/config.yaml.
@@ -20,17 +20,26 @@ def _read_all_tools_alias():
 def _collect_completed_keys(files, settings):
     """Collect completed tool|args keys per contract from result artifacts.
 
-    Looks for smartbugs.json files under the default results folder and filters
-    entries for the current run id. Returns a mapping {absfn: {"tool|args", …}}.
+    Queries the index of the results tree for the tasks of the current run id
+    if it is complete, and otherwise looks for smartbugs.json files under the
+    results folder. Returns a mapping {absfn: {"tool|args", …}}.
     """
     completed = {}
     # Build relfn -> absfn mapping from provided files list
     rel_to_abs = {rel: abs for (abs, rel) in files}
     runid = getattr(settings, "runid", None)
-    results_root = "results"
+    results_root = sb.index.root(settings) or "results"
     if not runid or not os.path.isdir(results_root):
         return completed
 
+    if sb.index.complete(results_root):
+        for row in sb.index.rows(results_root, where="runid = ?", args=(runid,)):
+            absfn = rel_to_abs.get(row["filename"])
+            if absfn and row["toolid"]:
+                base = row["toolid"].split("-")[0]
+                completed.setdefault(absfn, set()).add(f"{base}|{(row['tool_args'] or '').strip()}")
+        return completed
+
     for root, _dirs, files_ in os.walk(results_root):
         if f"{os.path.sep}{runid}{os.path.sep}" not in (root + os.path.sep):
             continue
@@ -78,7 +87,8 @@ def plan_budget_tasks(files, settings, remaining_seconds):
       order, excluding 'sfuzz' which is used as a final fallback per file.
     - Schedule tasks in a round-robin across files, one tool at a time, until
       the estimated worker-seconds of planned tasks meets or slightly exceeds
-      remaining_seconds * processes.
+      remaining_seconds * processes. A task is estimated by the duration model
+      (sb.durations), or by its timeout if the tool has no history.
     - Per-task timeouts use a fair base slice derived from the remaining time
       and number of files, optionally capped by per-tool numeric TIMEOUTS.
     """
@@ -97,7 +107,9 @@ def plan_budget_tasks(files, settings, remaining_seconds):
     coverage_tools = [t for t in all_tools if t.lower() != "sfuzz"]
 
     # Consider only Solidity files for now
-    files_by_abs = {absfn: relfn for (absfn, relfn) in files if absfn.endswith(".sol")}
+    # Duplicates receive the results of the contract they are identical to
+    duplicate_files = {d_absfn for dups in settings.duplicates.values() for d_absfn, _ in dups}
+    files_by_abs = {absfn: relfn for (absfn, relfn) in files if absfn.endswith(".sol") and absfn not in duplicate_files}
     if not files_by_abs:
         sb.logging.message("No Solidity files eligible for the second phase.", "INFO")
         return []
@@ -180,7 +192,9 @@ def plan_budget_tasks(files, settings, remaining_seconds):
         new_task = sb.smartbugs.collect_single_task(absfn, relfn, tool_name, settings, tool_args="", timeout=eff_timeout)
         if new_task:
             planned.append(new_task)
-            planned_worker_seconds += eff_timeout
+            # Tasks often end before their timeout; count what past runs of the tool took
+            expected = sb.durations.model(settings).task_expected(new_task)
+            planned_worker_seconds += eff_timeout if expected is None else expected
             sb.logging.message(
                 f"[budget] {os.path.basename(absfn)} -> schedule {tool_name} (timeout: {eff_timeout}s)",
                 "INFO",
@@ -254,6 +268,7 @@ def run_budget_phase(files, settings, remaining_seconds, total_start=None):
 
             sb.logging.message(sb.colors.success(
                 f"[budget] Running batch #{batch_no} with {len(tasks)} task(s), time left ~{time_left}s."))
+            sb.trace.instant(f"budget batch {batch_no}", {"tasks": len(tasks), "time_left": time_left}, cat="budget", scope="g")
 
             # Footer to print overall total at the end of this run, if total_start is provided
             extra = None
@@ -267,6 +282,8 @@ def run_budget_phase(files, settings, remaining_seconds, total_start=None):
             sb.analysis.run(tasks, settings, label=f"Second phase (batch {batch_no})", extra_messages=[extra] if extra else None)
             batch_elapsed = int(time.time() - start)
             total_elapsed += batch_elapsed
+            sb.trace.instant(f"budget batch {batch_no} done", {"elapsed": batch_elapsed,
+                "remaining": max(0, remaining - total_elapsed)}, cat="budget", scope="g")
             sb.logging.message(
                 f"[budget] Batch #{batch_no} finished in ~{batch_elapsed}s. Remaining budget: ~{max(0, remaining - total_elapsed)}s.",
                 "INFO",
@@ -0,0 +1,202 @@
+"""Content-addressed cache of tool results, shared across runs (--cache DIR).
+
+An entry holds the smartbugs.json, result.log and result.tar (or the
+directory result.output) of one executed task. It is keyed on everything that
+determines the result: the contents and name of the input file (logs and
+outputs mention the name, which the parsers check), tool id, version and mode,
+the digest of the image, arguments, solc version, timeout and the --main flag.
+On a hit, the files are hardlinked (or copied) into the result directory
+instead of running the tool.
+
+Entries live in DIR/<key[:2]>/<key>. The modification time of an entry is
+its last use; gc() evicts the least recently used entries until the cache
+fits its size limit. Evict offline with
+
+    python -m sb.cache gc DIR [--max-size 10g]
+"""
+
+import argparse, hashlib, os, shutil, sys, tempfile, time
+import sb.backend, sb.cfg, sb.errors, sb.io, sb.utils
+
+# all files of an entry, smartbugs.json being the last one written
+FILES = (sb.cfg.TOOL_LOG, sb.cfg.TOOL_OUTPUT, sb.cfg.TOOL_OUTPUT_DIR, sb.cfg.TASK_LOG)
+
+
+
+# file hashes and image digests are computed once per process
+file_hashes = {}
+image_digests = {}
+
+def file_hash(fn):
+    if fn not in file_hashes:
+        h = hashlib.sha256()
+        with open(fn, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        file_hashes[fn] = h.hexdigest()
+    return file_hashes[fn]
+
+
+def image_digest(image, settings):
+    backend = sb.backend.get(settings)
+    if (backend, image) not in image_digests:
+        try:
+            image_digests[(backend, image)] = backend.image_id(image)
+        except Exception as e:
+            raise sb.errors.SmartBugsError(f"Cache: cannot determine digest of image {image}: {e}")
+    return image_digests[(backend, image)]
+
+
+def key(task):
+    tool = task.tool
+    settings = task.settings
+    timeout = task.timeout or settings.timeout
+    parts = (
+        file_hash(task.absfn),
+        os.path.basename(task.relfn),
+        tool.id,
+        tool.version,
+        tool.mode,
+        image_digest(tool.image, settings),
+        task.tool_args.strip(),
+        str(task.solc_version) if task.solc_version else "",
+        str(timeout or 0),
+        "main" if settings.main else "",
+    )
+    return hashlib.sha256("\0".join(str(p) for p in parts).encode()).hexdigest()
+
+
+def entry(root, k):
+    return os.path.join(root, k[:2], k)
+
+
+
+def fetch(task):
+    """Materialize the cached results of task in its result dir.
+
+    Returns True on a hit. The smartbugs.json of the entry is rewritten for
+    the task, and records the key under 'cache'.
+    """
+    try:
+        k = key(task)
+    except (OSError, sb.errors.SmartBugsError):
+        return False
+    d = entry(task.settings.cache, k)
+    fn_task_log = os.path.join(d, sb.cfg.TASK_LOG)
+    if not os.path.exists(fn_task_log):
+        return False
+    try:
+        task_log = sb.io.read_json(fn_task_log)
+        for fn in FILES[:-1]:
+            src = os.path.join(d, fn)
+            if os.path.isdir(src):
+                sb.io.link_or_copy_tree(src, os.path.join(task.rdir, fn))
+            elif os.path.exists(src):
+                sb.io.link_or_copy(src, os.path.join(task.rdir, fn))
+        os.utime(d)
+    except (OSError, sb.errors.SmartBugsError):
+        # evicted meanwhile, or corrupt
+        return False
+    task_log["filename"] = task.relfn
+    task_log["runid"] = task.settings.runid
+    task_log["cache"] = k
+    sb.io.write_json(os.path.join(task.rdir, sb.cfg.TASK_LOG), task_log)
+    return True
+
+
+def put(task):
+    """Add the results in the result dir of task to the cache."""
+    try:
+        k = key(task)
+    except (OSError, sb.errors.SmartBugsError):
+        return
+    root = task.settings.cache
+    d = entry(root, k)
+    if os.path.exists(d):
+        return
+    os.makedirs(os.path.dirname(d), exist_ok=True)
+    # assemble the entry aside, and publish it atomically
+    tmp = tempfile.mkdtemp(dir=os.path.dirname(d), prefix=".tmp-")
+    try:
+        for fn in FILES:
+            src = os.path.join(task.rdir, fn)
+            if os.path.isdir(src):
+                shutil.copytree(src, os.path.join(tmp, fn), symlinks=True)
+            elif os.path.exists(src):
+                shutil.copyfile(src, os.path.join(tmp, fn))
+        os.rename(tmp, d)
+    except OSError:
+        # another process published the same entry first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+
+def gc(root, max_size):
+    """Evict least recently used entries until the cache holds at most max_size bytes.
+
+    Returns the number of entries and bytes evicted.
+    """
+    entries = []
+    total = 0
+    for prefix in os.listdir(root) if os.path.isdir(root) else []:
+        pdir = os.path.join(root, prefix)
+        if not os.path.isdir(pdir):
+            continue
+        for k in os.listdir(pdir):
+            d = os.path.join(pdir, k)
+            if k.startswith(".tmp-"):
+                # left over by an interrupted put
+                if time.time() - os.path.getmtime(d) > 3600:
+                    shutil.rmtree(d, ignore_errors=True)
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(path, fn)) for path,_,fns in os.walk(d) for fn in fns)
+                entries.append((os.path.getmtime(d), size, d))
+            except OSError:
+                continue
+            total += size
+    entries.sort()
+    evicted = evicted_bytes = 0
+    for _,size,d in entries:
+        if total <= max_size:
+            break
+        shutil.rmtree(d, ignore_errors=True)
+        total -= size
+        evicted += 1
+        evicted_bytes += size
+    return evicted, evicted_bytes
+
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        prog="cache",
+        description="Maintain the SmartBugs result cache.")
+    commands = argparser.add_subparsers(dest="command", metavar="COMMAND")
+    gc_parser = commands.add_parser("gc",
+        help="evict least recently used entries")
+    gc_parser.add_argument("--max-size",
+        type=str,
+        metavar="SIZE",
+        default=sb.cfg.CACHE_SIZE,
+        help=f"size limit, like 512m or 10g (default {sb.cfg.CACHE_SIZE})")
+    gc_parser.add_argument("cache",
+        metavar="DIR",
+        help="cache directory")
+
+    args = argparser.parse_args()
+    if args.command != "gc":
+        argparser.print_help(sys.stderr)
+        sys.exit(1)
+
+    try:
+        evicted, evicted_bytes = gc(args.cache, sb.utils.parse_size(args.max_size))
+    except sb.errors.SmartBugsError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    print(f"{evicted} entries ({evicted_bytes} bytes) evicted")
+
+
+
+if __name__ == '__main__':
+    main()
@@ -10,8 +10,12 @@ TOOL_FINDINGS = "findings.yaml"
 TOOL_PARSER = "parser.py"
 TOOL_LOG = "result.log"
 TOOL_OUTPUT = "result.tar"
+TOOL_OUTPUT_DIR = "result.output"
 PARSER_OUTPUT = "result.json"
 SARIF_OUTPUT = "result.sarif"
+REPARSE_MANIFEST = ".reparse.json"
+RESULTS_INDEX = ".smartbugs.db"
+DURATIONS = ".durations.json"
 
 CPU = cpuinfo.get_cpu_info()
 UNAME = platform.uname()
@@ -26,6 +30,76 @@ PLATFORM = {
 
 DEBUG = False
 
+# Execution engines selectable with --engine
+# - processes: one analyser process per running container (default)
+# - asyncio: one event loop drives all containers; parsing and classification
+#   of findings run in a pool of PARSER_PROCESSES processes
+ENGINES = ("processes", "asyncio")
+PARSER_PROCESSES = 4
+
+# Execution backends selectable with --backend (sb/backend.py)
+# - docker: containers (default)
+# - fake: replays recorded results with simulated latencies and failures,
+#   configured by --fake-config (sb/fake.py)
+BACKENDS = ("docker", "fake")
+
+# Scheduling policies selectable with --schedule (sb/scheduler.py). Without
+# history, a task is expected to take the cost hint of its tool, its timeout
+# or SCHEDULE_COST seconds, for a contract of up to SCHEDULE_SIZE bytes
+SCHEDULES = ("fifo", "lpt", "sjf", "fair")
+SCHEDULE_COST = 60
+SCHEDULE_SIZE = 8192
+
+# Admission of tasks by resources (--resources): CPUs and memory taken by a
+# task of a tool declaring neither 'cpus'/'memory' nor a quota/limit, the
+# share of the host's memory available to containers, and the period Docker
+# divides cpu_quota by
+RESOURCE_CPUS = 1
+RESOURCE_MEMORY = "1g"
+RESOURCE_MEMORY_FRACTION = 0.9
+DOCKER_CPU_PERIOD = 100000
+
+# Clustering of near-duplicate contracts (--cluster, sb/clustering.py):
+# tokens per shingle, bins of the MinHash signature, LSH bands (dividing the
+# bins), and the estimated Jaccard similarity for joining a cluster
+CLUSTER_SHINGLE = 5
+CLUSTER_BINS = 128
+CLUSTER_BANDS = 32
+CLUSTER_THRESHOLD = 0.8
+
+# Name of the directory, below --tmp-dir or the system's temporary directory,
+# holding the tool scripts and compilers mounted read-only at /sb/bin
+STAGING_DIR = "smartbugs-bin"
+
+# Size limits of result.log: the first LOG_HEAD and the last LOG_TAIL bytes
+# of a log are kept, separated by LOG_TRUNCATED. Tools may set their own
+# limits with log_head/log_tail in config.yaml.
+LOG_HEAD = "32m"
+LOG_TAIL = "8m"
+LOG_TRUNCATED = "[SmartBugs: {} bytes of the log omitted]"
+
+# Model of task durations (sb/durations.py): histogram bins per doubling of
+# the duration, and tasks needed before a tool/args/size key is trusted over
+# the coarser ones
+DURATION_BINS = 4
+DURATION_MIN_SAMPLES = 5
+
+# Live metrics (--metrics-port, --metrics-file, sb/metrics.py): seconds between
+# rewrites of the metrics file, and the window of the throughput per tool
+METRICS_INTERVAL = 15
+METRICS_WINDOW = 600
+
+# Functions listed in the summary of the profiles of a run (--profile, sb/profiling.py)
+PROFILE_TOP = 40
+
+# Default size limit of the result cache (--cache, --cache-size)
+CACHE_SIZE = "10g"
+
+# Warm containers (--warm-pool): idle containers kept per image and resource
+# limits, and number of tasks after which a container is replaced
+WARM_POOL_SIZE = 4
+WARM_POOL_MAX_TASKS = 50
+
 # Budget-mode configuration
 # - BUDGET_TARGET_FRACTION: fraction of remaining time the budget orchestrator
 #   aims to utilize when planning follow-up tasks (e.g., 0.8 => ~80%).
@@ -48,7 +48,27 @@ def cli_args(defaults):
     exec.add_argument("--processes",
         type=int,
         metavar="N",
-        help=f"number of parallel processes{fmt_default(defaults.processes)}")
+        help=f"number of parallel processes, or of concurrent containers for the asyncio engine{fmt_default(defaults.processes)}")
+    exec.add_argument("--engine",
+        type=str,
+        choices=sb.cfg.ENGINES,
+        help=f"processes: one process per running container; asyncio: one event loop for all containers{fmt_default(defaults.engine)}")
+    exec.add_argument("--backend",
+        type=str,
+        choices=sb.cfg.BACKENDS,
+        help=f"docker: run the tools in containers; fake: replay recorded results, for testing and benchmarking{fmt_default(defaults.backend)}")
+    exec.add_argument("--fake-config",
+        type=str,
+        metavar="FILE",
+        help=f"YAML file with the fixtures, latencies and failure rates of the fake backend{fmt_default(defaults.fake_config)}")
+    exec.add_argument("--schedule",
+        type=str,
+        choices=sb.cfg.SCHEDULES,
+        help=f"order of the tasks: fifo as collected, lpt longest first, sjf shortest first, fair round robin over the contracts{fmt_default(defaults.schedule)}")
+    exec.add_argument("--resources",
+        action="store_true",
+        default=None,
+        help=f"start tasks only while the CPUs and memory declared by their tools fit into the host's; --processes then only bounds the number of tasks{fmt_default(defaults.resources)}")
     exec.add_argument("--timeout",
         type=int,
         metavar="N",
@@ -69,6 +89,23 @@ def cli_args(defaults):
         action="store_true",
         default=None,
         help=f"disable dynamic scheduling{fmt_default(False)}")
+    exec.add_argument("--tmp-dir",
+        type=str,
+        metavar="DIR",
+        help=f"directory for the files mounted into containers, e.g. on a tmpfs{fmt_default(defaults.tmp_dir)}")
+    exec.add_argument("--cluster",
+        action="store_true",
+        default=None,
+        help=f"analyse near-duplicate contracts with the core tools only, unless their findings diverge from their cluster's representative{fmt_default(defaults.cluster)}")
+    exec.add_argument("--warm-pool",
+        action="store_true",
+        default=None,
+        help=f"keep containers running and execute tasks of the same image in them, for tools declared stateless{fmt_default(defaults.warm_pool)}")
+
+    exec.add_argument("--resume",
+        type=str,
+        metavar="RUNID",
+        help=f"continue the interrupted run RUNID with the tasks its journal lists as unfinished{fmt_default(defaults.resume)}")
 
     output = parser.add_argument_group("output options")
     output.add_argument("--runid",
@@ -83,6 +120,30 @@ def cli_args(defaults):
         type=str,
         metavar="FILE",
         help=f"file for log messages{fmt_default(defaults.log)}")
+    output.add_argument("--trace",
+        type=str,
+        metavar="FILE",
+        help=f"write a timeline of the run (trace event format, for Perfetto or chrome://tracing){fmt_default(defaults.trace)}")
+    output.add_argument("--metrics-port",
+        type=int,
+        metavar="PORT",
+        help=f"serve live metrics in Prometheus format at http://127.0.0.1:PORT/metrics{fmt_default(defaults.metrics_port)}")
+    output.add_argument("--metrics-file",
+        type=str,
+        metavar="FILE",
+        help=f"rewrite FILE with live metrics in Prometheus format every {sb.cfg.METRICS_INTERVAL}s{fmt_default(defaults.metrics_file)}")
+    output.add_argument("--profile",
+        type=str,
+        metavar="DIR",
+        help=f"profile the main process and the workers, writing their stats and a summary to DIR{fmt_default(defaults.profile)}")
+    output.add_argument("--cache",
+        type=str,
+        metavar="DIR",
+        help=f"reuse results of identical tasks from earlier runs, and add new ones{fmt_default(defaults.cache)}")
+    output.add_argument("--cache-size",
+        type=str,
+        metavar="SIZE",
+        help=f"size limit of the cache, like 512m or 10g; least recently used results are evicted{fmt_default(defaults.cache_size)}")
     output.add_argument("--overwrite",
         action="store_true",
         default=None,
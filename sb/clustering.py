@@ -0,0 +1,133 @@
+"""Clustering of near-duplicate Solidity contracts (--cluster).
+
+Forks of a contract often differ only in comments, strings, names and
+constants. After removing comments and strings, identifiers and numbers are
+normalized, and each contract is summarized by a one-permutation MinHash
+signature over its token shingles. Locality-sensitive hashing over bands of
+the signature finds candidate representatives, and a contract joins the most
+similar one if the estimated Jaccard similarity reaches CLUSTER_THRESHOLD.
+Otherwise, it becomes a representative itself.
+"""
+
+import re, zlib
+import sb.cfg, sb.io, sb.solidity
+
+TOKEN = re.compile(r"[A-Za-z_$][A-Za-z0-9_$]*|0[xX][0-9a-fA-F]+|[0-9][0-9_]*(?:\.[0-9]+)?(?:[eE][0-9]+)?"
+    r"|==|!=|<=|>=|&&|\|\||<<|>>|\+\+|--|\+=|-=|=>|\S")
+NUMBER = re.compile(r"[0-9]")
+TYPE = re.compile(r"(u?int|bytes|u?fixed)[0-9x]*")
+
+KEYWORDS = frozenset("""
+    pragma solidity import as from contract interface library abstract is using for
+    function modifier event error struct enum constructor fallback receive
+    public private internal external pure view payable constant immutable override virtual
+    memory storage calldata indexed anonymous returns return if else while do break continue
+    throw emit revert require assert new delete try catch unchecked assembly
+    address bool string byte var mapping true false this super
+    msg block tx now selfdestruct suicide
+    wei gwei finney szabo ether seconds minutes hours days weeks years
+    """.split())
+
+MASK = (1 << 61) - 1
+
+
+
+def tokens(absfn):
+    """Tokens of a contract, with identifiers and numbers normalized."""
+    code = sb.solidity.remove_comments_strings(sb.io.read_lines(absfn))
+    result = []
+    for t in TOKEN.findall(code):
+        if t in KEYWORDS or TYPE.fullmatch(t):
+            result.append(t)
+        elif NUMBER.match(t):
+            result.append("0")
+        elif t[0].isalpha() or t[0] in "_$":
+            result.append("$")
+        else:
+            result.append(t)
+    return result
+
+
+def signature(tokens, bins=None, shingle=None):
+    """One-permutation MinHash of the token shingles; None if too short.
+
+    Each shingle is hashed once; the hash selects a bin and competes for its
+    minimum. Empty bins take the minimum of the next non-empty bin, tagged
+    with the distance, so that sparse signatures remain comparable.
+    """
+    bins = bins or sb.cfg.CLUSTER_BINS
+    shingle = shingle or sb.cfg.CLUSTER_SHINGLE
+    if len(tokens) < shingle:
+        return None
+    ids = [ zlib.crc32(t.encode()) for t in tokens ]
+    minima = [None] * bins
+    for i in range(len(ids) - shingle + 1):
+        # hashes of tuples of ints do not depend on PYTHONHASHSEED
+        h = hash(tuple(ids[i:i+shingle])) & MASK
+        b = h % bins
+        v = h // bins
+        if minima[b] is None or v < minima[b]:
+            minima[b] = v
+    sig = [None] * bins
+    for b in range(bins):
+        for d in range(bins):
+            v = minima[(b+d) % bins]
+            if v is not None:
+                sig[b] = (d, v)
+                break
+    return sig
+
+
+def similarity(sig1, sig2):
+    """Estimated Jaccard similarity of the shingle sets."""
+    return sum(1 for a,b in zip(sig1, sig2) if a == b) / len(sig1)
+
+
+
+def cluster(files):
+    """Cluster near-duplicate contracts.
+
+    Parameters
+    ----------
+    files: list[str]
+        absolute paths of Solidity files, in the order of preference for representatives
+
+    Returns
+    -------
+    dict[str, str]
+        mapping from the absolute path of each member to its representative
+    """
+    rows = sb.cfg.CLUSTER_BINS // sb.cfg.CLUSTER_BANDS
+    buckets = {}     # (band, rows of signature) -> [representative]
+    signatures = {}  # representative -> signature
+    members = {}
+    for absfn in files:
+        try:
+            sig = signature(tokens(absfn))
+        except Exception:
+            sig = None
+        if sig is None:
+            continue
+        keys = [ (i, tuple(sig[i*rows:(i+1)*rows])) for i in range(sb.cfg.CLUSTER_BANDS) ]
+
+        best, best_similarity = None, sb.cfg.CLUSTER_THRESHOLD
+        candidates = { rep for key in keys for rep in buckets.get(key, ()) }
+        for rep in sorted(candidates):
+            s = similarity(sig, signatures[rep])
+            if s >= best_similarity:
+                best, best_similarity = rep, s
+        if best:
+            members[absfn] = best
+        else:
+            signatures[absfn] = sig
+            for key in keys:
+                buckets.setdefault(key, []).append(absfn)
+    return members
+
+
+def write_map(fn, members, relfns):
+    """Write the clusters as {representative: [members]}, with relative paths."""
+    clusters = {}
+    for member,rep in members.items():
+        clusters.setdefault(relfns[rep], []).append(relfns[member])
+    sb.io.write_json(fn, clusters)
@@ -1,16 +1,26 @@
-import docker, os, shutil, tempfile, requests, traceback, json
-import sb.io, sb.errors, sb.cfg
-import sb.logging
+import docker, os, io, hashlib, shutil, tempfile, tarfile, requests, traceback, json, shlex, threading, atexit, fnmatch, collections, time
+import sb.io, sb.errors, sb.cfg, sb.utils
+import sb.logging, sb.timings
 
 
 
+# seconds to wait before retrying a failed execution (sb.analysis.attempt)
+RETRY_DELAY = 15
+
 _client = None
+_max_pool_size = None
+
+def connect(max_pool_size):
+    """Use a client whose connection pool serves max_pool_size concurrent requests."""
+    global _client, _max_pool_size
+    _client, _max_pool_size = None, max_pool_size
+    return client()
 
 def client():
     global _client
     if not _client:
-        try:    
-            _client = docker.from_env()
+        try:
+            _client = docker.from_env(max_pool_size=_max_pool_size) if _max_pool_size else docker.from_env()
             _client.info()
         except Exception:
             details = f"\n{traceback.format_exc()}" if sb.cfg.DEBUG else ""
@@ -44,9 +54,13 @@ def load(image):
 
 
 
-def __docker_volume(task):
-    sbdir = tempfile.mkdtemp()
-    sbdir_bin = os.path.join(sbdir, "bin")
+def image_id(image):
+    """Id (digest) of a local image."""
+    return client().images.get(image).id
+
+
+
+def __docker_contract(task, sbdir):
     if task.tool.mode in ("bytecode","runtime"):
         # sanitize hex code
         code = sb.io.read_lines(task.absfn)
@@ -57,30 +71,198 @@ def __docker_volume(task):
         sb.io.write_txt(os.path.join(sbdir,filename), code)
     else:
         shutil.copy(task.absfn, sbdir)
-    if task.tool.bin:
-        shutil.copytree(task.tool.absbin, sbdir_bin)
-    else:
-        os.mkdir(sbdir_bin)
-    if task.solc_path:
-        sbdir_bin_solc = os.path.join(sbdir_bin, "solc")
-        shutil.copyfile(task.solc_path, sbdir_bin_solc)
+
+
+def __docker_volume(task, sbdir=None):
+    # only the contract is written per task; /sb/bin is a mount point (see stage)
+    if not sbdir:
+        if task.settings.tmp_dir:
+            os.makedirs(task.settings.tmp_dir, exist_ok=True)
+        sbdir = tempfile.mkdtemp(dir=task.settings.tmp_dir)
+    os.makedirs(os.path.join(sbdir, "bin"), exist_ok=True)
+    __docker_contract(task, sbdir)
     return sbdir
 
 
 
+# staged directories by (tool bin dir, solc path), file digests, and staging
+# roots swept, per process
+staged = {}
+file_digests = {}
+swept = set()
+
+def __file_digest(fn):
+    if fn not in file_digests:
+        h = hashlib.sha256()
+        with open(fn, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        file_digests[fn] = h.hexdigest()
+    return file_digests[fn]
+
+
+def __sweep(root):
+    """Remove the partial directories left in root by interrupted stagings."""
+    if root in swept:
+        return
+    swept.add(root)
+    for d in os.listdir(root):
+        d = os.path.join(root, d)
+        try:
+            if os.path.basename(d).startswith(".tmp-") and time.time() - os.path.getmtime(d) > 3600:
+                shutil.rmtree(d, ignore_errors=True)
+        except OSError:
+            pass # removed by another process
+
+
+def stage(task):
+    """Directory holding the tool's scripts and solc, mounted read-only at /sb/bin.
+
+    Staged directories are named by the digest of their contents and shared
+    by all tasks, processes and runs using the same scripts and compiler, so
+    nothing is copied per task. They are kept after the run, one per
+    combination of scripts and compiler, for the next run to reuse; remove
+    STAGING_DIR while no run is active to reclaim the space. Returns None if
+    there is nothing to stage.
+    """
+    tool = task.tool
+    absbin = tool.absbin if tool.bin else None
+    key = (absbin, task.solc_path)
+    if key == (None, None):
+        return None
+    if key not in staged:
+        files = []
+        if absbin:
+            for path,dirs,fns in os.walk(absbin):
+                dirs.sort()
+                for fn in sorted(fns):
+                    files.append((os.path.relpath(os.path.join(path, fn), absbin), os.path.join(path, fn)))
+        if task.solc_path:
+            files.append(("solc", task.solc_path))
+        h = hashlib.sha256()
+        for rel,fn in files:
+            h.update(f"{rel}\0{__file_digest(fn)}\0{os.access(fn, os.X_OK)}\0".encode())
+        root = os.path.join(task.settings.tmp_dir or tempfile.gettempdir(), sb.cfg.STAGING_DIR)
+        d = os.path.join(root, h.hexdigest())
+        if not os.path.isdir(d):
+            os.makedirs(root, exist_ok=True)
+            __sweep(root)
+            tmp = tempfile.mkdtemp(dir=root, prefix=".tmp-")
+            try:
+                os.chmod(tmp, 0o755)
+                if absbin:
+                    shutil.copytree(absbin, tmp, dirs_exist_ok=True)
+                if task.solc_path:
+                    shutil.copyfile(task.solc_path, os.path.join(tmp, "solc"))
+                    os.chmod(os.path.join(tmp, "solc"), 0o755)
+                os.rename(tmp, d)
+            except OSError:
+                # staged by another process meanwhile, or failed
+                shutil.rmtree(tmp, ignore_errors=True)
+                if not os.path.isdir(d):
+                    raise sb.errors.SmartBugsError(f"Docker: cannot stage {absbin} and {task.solc_path} in {root}")
+        staged[key] = d
+    return staged[key]
+
+
+
+def output_dir(task):
+    """Host directory bind-mounted at the output path of a tool with output_mount."""
+    return os.path.join(os.path.abspath(task.rdir), sb.cfg.TOOL_OUTPUT_DIR)
+
+
+def __foreign(root):
+    """Whether root or a file below it belongs to another user than the one running SmartBugs."""
+    uid = os.getuid()
+    if os.lstat(root).st_uid != uid:
+        return True
+    for path,dirs,fns in os.walk(root):
+        for fn in dirs + fns:
+            if os.lstat(os.path.join(path, fn)).st_uid != uid:
+                return True
+    return False
+
+
+def __reclaim(task, root):
+    """Hand the files below root, written by a container running as root, to the user running SmartBugs.
+
+    A short-lived container of the tool's image changes their owner, since
+    the user may not be able to remove them otherwise.
+    """
+    if not hasattr(os, "getuid") or os.getuid() == 0 or not os.path.isdir(root) or not __foreign(root):
+        return
+    try:
+        client().containers.run(
+            image=task.tool.image,
+            entrypoint=["chown", "-R", f"{os.getuid()}:{os.getgid()}", "/reclaim"],
+            volumes={os.path.abspath(root): {"bind": "/reclaim", "mode": "rw"}},
+            user=0,
+            remove=True)
+    except Exception as e:
+        raise sb.errors.SmartBugsError(f"Docker: cannot hand {root} over to the current user.\n{e}")
+
+
+def remove_output(task):
+    """Remove the mounted output left in the result dir of task by an earlier execution."""
+    fn = output_dir(task)
+    __reclaim(task, fn)
+    sb.io.remove(fn)
+
+
+def __prepare_output(task):
+    remove_output(task) # left over by a failed attempt
+    os.makedirs(output_dir(task))
+
+
+def __prune_output(task):
+    """Keep only the files of the mounted output selected by output_include/output_exclude.
+
+    The files are handed over to the current user first. Returns the output
+    directory, or None if no file is left.
+    """
+    tool = task.tool
+    root = output_dir(task)
+    __reclaim(task, root)
+    kept = False
+    for path,dirs,fns in os.walk(root, topdown=False):
+        for fn in fns:
+            absfn = os.path.join(path, fn)
+            relfn = os.path.relpath(absfn, root)
+            if ((tool.output_include and not any(fnmatch.fnmatch(relfn, p) for p in tool.output_include))
+                or (tool.output_exclude and any(fnmatch.fnmatch(relfn, p) for p in tool.output_exclude))):
+                try:
+                    os.remove(absfn)
+                except OSError:
+                    kept = True
+            else:
+                kept = True
+        if path != root:
+            try:
+                os.rmdir(path)
+            except OSError:
+                pass # not empty
+    return root if kept else None
+
+
 def __docker_args(task, sbdir):
-    task.tool = task.tool.__class__.load_configuration(task.tool.id, getattr(task, "metadata", None))
-    
+    tool = task.tool
+
     # Initialize Docker arguments
     args = {
         "volumes": {sbdir: {"bind": "/sb", "mode": "rw"}},
         "detach": True,
         "user": 0,        
     }
+    bindir = stage(task)
+    if bindir:
+        args["volumes"][bindir] = {"bind": "/sb/bin", "mode": "ro"}
+    if tool.output_mount:
+        # the tool writes its output directly into the result dir
+        args["volumes"][output_dir(task)] = {"bind": tool.output.rstrip("/"), "mode": "rw"}
 
     # Assign tool-specific settings
     for k in ("image", "cpu_quota", "mem_limit"):
-        v = getattr(task.tool, k, None)
+        v = getattr(tool, k, None)
         if v is not None:
             args[k] = v
     for k in ("cpu_quota", "mem_limit"):
@@ -103,19 +285,19 @@ def __docker_args(task, sbdir):
 
     # Verify if the tool has a valid command function
     tool_command = None
-    if hasattr(task.tool, "command") and callable(task.tool.command):
+    if hasattr(tool, "command") and callable(tool.command):
         try:
-            tool_command = task.tool.command(filename, timeout, "/sb/bin", main, tool_args)
+            tool_command = tool.command(filename, timeout, "/sb/bin", main, tool_args)
         except Exception as e:
             sb.logging.message(f"ERROR: Failed to generate tool command -> {e}", "ERROR")
 
     # If tool_command is None or empty, check if entrypoint is available
     if not tool_command or tool_command.strip() == "":
-        if hasattr(task.tool, "entrypoint") and task.tool.entrypoint:
-            args["entrypoint"] = task.tool.entrypoint(filename, timeout, "/sb/bin", main, tool_args) 
+        if hasattr(tool, "entrypoint") and tool.entrypoint:
+            args["entrypoint"] = tool.entrypoint(filename, timeout, "/sb/bin", main, tool_args) 
         else:
-            sb.logging.message(f"ERROR: No valid command or entrypoint found for tool {task.tool.id}", "ERROR")
-            raise sb.errors.SmartBugsError(f"Invalid execution setup for tool {task.tool.id}")
+            sb.logging.message(f"ERROR: No valid command or entrypoint found for tool {tool.id}", "ERROR")
+            raise sb.errors.SmartBugsError(f"Invalid execution setup for tool {tool.id}")
 
     # Assign the tool command if present
     if tool_command:
@@ -126,47 +308,525 @@ def __docker_args(task, sbdir):
 
 
 
-def execute(task):
-    sbdir = __docker_volume(task)
-    args = __docker_args(task, sbdir)
+def log_writer(task, fn=None):
+    """Writer of the log of task to result.log, keeping its head and tail."""
+    tool = task.tool
+    head = tool.log_head or sb.utils.parse_size(sb.cfg.LOG_HEAD)
+    tail = tool.log_tail or sb.utils.parse_size(sb.cfg.LOG_TAIL)
+    fn = fn or os.path.join(task.rdir, sb.cfg.TOOL_LOG)
+    return sb.io.CappedWriter(fn, head, tail, sb.cfg.LOG_TRUNCATED)
 
-    exit_code,logs,output,container = None,[],None,None
+
+def log_lines(task):
+    """Lines of result.log of task, read lazily; an empty log is removed."""
+    fn = os.path.join(task.rdir, sb.cfg.TOOL_LOG)
     try:
+        if os.path.getsize(fn) == 0:
+            os.remove(fn)
+    except OSError:
+        pass
+    return sb.io.LogLines(fn)
+
+
+def error_lines(logs, n=100):
+    """The last n lines of a log, for error messages."""
+    return "\n".join(collections.deque(logs, maxlen=n))
+
+
+class LogCapture:
+    """Copies a log stream of the Docker API to a writer, while the container runs.
+
+    The chunks are written as they arrive, by a background thread, so a
+    verbose tool costs disk space (within the limits of the writer) instead
+    of memory.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.stream = None
+        self.thread = None
+
+    def start(self, stream):
+        self.stream = stream
+        self.thread = threading.Thread(target=self.copy, daemon=True)
+        self.thread.start()
+
+    def copy(self):
         try:
-            container = client().containers.run(**args)
+            for chunk in self.stream:
+                self.writer.write(chunk)
+        except Exception:
+            pass # stream closed
+
+    def join(self, timeout=None):
+        """Wait for the end of the stream; returns False on timeout."""
+        if self.thread:
+            self.thread.join(timeout)
+            return not self.thread.is_alive()
+        return True
+
+    def close(self):
+        """Stop copying, and close the writer."""
+        if self.writer is None:
+            return
+        if not self.join(10):
+            try:
+                self.stream.close()
+            except Exception:
+                pass
+            self.join(1)
+        writer, self.writer = self.writer, None
+        writer.close()
+
+
+
+image_configs = {}
+
+def image_config(image):
+    """Entrypoint and command of an image, as a container created without overrides would run them."""
+    if image not in image_configs:
+        try:
+            config = client().images.get(image).attrs.get("Config") or {}
         except Exception as e:
-            print(f"ERROR: Failed to start Docker container -> {e}")
-            raise
+            raise sb.errors.SmartBugsError(f"Docker: inspecting image {image} failed.\n{e}")
+        image_configs[image] = (config.get("Entrypoint") or [], config.get("Cmd") or [])
+    return image_configs[image]
+
+
+def __command_line(args):
+    """The argv that 'docker run' with args would execute in the container."""
+    entrypoint, command = args.get("entrypoint"), args.get("command")
+    entrypoint = shlex.split(entrypoint) if isinstance(entrypoint, str) else entrypoint
+    command = shlex.split(command) if isinstance(command, str) else command
+    if entrypoint:
+        return entrypoint + (command or [])
+    image_entrypoint, image_command = image_config(args["image"])
+    return image_entrypoint + (command or image_command)
+
+
+
+class WarmUnavailable(Exception):
+    pass
+
+class WarmContainer:
+    """Long-lived container executing one task after the other via exec.
+
+    The host directory mounted at /sb is refilled for every task, so tools
+    see the same layout as in a fresh container. The staged directory mounted
+    at /sb/bin is part of the key of the container.
+    """
+
+    KEEPALIVE = ["tail", "-f", "/dev/null"]
+
+    def __init__(self, key, tmp_dir=None):
+        image, cpu_quota, mem_limit, bindir = key
+        self.key = key
+        self.tasks = 0
+        if tmp_dir:
+            os.makedirs(tmp_dir, exist_ok=True)
+        self.sbdir = tempfile.mkdtemp(dir=tmp_dir)
+        os.mkdir(os.path.join(self.sbdir, "bin"))
+        args = {
+            "image": image,
+            "entrypoint": WarmContainer.KEEPALIVE,
+            "volumes": {self.sbdir: {"bind": "/sb", "mode": "rw"}},
+            "detach": True,
+            "user": 0,
+        }
+        if bindir:
+            args["volumes"][bindir] = {"bind": "/sb/bin", "mode": "ro"}
+        if cpu_quota is not None:
+            args["cpu_quota"] = cpu_quota
+        if mem_limit is not None:
+            args["mem_limit"] = mem_limit
+        try:
+            self.container = client().containers.run(**args)
+        except Exception as e:
+            shutil.rmtree(self.sbdir, ignore_errors=True)
+            raise WarmUnavailable(e)
+
+
+    def clear(self):
+        for entry in os.listdir(self.sbdir):
+            if entry == "bin":
+                # mount point of the staged directory
+                continue
+            fn = os.path.join(self.sbdir, entry)
+            if os.path.isdir(fn) and not os.path.islink(fn):
+                shutil.rmtree(fn)
+            else:
+                os.remove(fn)
+
+
+    def exec(self, argv, timeout, capture):
+        """Run argv in the container, streaming its log to capture; returns the exit code (None on timeout)."""
+        api = client().api
         try:
-            wait_timeout = task.timeout if getattr(task, "timeout", None) not in (None, 0) else task.settings.timeout
-            result = container.wait(timeout=wait_timeout)
-            exit_code = result["StatusCode"]
-        except (requests.exceptions.ReadTimeout,requests.exceptions.ConnectionError):
+            exec_id = api.exec_create(self.container.id, argv, user="0")["Id"]
+        except docker.errors.APIError as e:
+            # e.g. the image has no 'tail' and the container exited
+            raise WarmUnavailable(e)
+        self.tasks += 1
+        capture.start(api.exec_start(exec_id, stream=True))
+        if not capture.join(timeout or None):
+            # timeout: killing the container ends the exec, the container is recycled
+            self.remove()
+            capture.join(10)
+            return None
+        return api.exec_inspect(exec_id).get("ExitCode")
+
+
+    def reset(self, output):
+        """Remove what the last task left in /sb and at the tool's output path."""
+        self.clear()
+        if output:
+            client().api.exec_start(client().api.exec_create(self.container.id, ["rm", "-rf", output], user="0")["Id"])
+
+
+    def remove(self):
+        for action in (self.container.kill, self.container.remove):
             try:
-                container.stop(timeout=10)
-            except docker.errors.APIError:
+                action()
+            except Exception:
                 pass
-        logs = container.logs().decode("utf8").splitlines()
-        if task.tool.output:
+        shutil.rmtree(self.sbdir, ignore_errors=True)
+
+
+
+class WarmPool:
+    """Idle warm containers, per image and resource limits.
+
+    At most sb.cfg.WARM_POOL_SIZE idle containers are kept per key; a container
+    is recycled after sb.cfg.WARM_POOL_MAX_TASKS tasks or after a failure.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.idle = {}
+        self.cold = set() # images that cannot be kept warm
+        atexit.register(self.shutdown)
+
+
+    def acquire(self, key, tmp_dir=None):
+        with self.lock:
+            if key[0] in self.cold:
+                raise WarmUnavailable(key[0])
+            idle = self.idle.get(key)
+            if idle:
+                return idle.pop()
+        return WarmContainer(key, tmp_dir)
+
+
+    def release(self, warm, ok):
+        if ok and warm.tasks < sb.cfg.WARM_POOL_MAX_TASKS:
+            with self.lock:
+                idle = self.idle.setdefault(warm.key, [])
+                if len(idle) < sb.cfg.WARM_POOL_SIZE:
+                    idle.append(warm)
+                    return
+        warm.remove()
+
+
+    def mark_cold(self, image):
+        with self.lock:
+            self.cold.add(image)
+
+
+    def shutdown(self):
+        with self.lock:
+            idle, self.idle = self.idle, {}
+        for containers in idle.values():
+            for warm in containers:
+                warm.remove()
+
+warm_pool = WarmPool()
+
+def shutdown():
+    """Remove the idle warm containers of this process."""
+    warm_pool.shutdown()
+
+
+
+def __execute_warm(task):
+    with sb.timings.phase("volume"):
+        args = __docker_args(task, None)
+        bindir = stage(task)
+    key = (args["image"], args.get("cpu_quota"), args.get("mem_limit"), bindir)
+    with sb.timings.phase("run"):
+        warm = warm_pool.acquire(key, task.settings.tmp_dir)
+    ok = False
+    capture = LogCapture(log_writer(task))
+    try:
+        with sb.timings.phase("volume"):
+            warm.clear()
+            __docker_volume(task, warm.sbdir)
+        args["volumes"] = {warm.sbdir: {"bind": "/sb", "mode": "rw"}}
+        if bindir:
+            args["volumes"][bindir] = {"bind": "/sb/bin", "mode": "ro"}
+        argv = __command_line(args)
+        wait_timeout = task.timeout if getattr(task, "timeout", None) not in (None, 0) else task.settings.timeout
+        with sb.timings.phase("wait"):
+            exit_code = warm.exec(argv, wait_timeout, capture)
+        with sb.timings.phase("logs"):
+            capture.close()
+            logs = log_lines(task)
+        output = None
+        if exit_code is not None and task.tool.output:
+            with sb.timings.phase("output"):
+                try:
+                    output,_ = warm.container.get_archive(task.tool.output)
+                    output = b''.join(output)
+                except docker.errors.NotFound:
+                    pass
+        if exit_code is not None:
+            with sb.timings.phase("remove"):
+                warm.reset(task.tool.output)
+            # docker/signal exit codes indicate a broken container
+            ok = exit_code < 125
+        return exit_code, logs, output, args
+    except WarmUnavailable:
+        raise
+    except Exception as e:
+        raise sb.errors.SmartBugsError(f"Docker execution in warm container failed for {task.tool.id}\nError: {e}")
+    finally:
+        capture.close()
+        with sb.timings.phase("remove"):
+            warm_pool.release(warm, ok)
+
+
+
+def execute(task):
+    """Run task in a container.
+
+    Returns exit code (None on timeout), the log (the lines of result.log,
+    read lazily), output and the arguments of the container. The output is the tar archive of the tool's output path
+    as bytes or, for tools with output_mount, the directory it was written to.
+    """
+    # only tools leaving no state outside /sb and their output path share a
+    # container; the mounts of a warm container are fixed, so mounted outputs
+    # need a fresh one
+    if task.settings.warm_pool and task.tool.stateless and not task.tool.output_mount:
+        try:
+            return __execute_warm(task)
+        except WarmUnavailable as e:
+            image = task.tool.image
+            warm_pool.mark_cold(image)
+            sb.logging.message(f"Docker: cannot keep {image} warm, using fresh containers ({e})", "INFO")
+    with sb.timings.phase("volume"):
+        sbdir = __docker_volume(task)
+        args = __docker_args(task, sbdir)
+        if task.tool.output_mount:
+            __prepare_output(task)
+
+    exit_code,logs,output,container = None,[],None,None
+    capture = LogCapture(log_writer(task))
+    try:
+        with sb.timings.phase("run"):
             try:
-                output,_ = container.get_archive(task.tool.output)
-                output = b''.join(output)
-            except docker.errors.NotFound:
-                pass
+                container = client().containers.run(**args)
+            except Exception as e:
+                print(f"ERROR: Failed to start Docker container -> {e}")
+                raise
+            capture.start(container.logs(stream=True, follow=True))
+        with sb.timings.phase("wait"):
+            try:
+                wait_timeout = task.timeout if getattr(task, "timeout", None) not in (None, 0) else task.settings.timeout
+                result = container.wait(timeout=wait_timeout)
+                exit_code = result["StatusCode"]
+            except (requests.exceptions.ReadTimeout,requests.exceptions.ConnectionError):
+                try:
+                    container.stop(timeout=10)
+                except docker.errors.APIError:
+                    pass
+        with sb.timings.phase("logs"):
+            capture.close()
+            logs = log_lines(task)
+        with sb.timings.phase("output"):
+            if task.tool.output_mount:
+                output = __prune_output(task)
+            elif task.tool.output:
+                try:
+                    output,_ = container.get_archive(task.tool.output)
+                    output = b''.join(output)
+                except docker.errors.NotFound:
+                    pass
 
     except Exception as e:
-        logs = container.logs().decode("utf8").splitlines() if container else []
-        raise sb.errors.SmartBugsError(f"Docker execution failed for {task.tool.id}\nError: {e}\nLogs:\n" + "\n".join(logs))
+        capture.close()
+        raise sb.errors.SmartBugsError(f"Docker execution failed for {task.tool.id}\nError: {e}\nLogs:\n" + error_lines(log_lines(task)))
 
     finally:
-        try:
-            container.kill()
-        except Exception as e:
-            pass
-        try:
-            container.remove()
-        except Exception:
-            pass
-        shutil.rmtree(sbdir)
+        with sb.timings.phase("remove"):
+            try:
+                container.kill()
+            except Exception as e:
+                pass
+            try:
+                container.remove()
+            except Exception:
+                pass
+            capture.close()
+            shutil.rmtree(sbdir)
 
     return exit_code, logs, output, args
+
+
+
+BATCH_BEGIN = "SMARTBUGS-BATCH-BEGIN"
+BATCH_END = "SMARTBUGS-BATCH-END"
+BATCH_SCRIPT = ".batch.sh"
+BATCH_OUTPUT = ".output"
+BATCH_TIMEOUT = 124 # exit code of timeout(1) when the command timed out
+
+def __batch_script(tasks, sbdir):
+    """Shell script running the command line of each task in turn.
+
+    The log of each contract is enclosed in begin/end markers, the latter with
+    the exit code. Each command line is stopped after the task timeout, by
+    timeout(1) if the image has it. The tool output is moved to
+    /sb/.output/<i> after each contract, so the next one starts from a clean
+    slate.
+    """
+    output = tasks[0].tool.output
+    timeout = tasks[0].timeout or tasks[0].settings.timeout
+    lines = ["#!/bin/sh"]
+    if timeout:
+        lines.append(f"if command -v timeout >/dev/null 2>&1; then TIMEOUT='timeout {int(timeout)}'; else TIMEOUT=''; fi")
+    for i,task in enumerate(tasks):
+        argv = __command_line(__docker_args(task, sbdir))
+        lines.append(f"echo '{BATCH_BEGIN} {i}'")
+        lines.append(f"{'$TIMEOUT ' if timeout else ''}{shlex.join(argv)} 2>&1")
+        lines.append(f"echo '{BATCH_END} {i}' $?")
+        if output:
+            out_i = shlex.quote(f"/sb/{BATCH_OUTPUT}/{i}")
+            lines.append(f"if [ -e {shlex.quote(output)} ]; then mkdir -p {out_i}; mv {shlex.quote(output)} {out_i}/; fi")
+    return "\n".join(lines) + "\n"
+
+
+def __batch_output(sbdir, i, output):
+    """Tool output of the i-th contract, as tar archive like get_archive returns it."""
+    name = os.path.basename(output.rstrip("/"))
+    fn = os.path.join(sbdir, BATCH_OUTPUT, str(i), name)
+    if not os.path.exists(fn):
+        return None
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        tar.add(fn, arcname=name)
+    return buffer.getvalue()
+
+
+class BatchLog:
+    """Splits the log stream of a batch container at the markers of the batch script.
+
+    The lines of each contract go to the result.log of its task as they
+    arrive, each log with the limits of a task run on its own. Lines outside
+    the markers are discarded.
+    """
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.pending = b""
+        self.current = None
+        self.writer = None
+        self.exit_codes = {} # {index of task: exit code}, for the tasks that began
+
+    def write(self, chunk):
+        self.pending += chunk
+        *lines, self.pending = self.pending.split(b"\n")
+        for line in lines:
+            self.line(line + b"\n")
+        if self.writer and len(self.pending) > self.writer.tail:
+            # a long line without end, markers are never that long
+            self.writer.write(self.pending)
+            self.pending = b""
+
+    def line(self, line):
+        marker = line.split()
+        if len(marker) >= 2 and marker[0] in (BATCH_BEGIN.encode(), BATCH_END.encode()) and marker[1].isdigit():
+            i = int(marker[1])
+            if marker[0] == BATCH_BEGIN.encode() and i < len(self.tasks):
+                self.end()
+                self.current = i
+                self.writer = log_writer(self.tasks[i])
+                self.exit_codes[i] = None
+            elif i == self.current:
+                self.end()
+                self.exit_codes[i] = int(marker[2]) if len(marker) > 2 and marker[2].isdigit() else None
+        elif self.writer:
+            self.writer.write(line)
+
+    def end(self):
+        if self.writer:
+            self.writer.close()
+        self.current, self.writer = None, None
+
+    def close(self):
+        if self.pending:
+            self.line(self.pending)
+            self.pending = b""
+        self.end()
+
+
+def execute_batch(tasks):
+    """Execute tasks of one tool on several contracts in a single container.
+
+    All tasks share tool, arguments, timeout and compiler (see sb.tasks.batches).
+    Returns, for each task, either (exit_code, logs, output, args) or None if
+    the container stopped before the task began. Each contract has the task
+    timeout; a task running into it, or running when the container's timeout
+    (the task timeout per contract) hit, gets the exit code None, like a task
+    executed on its own.
+    """
+    task0 = tasks[0]
+    with sb.timings.phase("volume"):
+        sbdir = __docker_volume(task0)
+        for task in tasks[1:]:
+            __docker_contract(task, sbdir)
+        sb.io.write_txt(os.path.join(sbdir, BATCH_SCRIPT), __batch_script(tasks, sbdir))
+        args = __docker_args(task0, sbdir)
+    args.pop("command", None)
+    args["entrypoint"] = ["/bin/sh", f"/sb/{BATCH_SCRIPT}"]
+
+    timeout = task0.timeout or task0.settings.timeout
+    results = [None] * len(tasks)
+    batch_log = BatchLog(tasks)
+    capture = LogCapture(batch_log)
+    container = None
+    try:
+        with sb.timings.phase("run"):
+            container = client().containers.run(**args)
+            capture.start(container.logs(stream=True, follow=True))
+        with sb.timings.phase("wait"):
+            try:
+                container.wait(timeout=timeout * len(tasks) if timeout else None)
+            except (requests.exceptions.ReadTimeout,requests.exceptions.ConnectionError):
+                try:
+                    container.stop(timeout=10)
+                except docker.errors.APIError:
+                    pass
+        with sb.timings.phase("logs"):
+            capture.close()
+        with sb.timings.phase("output"):
+            for i,exit_code in batch_log.exit_codes.items():
+                if timeout and exit_code == BATCH_TIMEOUT:
+                    exit_code = None
+                output = __batch_output(sbdir, i, task0.tool.output) if task0.tool.output else None
+                results[i] = (exit_code, log_lines(tasks[i]), output, __docker_args(tasks[i], sbdir))
+
+    except Exception as e:
+        raise sb.errors.SmartBugsError(f"Docker execution failed for a batch of {len(tasks)} contracts with {task0.tool.id}\nError: {e}")
+
+    finally:
+        with sb.timings.phase("remove"):
+            try:
+                container.kill()
+            except Exception as e:
+                pass
+            try:
+                container.remove()
+            except Exception:
+                pass
+            capture.close()
+            shutil.rmtree(sbdir)
+
+    return results
@@ -0,0 +1,316 @@
+"""Model of task durations, learned from the smartbugs.json of earlier tasks.
+
+Durations are kept per tool (base name), arguments and size bucket of the
+input file, and aggregated per tool and arguments, and per tool. For each
+key, the model counts the tasks that completed and those that ran into a
+timeout (exit code None), their total durations, and a histogram of the
+durations of completed tasks with DURATION_BINS bins per doubling. Queries
+use the most specific key with at least DURATION_MIN_SAMPLES tasks.
+
+The model of a results tree is stored in its root (see sb.index.root) as
+DURATIONS, and updated with the tasks of each run when the run ends.
+Rebuild it from all results below DIR, or show it, with
+
+    python -m sb.durations learn DIR
+    python -m sb.durations show DIR
+"""
+
+import argparse, json, math, os, sys, tempfile
+import sb.cfg, sb.errors, sb.index, sb.io
+
+
+
+def size_bucket(size):
+    """Bucket of a file of size bytes: 0 below 1 KiB, then one per doubling; None if unknown."""
+    return None if size is None else (size // 1024).bit_length()
+
+
+# sizes of the input files, looked up once per process
+sizes = {}
+
+def file_size(fn):
+    if fn not in sizes:
+        try:
+            sizes[fn] = os.path.getsize(fn)
+        except OSError:
+            sizes[fn] = None
+    return sizes[fn]
+
+
+def tool_name(toolid):
+    return toolid.split("-")[0]
+
+
+def bin_of(duration):
+    return int(sb.cfg.DURATION_BINS * math.log2(1 + max(0.0, duration)))
+
+
+def bin_limit(b):
+    """Upper limit of the durations in bin b."""
+    return 2 ** ((b+1) / sb.cfg.DURATION_BINS) - 1
+
+
+
+class Stats:
+    """Durations of the tasks of one key."""
+
+    __slots__ = ("completed", "total", "timeouts", "timeout_total", "bins")
+
+    def __init__(self, completed=0, total=0.0, timeouts=0, timeout_total=0.0, bins=None):
+        self.completed = completed
+        self.total = total
+        self.timeouts = timeouts
+        self.timeout_total = timeout_total
+        self.bins = bins or {}
+
+    @property
+    def n(self):
+        return self.completed + self.timeouts
+
+    def add(self, duration, timed_out):
+        if timed_out:
+            self.timeouts += 1
+            self.timeout_total += duration
+        else:
+            self.completed += 1
+            self.total += duration
+            b = bin_of(duration)
+            self.bins[b] = self.bins.get(b, 0) + 1
+
+    def timeout_rate(self):
+        return self.timeouts / self.n if self.n else None
+
+    def expected(self, timeout=None):
+        """Mean duration; with a timeout, of completed tasks capped at the timeout,
+        weighted by the timeout rate."""
+        if not self.n:
+            return None
+        if not timeout:
+            return (self.total + self.timeout_total) / self.n
+        rate = self.timeouts / self.n
+        mean = min(self.total / self.completed, timeout) if self.completed else timeout
+        return (1 - rate) * mean + rate * timeout
+
+    def percentile(self, p, timeout=None):
+        """Duration that p percent of the tasks do not exceed (an upper bin limit).
+
+        Tasks running into a timeout count as taking timeout seconds, or as
+        exceeding all others, without a timeout.
+        """
+        if not self.n:
+            return None
+        rank = p / 100 * self.n
+        seen = 0
+        limit = None
+        for b in sorted(self.bins):
+            seen += self.bins[b]
+            limit = bin_limit(b)
+            if seen >= rank:
+                return min(limit, timeout) if timeout else limit
+        if timeout:
+            return timeout
+        return self.timeout_total / self.timeouts if self.timeouts else limit
+
+    def dict(self):
+        return [ self.completed, self.total, self.timeouts, self.timeout_total, self.bins ]
+
+
+
+class Model:
+    """Durations per (tool, args, size bucket), (tool, args, None) and (tool, None, None).
+
+    Tasks are passed as sb.tasks.Task or as tool id, arguments and input file size.
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self.runs = set() # run ids already learned from
+
+    def add(self, toolid, tool_args, size, duration, timed_out):
+        name, args = tool_name(toolid), (tool_args or "").strip()
+        keys = [ (name, args, None), (name, None, None) ]
+        if size is not None:
+            keys.append((name, args, size_bucket(size)))
+        for key in keys:
+            self.stats.setdefault(key, Stats()).add(float(duration or 0.0), timed_out)
+
+    def lookup(self, toolid, tool_args, size):
+        """Stats of the most specific key with enough tasks, or else of any key with tasks."""
+        name, args = tool_name(toolid), (tool_args or "").strip()
+        keys = [ (name, args, size_bucket(size)), (name, args, None), (name, None, None) ]
+        found = [ self.stats[key] for key in keys if key in self.stats and self.stats[key].n ]
+        for stats in found:
+            if stats.n >= sb.cfg.DURATION_MIN_SAMPLES:
+                return stats
+        return found[0] if found else None
+
+    def task_lookup(self, task):
+        return self.lookup(task.toolid, task.tool_args, file_size(task.absfn))
+
+    def expected(self, toolid, tool_args, size, timeout=None):
+        """Expected duration in seconds, None without history."""
+        stats = self.lookup(toolid, tool_args, size)
+        return stats.expected(timeout) if stats else None
+
+    def percentile(self, toolid, tool_args, size, p, timeout=None):
+        stats = self.lookup(toolid, tool_args, size)
+        return stats.percentile(p, timeout) if stats else None
+
+    def timeout_rate(self, toolid, tool_args, size):
+        stats = self.lookup(toolid, tool_args, size)
+        return stats.timeout_rate() if stats else None
+
+    def task_expected(self, task):
+        """Expected duration of task, with its timeout; None without history."""
+        stats = self.task_lookup(task)
+        return stats.expected(task.timeout or task.settings.timeout) if stats else None
+
+    def dict(self):
+        return {
+            "runs": sorted(self.runs),
+            "stats": [ list(key) + stats.dict() for key,stats in sorted(self.stats.items(), key=lambda i: str(i[0])) ],
+        }
+
+    @staticmethod
+    def from_dict(d):
+        model = Model()
+        model.runs = set(d.get("runs", []))
+        for name,args,bucket,completed,total,timeouts,timeout_total,bins in d.get("stats", []):
+            bins = { int(b): c for b,c in bins.items() }
+            model.stats[(name,args,bucket)] = Stats(completed, total, timeouts, timeout_total, bins)
+        return model
+
+
+
+def path(root):
+    return os.path.join(root, sb.cfg.DURATIONS)
+
+
+def read(root):
+    """Model stored in root; an empty one if there is none."""
+    fn = path(root)
+    if not os.path.exists(fn):
+        return Model()
+    try:
+        return Model.from_dict(sb.io.read_json(fn))
+    except (sb.errors.SmartBugsError, ValueError, TypeError, AttributeError) as e:
+        raise sb.errors.SmartBugsError(f"Cannot read duration model {fn}: {e}")
+
+
+def write(root, model):
+    fn = path(root)
+    try:
+        os.makedirs(root, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=root, prefix=".tmp-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(model.dict(), f, separators=(",",":"))
+        os.replace(tmp, fn)
+    except OSError as e:
+        raise sb.errors.SmartBugsError(f"Cannot write duration model {fn}: {e}")
+
+
+# the model of the run, read once per process
+_model = None
+
+def model(settings):
+    """Model of the results tree of settings, empty if it has none."""
+    global _model
+    if _model is None:
+        root = sb.index.root(settings)
+        _model = read(root) if root else Model()
+    return _model
+
+
+
+def learn(model, rows, files=None):
+    """Add the tasks in rows (of the index, or alike) to model.
+
+    The sizes of the input files are taken from files, a mapping of the
+    relative file names to absolute ones, or else of the file names as given.
+    """
+    for row in rows:
+        if not row.get("toolid") or row.get("duration") is None:
+            continue
+        model.runs.add(row["runid"])
+        fn = files.get(row["filename"]) if files else row["filename"]
+        size = file_size(fn) if fn else None
+        model.add(row["toolid"], row.get("tool_args"), size, row["duration"], row.get("exit_code") is None)
+
+
+def update(settings, files):
+    """Learn from the tasks of the current run, and store the model in the results root."""
+    root = sb.index.root(settings)
+    if not root or not os.path.isfile(os.path.join(root, sb.cfg.RESULTS_INDEX)):
+        return
+    model = read(root)
+    if settings.runid in model.runs:
+        return
+    learn(model, sb.index.rows(root, where="runid = ? AND duplicate_of IS NULL", args=(settings.runid,)),
+        { relfn: absfn for absfn,relfn in files })
+    model.runs.add(settings.runid)
+    write(root, model)
+
+
+def task_logs(root):
+    """Task logs of the result dirs below root, as rows of the index."""
+    for path,_,files in os.walk(root):
+        if sb.cfg.TASK_LOG not in files:
+            continue
+        try:
+            task_log = sb.io.read_json(os.path.join(path, sb.cfg.TASK_LOG))
+        except sb.errors.SmartBugsError as e:
+            print(e, file=sys.stderr)
+            continue
+        row = dict(zip(sb.index.COLUMNS, sb.index.task_row(path, task_log)))
+        if not row["duplicate_of"]:
+            yield row
+
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        prog="durations",
+        description="Maintain the model of task durations of a results tree.")
+    commands = argparser.add_subparsers(dest="command", metavar="COMMAND")
+    learn_parser = commands.add_parser("learn",
+        help=f"rebuild {sb.cfg.DURATIONS} from all results below DIR")
+    learn_parser.add_argument("results",
+        metavar="DIR",
+        help="root of the results tree")
+    show_parser = commands.add_parser("show",
+        help="show the durations per tool and arguments")
+    show_parser.add_argument("results",
+        metavar="DIR",
+        help="root of the results tree")
+
+    args = argparser.parse_args()
+    if args.command not in ("learn", "show"):
+        argparser.print_help(sys.stderr)
+        sys.exit(1)
+
+    try:
+        if args.command == "learn":
+            model = Model()
+            if sb.index.complete(args.results):
+                rows = sb.index.rows(args.results, where="duplicate_of IS NULL")
+            else:
+                rows = task_logs(args.results)
+            learn(model, rows)
+            write(args.results, model)
+            print(f"{sum(s.n for (_,a,b),s in model.stats.items() if a is None)} tasks learned")
+        else:
+            model = read(args.results)
+            print("tool,args,tasks,mean,p50,p90,timeout_rate")
+            for (name,args_,bucket),stats in sorted(model.stats.items(), key=lambda i: str(i[0])):
+                if args_ is None or bucket is not None:
+                    continue
+                print(f"{name},{args_},{stats.n},{stats.expected():.1f},"
+                    f"{stats.percentile(50):.1f},{stats.percentile(90):.1f},{stats.timeout_rate():.2f}")
+    except sb.errors.SmartBugsError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+
+
+if __name__ == '__main__':
+    main()
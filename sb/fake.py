@@ -0,0 +1,252 @@
+"""Stand-in for Docker that replays recorded results (--backend fake).
+
+A task gets the log, output and exit code of a recorded task of the same
+tool and mode: one on the same file name if there is one, or else one
+picked at random. The recorded tasks are the result directories below the
+'fixtures' directory (any results tree of earlier runs will do). The name of
+the recorded contract is replaced by that of the task in the log. Tools
+without fixtures produce an empty log and exit code 0.
+
+The backend is configured by a YAML file (--fake-config FILE):
+
+    fixtures: results       # results tree with the recorded tasks
+    seed: 0                 # executions are random, but repeatable
+    time_scale: 1.0         # factor applied to all latencies
+    latency:                # seconds per task, by tool or 'default':
+      default: [0.1, 0.5]   #   median and sigma of a log-normal distribution;
+      mythril: [30, 1.0]    #   without, the recorded duration, or 0
+    failures: 0.0           # share of executions failing like Docker does,
+    timeouts: {default: 0.0, manticore: 0.2}  # and running into the timeout
+
+Failures, timeouts and latencies may be given as one value for all tools, or
+by tool. A task taking longer than its timeout also times out. A batch
+fails as a whole; like in the batch script, each of its contracts has the
+task timeout.
+"""
+
+import math, os, random, shutil, time
+import sb.cfg, sb.docker, sb.errors, sb.io, sb.timings
+
+# simulated failures are retried at once
+RETRY_DELAY = 0
+
+# configurations by file, read once per process
+configs = {}
+
+# recorded tasks below a fixtures directory, by (toolid, mode), read once per process
+fixtures = {}
+
+# executions of each task in this process, so that retries draw anew
+attempts = {}
+
+
+
+def config(settings):
+    """The configuration of the fake backend of settings."""
+    fn = settings.fake_config
+    if fn not in configs:
+        c = sb.io.read_yaml(fn) if fn else {}
+        if not isinstance(c, dict):
+            raise sb.errors.SmartBugsError(f"Fake backend: configuration {fn} needs to be a mapping")
+        for k in c:
+            if k not in ("fixtures", "seed", "time_scale", "latency", "failures", "timeouts"):
+                raise sb.errors.SmartBugsError(f"Fake backend: invalid key '{k}' (in {fn})")
+        try:
+            scale = float(c.get("time_scale", 1.0))
+            assert scale >= 0
+        except Exception:
+            raise sb.errors.SmartBugsError(f"Fake backend: 'time_scale' needs to be a non-negative number (in {fn})")
+        configs[fn] = {
+            "fixtures": c.get("fixtures"),
+            "seed": str(c.get("seed", 0)),
+            "time_scale": scale,
+            "latency": by_tool(c, "latency", fn, __latency),
+            "failures": by_tool(c, "failures", fn, __share),
+            "timeouts": by_tool(c, "timeouts", fn, __share),
+        }
+    return configs[fn]
+
+
+def __latency(v):
+    median, sigma = v
+    median, sigma = float(median), float(sigma)
+    assert median >= 0 and sigma >= 0
+    return median, sigma
+
+
+def __share(v):
+    v = float(v)
+    assert 0 <= v <= 1
+    return v
+
+
+def by_tool(c, k, fn, check):
+    """Values of key k by tool base name, 'default' for all others."""
+    v = c.get(k)
+    if v is None:
+        return {}
+    if not isinstance(v, dict) or (k == "latency" and not all(isinstance(vi, (list, tuple)) for vi in v.values())):
+        v = {"default": v}
+    try:
+        return { str(tool): check(vi) for tool,vi in v.items() }
+    except Exception:
+        kind = "pairs of median and sigma" if k == "latency" else "numbers between 0 and 1"
+        raise sb.errors.SmartBugsError(f"Fake backend: '{k}' needs to be {kind} (in {fn})")
+
+
+def lookup(values, task):
+    return values.get(task.tool.id.split("-")[0], values.get("default"))
+
+
+
+class Fixture:
+    """A recorded task: its log, output and exit code, read when first replayed."""
+
+    def __init__(self, rdir, task_log):
+        self.rdir = rdir
+        self.filename = os.path.basename(task_log.get("filename") or "")
+        result = task_log.get("result") or {}
+        self.exit_code = result.get("exit_code")
+        self.duration = result.get("duration") or 0.0
+        self.lines = None
+
+    def log(self):
+        if self.lines is None:
+            fn = os.path.join(self.rdir, sb.cfg.TOOL_LOG)
+            self.lines = sb.io.read_lines(fn) if os.path.exists(fn) else []
+        return self.lines
+
+
+def recorded(root):
+    """Recorded tasks below root, by (toolid, mode) and by (toolid, mode, file name)."""
+    if root not in fixtures:
+        by_tool, by_file = {}, {}
+        for path,_,files in os.walk(root) if root else ():
+            if sb.cfg.TASK_LOG not in files:
+                continue
+            try:
+                task_log = sb.io.read_json(os.path.join(path, sb.cfg.TASK_LOG))
+                key = (task_log["tool"]["id"], task_log["tool"]["mode"])
+            except (sb.errors.SmartBugsError, KeyError, TypeError):
+                continue
+            if task_log.get("duplicate_of"):
+                continue
+            fixture = Fixture(path, task_log)
+            by_tool.setdefault(key, []).append(fixture)
+            by_file.setdefault(key + (fixture.filename,), fixture)
+        for key in by_tool:
+            by_tool[key].sort(key=lambda f: f.rdir)
+        fixtures[root] = by_tool, by_file
+    return fixtures[root]
+
+
+def fixture(task, rng, c):
+    by_tool, by_file = recorded(c["fixtures"])
+    key = (task.tool.id, task.tool.mode)
+    found = by_file.get(key + (os.path.basename(task.relfn),))
+    if found:
+        return found
+    candidates = by_tool.get(key)
+    return rng.choice(candidates) if candidates else None
+
+
+
+def draw(task, c):
+    """Outcome of an execution of task: (fixture, latency in seconds, failed, timed out)."""
+    n = attempts[task.rdir] = attempts.get(task.rdir, 0) + 1
+    rng = random.Random(f"{c['seed']}:{task.rdir}:{n}")
+    f = fixture(task, rng, c)
+    latency = lookup(c["latency"], task)
+    if latency:
+        median, sigma = latency
+        seconds = median * math.exp(sigma * rng.gauss(0, 1))
+    else:
+        seconds = f.duration if f else 0.0
+    timeout = task.timeout or task.settings.timeout
+    failed = rng.random() < (lookup(c["failures"], task) or 0.0)
+    timed_out = rng.random() < (lookup(c["timeouts"], task) or 0.0) or (f is not None and f.exit_code is None)
+    if timeout and (timed_out or seconds >= timeout):
+        seconds, timed_out = timeout, True
+    return f, seconds * c["time_scale"], failed, timed_out
+
+
+def replay(task, f, timed_out):
+    """Log, output and exit code of task, from fixture f."""
+    if not f:
+        return [], None, None if timed_out else 0
+    name = os.path.basename(task.relfn)
+    log = [ line.replace(f.filename, name) for line in f.log() ] if f.filename and f.filename != name else list(f.log())
+    output = None
+    fn_dir = os.path.join(f.rdir, sb.cfg.TOOL_OUTPUT_DIR)
+    fn_tar = os.path.join(f.rdir, sb.cfg.TOOL_OUTPUT)
+    if task.tool.output_mount and os.path.isdir(fn_dir):
+        output = sb.docker.output_dir(task)
+        sb.io.remove(output)
+        shutil.copytree(fn_dir, output)
+    elif os.path.exists(fn_tar):
+        output = sb.io.read_bin(fn_tar)
+    return log, output, None if timed_out else f.exit_code
+
+
+
+def connect(max_pool_size):
+    pass
+
+
+def shutdown():
+    pass
+
+
+def is_loaded(image):
+    return True
+
+
+def load(image):
+    pass
+
+
+def image_id(image):
+    return f"fake:{image}"
+
+
+def remove_output(task):
+    sb.io.remove(sb.docker.output_dir(task))
+
+
+def args(task, f):
+    return {"image": task.tool.image, "fixture": f.rdir if f else None}
+
+
+def execute(task):
+    """Replay a recorded task of the tool of task, after the simulated latency."""
+    c = config(task.settings)
+    with sb.timings.phase("run"):
+        f, seconds, failed, timed_out = draw(task, c)
+    with sb.timings.phase("wait"):
+        time.sleep(seconds)
+    if failed:
+        raise sb.errors.SmartBugsError(f"Fake backend: simulated failure of {task.tool.id} on {task.relfn}")
+    with sb.timings.phase("output"):
+        log, output, exit_code = replay(task, f, timed_out)
+    return exit_code, log, output, args(task, f)
+
+
+def execute_batch(tasks):
+    """Replay the tasks of a batch one after the other, like the batch script does."""
+    c = config(tasks[0].settings)
+    results = [None] * len(tasks)
+    total = 0.0
+    failed = False
+    with sb.timings.phase("run"):
+        outcomes = [ draw(task, c) for task in tasks ]
+    for i,(task,(f, seconds, failed_i, timed_out)) in enumerate(zip(tasks, outcomes)):
+        failed = failed or failed_i
+        total += seconds
+        with sb.timings.phase("output"):
+            log, output, exit_code = replay(task, f, timed_out)
+        results[i] = exit_code, log, output, args(task, f)
+    with sb.timings.phase("wait"):
+        time.sleep(total)
+    if failed:
+        raise sb.errors.SmartBugsError(f"Fake backend: simulated failure of a batch of {len(tasks)} contracts with {tasks[0].tool.id}")
+    return results
@@ -6,7 +6,7 @@ from pathlib import Path
 import plotly.express as px
 from jinja2 import Template
 import re
-import sb.vulnerability
+import sb.vulnerability, sb.results2csv
 
 def _seconds_to_hms(seconds: float) -> str:
     """Return the given duration in ``HH:MM:SS`` format."""
@@ -42,7 +42,25 @@ def load_csvs(input_folder: str) -> pd.DataFrame:
                 print(f"Error reading {file}: {e}")
     if not all_data:
         raise ValueError("No CSV files found in input folder")
-    df = pd.concat(all_data, ignore_index=True)
+    return _normalise_columns(pd.concat(all_data, ignore_index=True))
+
+
+def load_results(results: list) -> pd.DataFrame:
+    """Load the parsed results below the directories ``results``.
+
+    The rows are those ``results2csv`` writes, taken from the index of the
+    results tree (``sb.index``) where there is a complete one.
+    """
+    fields = sb.results2csv.FIELDS
+    rows = list(sb.results2csv.collect(results, False, fields))
+    if not rows:
+        raise ValueError("No parsed results found in the results directories")
+    df = pd.DataFrame(rows, columns=fields)
+    df["Execution ID"] = df["runid"].astype(str)
+    return _normalise_columns(df)
+
+
+def _normalise_columns(df: pd.DataFrame) -> pd.DataFrame:
     # normalise column names coming from results2csv
     rename_map = {}
     if "toolid" in df.columns and "tool" not in df.columns:
@@ -440,11 +458,13 @@ def render_html(df, output_file):
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--input-folder", required=True)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input-folder")
+    source.add_argument("--results", nargs="+", metavar="DIR")
     parser.add_argument("--output", required=True)
     args = parser.parse_args()
 
-    df = load_csvs(args.input_folder)
+    df = load_csvs(args.input_folder) if args.input_folder else load_results(args.results)
     df = clean_and_process(df)
     render_html(df, args.output)
 
@@ -0,0 +1,303 @@
+"""Index of the tasks in a results tree, kept in an SQLite database.
+
+The index lives in the root of the results tree, i.e. the part of the
+--results template before the first variable, as RESULTS_INDEX. It holds a
+row per result directory: run id, file, tool, arguments, exit code and
+duration from smartbugs.json, and, once the output is parsed, the parser
+version, the findings, their categories, infos, errors and fails, and the
+modification times and sizes of the parsed log and output. Rows are
+written by the process completing a task (sb.analysis) and by reparse, so
+budget planning, results2csv, reparse and generate_report find the results
+of a run without walking the tree.
+
+An index created by a run on a tree with older results, which it does not
+know of, is marked incomplete; consumers then walk the tree as before.
+Rebuild the index from the result directories with
+
+    python -m sb.index DIR
+"""
+
+import argparse, json, os, sqlite3, sys, threading
+import sb.cfg, sb.colors, sb.errors, sb.io, sb.logging, sb.utils, sb.vulnerability
+
+COLUMNS = (
+    "rdir", "runid", "filename", "toolid", "mode", "parser", "tool_args",
+    "start", "duration", "exit_code", "duplicate_of")
+PARSED_COLUMNS = (
+    "parser_version", "findings", "labels", "categories", "infos", "errors", "fails",
+    "result_json", "result_sarif", "inputs")
+
+# files of a result dir read by the parsers
+INPUTS = (sb.cfg.TOOL_LOG, sb.cfg.TOOL_OUTPUT, sb.cfg.TOOL_OUTPUT_DIR)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS tasks (
+    rdir TEXT PRIMARY KEY, runid TEXT, filename TEXT, toolid TEXT, mode TEXT, parser TEXT,
+    tool_args TEXT, start REAL, duration REAL, exit_code INTEGER, duplicate_of TEXT,
+    parser_version TEXT, findings INTEGER, labels TEXT, categories TEXT,
+    infos TEXT, errors TEXT, fails TEXT, result_json INTEGER, result_sarif INTEGER, inputs TEXT);
+CREATE INDEX IF NOT EXISTS tasks_runid ON tasks (runid);
+"""
+
+INSERT = f"""
+INSERT INTO tasks ({', '.join(COLUMNS + PARSED_COLUMNS)})
+VALUES ({', '.join('?' * len(COLUMNS + PARSED_COLUMNS))})
+ON CONFLICT (rdir) DO UPDATE SET {', '.join(f'{c}=excluded.{c}' for c in COLUMNS[1:] + PARSED_COLUMNS)}
+"""
+
+UPDATE = f"UPDATE tasks SET {', '.join(f'{c}=?' for c in PARSED_COLUMNS)} WHERE rdir=?"
+
+
+
+# connections are opened once per process, and shared by its threads
+connections = {}
+lock = threading.Lock()
+
+def root(settings):
+    """Root of the results tree of settings.results, None if the template starts with a variable."""
+    template = settings.results.template if hasattr(settings.results, "template") else settings.results
+    parts = []
+    for part in template.split(os.path.sep):
+        if "$" in part:
+            break
+        parts.append(part)
+    if not parts:
+        return None
+    return os.path.sep.join(parts) or os.path.sep
+
+
+def find(path):
+    """Root of the index covering path (path itself or an ancestor), or None."""
+    d = os.path.abspath(path)
+    while True:
+        if os.path.isfile(os.path.join(d, sb.cfg.RESULTS_INDEX)):
+            return d
+        parent = os.path.dirname(d)
+        if parent == d:
+            return None
+        d = parent
+
+
+def has_results(root):
+    """Whether there is a result directory below root; stops at the first one."""
+    for _,_,files in os.walk(root):
+        if sb.cfg.TASK_LOG in files:
+            return True
+    return False
+
+
+def connect(root):
+    """Connection to the index of root, created if it doesn't exist yet."""
+    key = os.path.abspath(root)
+    if key not in connections:
+        fn = os.path.join(root, sb.cfg.RESULTS_INDEX)
+        complete = not os.path.exists(fn) and not has_results(root)
+        try:
+            os.makedirs(root, exist_ok=True)
+            con = sqlite3.connect(fn, timeout=60, isolation_level=None, check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.executescript(SCHEMA)
+            if "inputs" not in { c[1] for c in con.execute("PRAGMA table_info(tasks)") }:
+                # index of an earlier version; its parse results count as stale
+                con.execute("ALTER TABLE tasks ADD COLUMN inputs TEXT")
+            con.execute("INSERT OR IGNORE INTO meta VALUES ('complete', ?)", (str(int(complete)),))
+        except (OSError, sqlite3.Error) as e:
+            raise sb.errors.SmartBugsError(f"Cannot open index {fn}: {e}")
+        connections[key] = con
+    return connections[key]
+
+
+def complete(root):
+    """Whether root has an index listing all result directories below root."""
+    if not os.path.isfile(os.path.join(root, sb.cfg.RESULTS_INDEX)):
+        return False
+    try:
+        with lock:
+            row = connect(root).execute("SELECT value FROM meta WHERE key='complete'").fetchone()
+    except (sb.errors.SmartBugsError, sqlite3.Error):
+        return False
+    return bool(row) and row[0] == "1"
+
+
+
+def labels(findings):
+    """Findings as sorted labels name@line, like results2csv writes them."""
+    return sorted({
+        (sb.utils.str2label(f.get("name", "")) +
+         (f"@{f['line']}" if str(f.get("line", "")).strip() else ""))
+        for f in findings})
+
+
+def categories(tool_id, parsed_result):
+    analyzer = sb.vulnerability.VulnerabilityAnalyzer()
+    classified = analyzer.analyze(tool_id, parsed_result)
+    return sorted({c for item in classified for c in item.get("categories", [])})
+
+
+def task_row(rdir, task_log):
+    tool = task_log.get("tool") or {}
+    result = task_log.get("result") or {}
+    return (rdir, task_log.get("runid"), task_log.get("filename"),
+        tool.get("id"), tool.get("mode"), tool.get("parser"), task_log.get("tool_args", ""),
+        result.get("start"), result.get("duration"), result.get("exit_code"),
+        task_log.get("duplicate_of"))
+
+
+def inputs(d):
+    """Modification times and sizes of the log and output in the result dir d, as recorded with the parse results."""
+    stamp = {}
+    for fn in INPUTS:
+        try:
+            st = os.stat(os.path.join(d, fn))
+        except OSError:
+            continue
+        stamp[fn] = [ st.st_mtime_ns, st.st_size ]
+    return json.dumps(stamp, sort_keys=True)
+
+
+def parsed_row(parsed_result, result_json, result_sarif, inputs):
+    return (str(parsed_result["parser"]["version"]),
+        len(parsed_result["findings"]),
+        json.dumps(labels(parsed_result["findings"])),
+        json.dumps(categories(parsed_result["parser"]["id"], parsed_result)),
+        json.dumps(parsed_result["infos"]),
+        json.dumps(parsed_result["errors"]),
+        json.dumps(parsed_result["fails"]),
+        int(result_json), int(result_sarif), inputs)
+
+
+def put(root, rdir, task_log):
+    """Record the task of rdir (relative to root); clears parse results of an earlier task."""
+    with lock:
+        connect(root).execute(INSERT, task_row(rdir, task_log) + (None,) * len(PARSED_COLUMNS))
+
+
+def put_parsed(root, rdir, parsed_result, result_json, result_sarif):
+    """Record the parsed output of the task of rdir (relative to root), with the inputs it was parsed from."""
+    row = parsed_row(parsed_result, result_json, result_sarif, inputs(os.path.join(root, rdir)))
+    with lock:
+        connect(root).execute(UPDATE, row + (rdir,))
+
+
+def add(task, task_log):
+    """Record a completed task in the index of its results tree, if any."""
+    r = root(task.settings)
+    if r:
+        try:
+            put(r, os.path.relpath(task.rdir, r), task_log)
+        except (sb.errors.SmartBugsError, sqlite3.Error) as e:
+            sb.logging.message(sb.colors.warning(f"Cannot index {task.rdir}: {e}"), "ERROR")
+
+
+def add_parsed(task, parsed_result, written):
+    """Record the parsed output of a task; written tells whether it went to result.json (and result.sarif, with --sarif)."""
+    r = root(task.settings)
+    if r:
+        try:
+            put_parsed(r, os.path.relpath(task.rdir, r), parsed_result,
+                written, written and task.settings.sarif)
+        except (sb.errors.SmartBugsError, sqlite3.Error, KeyError, TypeError) as e:
+            sb.logging.message(sb.colors.warning(f"Cannot index {task.rdir}: {e}"), "ERROR")
+
+
+
+def rows(root, path=None, where="", args=()):
+    """Rows of the index of root, as dicts, for the result dirs below path (default: all).
+
+    The lists among the parsed columns are decoded; rdir is relative to root.
+    """
+    sql = "SELECT * FROM tasks"
+    conditions = [ where ] if where else []
+    args = list(args)
+    if path is not None:
+        prefix = os.path.relpath(os.path.abspath(path), os.path.abspath(root))
+        if prefix != os.curdir:
+            conditions.append("(rdir = ? OR substr(rdir, 1, ?) = ?)")
+            args += [ prefix, len(prefix)+1, prefix+os.path.sep ]
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    with lock:
+        cursor = connect(root).execute(sql + " ORDER BY rdir", args)
+        names = [ c[0] for c in cursor.description ]
+        result = cursor.fetchall()
+    for row in result:
+        row = dict(zip(names, row))
+        for c in ("labels", "categories", "infos", "errors", "fails"):
+            if row[c] is not None:
+                row[c] = json.loads(row[c])
+        yield row
+
+
+def rebuild(root, verbose=False):
+    """Replace the index of root by the result directories found below it; returns their number."""
+    entries = []
+    for path,_,files in os.walk(root):
+        if sb.cfg.TASK_LOG not in files:
+            continue
+        if verbose:
+            print(path)
+        rdir = os.path.relpath(path, root)
+        try:
+            task_log = sb.io.read_json(os.path.join(path, sb.cfg.TASK_LOG))
+            row = task_row(rdir, task_log)
+        except (sb.errors.SmartBugsError, AttributeError) as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            continue
+        parsed = (None,) * len(PARSED_COLUMNS)
+        if sb.cfg.PARSER_OUTPUT in files:
+            try:
+                parsed_result = sb.io.read_json(os.path.join(path, sb.cfg.PARSER_OUTPUT))
+                # the log and output are those parsed, unless changed since
+                fresh = all(os.path.getmtime(os.path.join(path, fn)) < os.path.getmtime(os.path.join(path, sb.cfg.PARSER_OUTPUT))
+                    for fn in INPUTS if os.path.exists(os.path.join(path, fn)))
+                parsed = parsed_row(parsed_result, True, sb.cfg.SARIF_OUTPUT in files, inputs(path) if fresh else None)
+            except (OSError, sb.errors.SmartBugsError, KeyError, TypeError) as e:
+                print(f"{path}: {e}", file=sys.stderr)
+        entries.append(row + parsed)
+
+    con = connect(root)
+    with lock:
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            con.execute("DELETE FROM tasks")
+            con.executemany(INSERT, entries)
+            con.execute("INSERT OR REPLACE INTO meta VALUES ('complete', '1')")
+            con.execute("COMMIT")
+        except sqlite3.Error as e:
+            con.execute("ROLLBACK")
+            raise sb.errors.SmartBugsError(f"Cannot rebuild index of {root}: {e}")
+    return len(entries)
+
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        prog="rebuild-index",
+        description=f"Rebuild the index of the results tree, {sb.cfg.RESULTS_INDEX}, from the result directories.")
+    argparser.add_argument("-v",
+        action='store_true',
+        help="show progress")
+    argparser.add_argument("results",
+        nargs="+",
+        metavar="DIR",
+        help="roots of results trees")
+
+    if len(sys.argv)==1:
+        argparser.print_help(sys.stderr)
+        sys.exit(1)
+
+    args = argparser.parse_args()
+    for r in args.results:
+        try:
+            n = rebuild(r, args.v)
+        except sb.errors.SmartBugsError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        print(f"{r}: {n} result directories indexed")
+
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
-import yaml, json
+import os, shutil, tarfile, collections, yaml, json
 import sb.errors
 
 ## def read_yaml(fn):
@@ -43,6 +43,108 @@ def read_lines(fn):
     except Exception as e:
         raise sb.errors.SmartBugsError(e)
 
+class LogLines:
+    """Lines of a log file, read lazily whenever they are iterated.
+
+    Passed to the parsers instead of a list of all lines. It can be iterated
+    repeatedly, tested for emptiness and for a line it contains, and indexed;
+    a negative index keeps only that many lines in memory.
+    """
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def __iter__(self):
+        try:
+            f = open(self.fn, "r", encoding="utf-8", errors="replace")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                yield line.rstrip("\n")
+
+    def __bool__(self):
+        try:
+            return os.path.getsize(self.fn) > 0
+        except OSError:
+            return False
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, line):
+        return any(l == line for l in self)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return list(self)[i]
+        if i < 0:
+            lines = collections.deque(self, maxlen=-i)
+            if len(lines) == -i:
+                return lines[0]
+        else:
+            for j,line in enumerate(self):
+                if j == i:
+                    return line
+        raise IndexError(f"line {i} not in {self.fn}")
+
+
+class CappedWriter:
+    """Write a stream of bytes to fn, keeping only its head and tail.
+
+    The first head bytes are written as they arrive. Of the rest, the last
+    tail bytes are buffered until close(), which writes them after a
+    marker line stating how many bytes were dropped.
+    """
+
+    def __init__(self, fn, head, tail, marker):
+        try:
+            self.f = open(fn, "wb")
+        except Exception as e:
+            raise sb.errors.SmartBugsError(e)
+        self.head, self.tail, self.marker = head, tail, marker
+        self.written = 0
+        self.last = b"\n"
+        self.buffer = bytearray()
+        self.dropped = 0
+
+    def write(self, chunk):
+        if self.written < self.head:
+            n = min(len(chunk), self.head - self.written)
+            self.f.write(chunk[:n])
+            self.written += n
+            if n:
+                self.last = chunk[n-1:n]
+            chunk = chunk[n:]
+        if chunk:
+            self.buffer += chunk
+            # trim occasionally, not on every chunk
+            if len(self.buffer) > 2*self.tail:
+                self.trim()
+
+    def trim(self):
+        excess = len(self.buffer) - self.tail
+        if excess > 0:
+            del self.buffer[:excess]
+            self.dropped += excess
+
+    def close(self):
+        """Write the tail and close the file; returns the number of bytes dropped."""
+        self.trim()
+        if self.dropped:
+            # the tail starts with a complete line
+            nl = self.buffer.find(b"\n")
+            if nl >= 0:
+                del self.buffer[:nl+1]
+                self.dropped += nl+1
+            if self.last != b"\n":
+                self.f.write(b"\n")
+            self.f.write(self.marker.format(self.dropped).encode() + b"\n")
+        self.f.write(self.buffer)
+        self.f.close()
+        return self.dropped
+
+
 def write_txt(fn, output):
     try:
         with open(fn, 'w', encoding='utf-8') as f:
@@ -68,3 +170,48 @@ def write_bin(fn, output):
     except Exception as e:
         raise sb.errors.SmartBugsError(e)
 
+
+def link_or_copy(src, dst):
+    """Hardlink src to dst, or copy it where hardlinks are not possible."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        try:
+            shutil.copyfile(src, dst)
+        except Exception as e:
+            raise sb.errors.SmartBugsError(e)
+
+
+def link_or_copy_tree(src, dst):
+    """Recreate the directory src at dst, hardlinking its files where possible."""
+    def link_or_copy2(s, d):
+        try:
+            os.link(s, d)
+        except OSError:
+            shutil.copy2(s, d)
+    try:
+        shutil.copytree(src, dst, symlinks=True, copy_function=link_or_copy2)
+    except Exception as e:
+        raise sb.errors.SmartBugsError(e)
+
+
+def remove(fn):
+    """Remove the file or directory fn, if it exists."""
+    if os.path.isdir(fn) and not os.path.islink(fn):
+        shutil.rmtree(fn, ignore_errors=True)
+    else:
+        try:
+            os.remove(fn)
+        except OSError:
+            pass
+    if os.path.lexists(fn):
+        raise sb.errors.SmartBugsError(f"Cannot remove {fn}")
+
+
+def write_tar(fn, directory, arcname):
+    """Archive directory under the name arcname in fn, like the tar streams of Docker."""
+    try:
+        with tarfile.open(fn, "w") as tar:
+            tar.add(directory, arcname=arcname)
+    except Exception as e:
+        raise sb.errors.SmartBugsError(e)
@@ -0,0 +1,162 @@
+"""Append-only journal of a run, for resuming it after a crash (--resume RUNID).
+
+The journal is a file of JSON lines next to the log, <log>.journal.jsonl.
+A run starts with a 'run' record holding the files to analyse, the
+duplicates and clusters found among them and the deferred tasks. Then follow
+
+    enqueued    tasks queued by a batch or routed by the coordinator
+    started     tasks handed to a container
+    finished    tasks whose results are stored, with ok=False if they failed,
+                and the durations of their phases (sb.timings)
+
+Records of enqueued and finished tasks are written to disk (fsync) before
+the run goes on: a routed follow-up is on disk before the task routing it is
+recorded as finished. Replaying the journal yields the tasks enqueued but
+not finished, without collecting them again. A last record cut off by a
+crash is skipped, and ended before the resumed run appends to the journal.
+"""
+
+import json, os
+import sb.colors, sb.errors, sb.logging, sb.tasks
+
+ENQUEUED, STARTED, FINISHED = "enqueued", "started", "finished"
+
+
+
+def path(settings):
+    return f"{os.path.splitext(settings.log)[0]}.journal.jsonl"
+
+
+# the journal is opened once per process, in append mode
+fds = {}
+
+def write(settings, record, sync=False):
+    """Append record; a journal that cannot be written is reported, but does not stop the run."""
+    fn = path(settings)
+    try:
+        if fn not in fds:
+            os.makedirs(os.path.dirname(fn) or ".", exist_ok=True)
+            fd = os.open(fn, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+            size = os.fstat(fd).st_size
+            if size and os.pread(fd, 1, size-1) != b"\n":
+                # end the record cut off by a crash, so the next one stays readable
+                os.write(fd, b"\n")
+            fds[fn] = fd
+        # one write per record; appends of single lines do not interleave
+        os.write(fds[fn], (json.dumps(record, separators=(",",":")) + "\n").encode())
+        if sync:
+            os.fsync(fds[fn])
+    except OSError as e:
+        sb.logging.message(sb.colors.error(f"Cannot write journal {fn}: {e}"), "ERROR")
+
+
+def task_state(task):
+    state = list(task.__getstate__())
+    for i,k in enumerate(sb.tasks.Task.__slots__):
+        if k in ("solc_version", "solc_path") and state[i] is not None:
+            state[i] = str(state[i])
+    return state
+
+
+def task_from_state(state):
+    task = sb.tasks.Task.__new__(sb.tasks.Task)
+    state = list(state)
+    state[-1] = tuple(tuple(d) for d in state[-1]) # duplicates
+    task.__setstate__(state)
+    return task
+
+
+
+def begin(settings, files):
+    """Start the journal of a new run."""
+    write(settings, {
+        "event": "run",
+        "runid": settings.runid,
+        "files": files,
+        "duplicates": settings.duplicates,
+        "clusters": settings.clusters,
+        "deferred": [ task_state(task) for tasks in settings.deferred.values() for task in tasks ],
+    }, sync=True)
+
+
+def enqueued(settings, tasks):
+    if not tasks:
+        return
+    for task in tasks[:-1]:
+        write(settings, {"event": ENQUEUED, "task": task_state(task)})
+    write(settings, {"event": ENQUEUED, "task": task_state(tasks[-1])}, sync=True)
+
+
+def started(task):
+    write(task.settings, {"event": STARTED, "rdir": task.rdir})
+
+
+def finished(task, ok, timings=None):
+    record = {"event": FINISHED, "rdir": task.rdir, "ok": ok}
+    if timings:
+        record["timings"] = timings
+    write(task.settings, record, sync=True)
+
+
+
+class Replay:
+    """State of a run reconstructed from its journal.
+
+    Attributes: the 'run' record of the last start of the run; the tasks
+    enqueued (by result dir, in order); the result dirs of tasks finished
+    successfully; the timings of finished tasks, by result dir; and the
+    number of records read.
+    """
+
+    def __init__(self, fn):
+        self.run = None
+        self.enqueued = {}
+        self.finished = set()
+        self.timings = {}
+        self.records = 0
+        try:
+            f = open(fn, "r", encoding="utf-8")
+        except OSError as e:
+            raise sb.errors.SmartBugsError(f"Cannot read journal {fn}: {e}")
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    event = record["event"]
+                except (ValueError, KeyError, TypeError):
+                    continue # a record cut off by a crash
+                self.records += 1
+                if event == "run":
+                    self.run = record
+                    self.enqueued = {}
+                    self.finished = set()
+                    self.timings = {}
+                elif event == ENQUEUED:
+                    task = task_from_state(record["task"])
+                    self.enqueued.pop(task.rdir, None)
+                    self.enqueued[task.rdir] = task
+                    self.finished.discard(task.rdir)
+                elif event == FINISHED:
+                    if record.get("timings"):
+                        self.timings[record["rdir"]] = record["timings"]
+                    if record.get("ok"):
+                        self.finished.add(record["rdir"])
+                    else:
+                        self.finished.discard(record["rdir"])
+        if self.run is None:
+            raise sb.errors.SmartBugsError(f"Journal {fn} does not record the start of a run")
+
+
+    def deferred(self):
+        """Deferred tasks not enqueued since, by contract."""
+        deferred = {}
+        for state in self.run.get("deferred", []):
+            task = task_from_state(state)
+            if task.rdir not in self.enqueued:
+                deferred.setdefault(task.absfn, []).append(task)
+        return deferred
+
+
+    def pending(self):
+        """Tasks enqueued but not finished successfully, in the order of enqueueing."""
+        return [ task for rdir,task in self.enqueued.items() if rdir not in self.finished ]
@@ -16,6 +16,7 @@ def logger_process(logfn, overwrite, queue, prolog):
             print(log, file=logfile)
 
 __prolog = []
+__queue = None # queue of the running logger, used when no queue is passed to message()
 
 def start(logfn, append, queue):
     """Start the asynchronous logger thread.
@@ -25,10 +26,11 @@ def start(logfn, append, queue):
     restarted later in the same process (e.g., during a second orchestration
     phase).
     """
-    global logger, __prolog
+    global logger, __prolog, __queue
     # Snapshot and clear prolog to avoid duplicate headers on subsequent starts
     prolog_snapshot = list(__prolog)
     __prolog = []
+    __queue = queue
     logger = threading.Thread(target=logger_process, args=(logfn,append,queue,prolog_snapshot))
     logger.start()
 
@@ -67,11 +69,14 @@ def message(con=None, log=None, queue=None):
         return
 
     if to_file:
+        queue = queue or __queue
         if queue:
             queue.put(to_file)
         else:
             __prolog.append(to_file)
 
 def stop(queue):
+    global __queue
+    __queue = None
     queue.put(None)
     logger.join()
@@ -0,0 +1,217 @@
+"""Live metrics of a run in the Prometheus text format.
+
+With --metrics-port PORT, they are served at http://127.0.0.1:PORT/metrics;
+with --metrics-file FILE, FILE is rewritten every METRICS_INTERVAL seconds
+(e.g. for the textfile collector of the node exporter) and once more at the
+end of the run.
+
+    smartbugs_run_info{runid,version}               1
+    smartbugs_start_time_seconds                    start of the run (Unix time)
+    smartbugs_tasks_total/_started/_completed       progress of the current batch
+    smartbugs_queue_depth                           items waiting to be started
+    smartbugs_containers_running                    items (containers) running
+    smartbugs_tasks_finished_total{tool,status}     tasks done, status ok, failed or timeout
+    smartbugs_task_seconds_total{tool}              time taken by these tasks
+    smartbugs_tool_throughput{tool}                 tasks per minute over the last METRICS_WINDOW seconds
+    smartbugs_tool_failure_ratio{tool}              share of the tasks done that failed
+    smartbugs_tool_timeout_ratio{tool}              share of the tasks done that timed out
+    smartbugs_last_completion_timestamp_seconds     when the last task was done
+    smartbugs_budget_remaining_seconds              time left of --time-budget
+
+The counts come from the main process: the task accounting of the pool
+(sb.analysis.Progress), its scheduler queue, and the tasks reported done by
+the analysers or the asyncio engine.
+"""
+
+import collections, http.server, os, tempfile, threading, time
+import sb.cfg, sb.colors, sb.errors, sb.logging
+
+STATUSES = ("ok", "failed", "timeout")
+
+
+
+class Metrics:
+    """Counters of a run; updated and read by the threads of the main process."""
+
+    def __init__(self, settings, pool):
+        self.settings = settings
+        self.pool = pool
+        self.start_time = time.time()
+        self.deadline = None
+        self.finished = {} # {(tool, status): tasks}
+        self.seconds = {} # {tool: seconds}
+        self.recent = collections.deque() # (time, tool) of the tasks done in the last METRICS_WINDOW seconds
+        self.last_completion = None
+        self.lock = threading.Lock()
+
+
+    def completed(self, toolid, status, duration):
+        tool = toolid.split("-")[0]
+        now = time.time()
+        with self.lock:
+            self.finished[(tool, status)] = self.finished.get((tool, status), 0) + 1
+            self.seconds[tool] = self.seconds.get(tool, 0.0) + (duration or 0.0)
+            self.recent.append((now, tool))
+            self.last_completion = now
+
+
+    def text(self):
+        """The metrics in the Prometheus text exposition format."""
+        now = time.time()
+        progress, queue = self.pool.progress, self.pool.queue
+        lines = []
+
+        def metric(name, kind, help, samples):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels,value in samples:
+                label_str = ",".join(f'{k}="{escape(v)}"' for k,v in labels.items())
+                lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+
+        with self.lock:
+            while self.recent and self.recent[0][0] < now - sb.cfg.METRICS_WINDOW:
+                self.recent.popleft()
+            recent = collections.Counter(tool for _,tool in self.recent)
+            finished = dict(self.finished)
+            seconds = dict(self.seconds)
+            last_completion = self.last_completion
+        tools = sorted(seconds)
+        done = { tool: sum(finished.get((tool, s), 0) for s in STATUSES) for tool in tools }
+        window = min(sb.cfg.METRICS_WINDOW, now - self.start_time) or 1
+
+        metric("smartbugs_run_info", "gauge", "Run id and SmartBugs version.",
+            [({"runid": self.settings.runid, "version": sb.cfg.VERSION}, 1)])
+        metric("smartbugs_start_time_seconds", "gauge", "Start of the run, as Unix time.",
+            [({}, round(self.start_time, 3))])
+        metric("smartbugs_tasks_total", "gauge", "Tasks of the current batch, including follow-ups.",
+            [({}, progress.tasks_total.value)])
+        metric("smartbugs_tasks_started", "gauge", "Tasks of the current batch started.",
+            [({}, progress.tasks_started.value)])
+        metric("smartbugs_tasks_completed", "gauge", "Tasks of the current batch completed.",
+            [({}, progress.tasks_completed.value)])
+        metric("smartbugs_queue_depth", "gauge", "Tasks and batches waiting to be started.",
+            [({}, len(queue))])
+        metric("smartbugs_containers_running", "gauge", "Tasks and batches running, one container each.",
+            [({}, len(queue.running))])
+        metric("smartbugs_tasks_finished_total", "counter", "Tasks done in this run, by tool and status.",
+            [({"tool": tool, "status": s}, finished.get((tool, s), 0)) for tool in tools for s in STATUSES])
+        metric("smartbugs_task_seconds_total", "counter", "Duration of the tasks done in this run, by tool.",
+            [({"tool": tool}, round(seconds[tool], 3)) for tool in tools])
+        metric("smartbugs_tool_throughput", "gauge", f"Tasks done per minute over the last {sb.cfg.METRICS_WINDOW} seconds, by tool.",
+            [({"tool": tool}, round(60 * recent.get(tool, 0) / window, 3)) for tool in tools])
+        metric("smartbugs_tool_failure_ratio", "gauge", "Share of the tasks done that failed, by tool.",
+            [({"tool": tool}, round(finished.get((tool, "failed"), 0) / done[tool], 4)) for tool in tools])
+        metric("smartbugs_tool_timeout_ratio", "gauge", "Share of the tasks done that ran into their timeout, by tool.",
+            [({"tool": tool}, round(finished.get((tool, "timeout"), 0) / done[tool], 4)) for tool in tools])
+        if last_completion is not None:
+            metric("smartbugs_last_completion_timestamp_seconds", "gauge", "When the last task was done, as Unix time.",
+                [({}, round(last_completion, 3))])
+        if self.deadline is not None:
+            metric("smartbugs_budget_remaining_seconds", "gauge", "Time left of the time budget.",
+                [({}, max(0, round(self.deadline - now)))])
+        return "\n".join(lines) + "\n"
+
+
+    def write(self, fn):
+        """Replace fn by the current metrics."""
+        try:
+            os.makedirs(os.path.dirname(fn) or ".", exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(fn) or ".", prefix=".tmp-")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.text())
+            os.replace(tmp, fn)
+        except OSError as e:
+            raise sb.errors.SmartBugsError(f"Cannot write metrics {fn}: {e}")
+
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = _metrics.text().encode() if _metrics else b""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+
+# the metrics of the run, the server and the thread rewriting the file, if any
+_metrics = None
+_server = None
+_writer = None
+_stopped = threading.Event()
+
+def start(settings, pool):
+    """Start collecting the metrics of the tasks run by pool, and publish them."""
+    global _metrics, _server, _writer
+    if not settings.metrics_port and not settings.metrics_file:
+        return
+    _metrics = Metrics(settings, pool)
+    _stopped.clear()
+    if settings.metrics_port:
+        try:
+            _server = http.server.ThreadingHTTPServer(("127.0.0.1", settings.metrics_port), Handler)
+        except OSError as e:
+            sb.logging.message(sb.colors.warning(f"Warning: cannot serve metrics on port {settings.metrics_port}: {e}"))
+        else:
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+            sb.logging.message(f"Serving metrics at http://127.0.0.1:{settings.metrics_port}/metrics", "INFO")
+    if settings.metrics_file:
+        _writer = threading.Thread(target=rewrite, args=(settings.metrics_file,), name="metrics-file", daemon=True)
+        _writer.start()
+
+
+def rewrite(fn):
+    """Rewrite fn every METRICS_INTERVAL seconds until stopped; errors are reported once."""
+    reported = False
+    while not _stopped.wait(sb.cfg.METRICS_INTERVAL):
+        try:
+            _metrics.write(fn)
+        except sb.errors.SmartBugsError as e:
+            if not reported:
+                sb.logging.message(sb.colors.warning(f"Warning: {e}"))
+                reported = True
+
+
+def completed(toolid, status, duration):
+    """Count a task done; called in the main process."""
+    if _metrics:
+        _metrics.completed(toolid, status, duration)
+
+
+def budget(deadline):
+    """Report the time left until deadline (Unix time) as the remaining budget."""
+    if _metrics:
+        _metrics.deadline = deadline
+
+
+def stop():
+    """Publish the final metrics, and stop serving them."""
+    global _metrics, _server, _writer
+    if not _metrics:
+        return
+    _stopped.set()
+    if _writer:
+        _writer.join()
+        try:
+            _metrics.write(_metrics.settings.metrics_file)
+        except sb.errors.SmartBugsError as e:
+            sb.logging.message(sb.colors.warning(f"Warning: {e}"))
+    if _server:
+        _server.shutdown()
+        _server.server_close()
+    _metrics, _server, _writer = None, None, None
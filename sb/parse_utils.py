@@ -1,6 +1,6 @@
 '''Utilities for the output parsers'''
 
-import re
+import io, os, re, tarfile
 
 DOCKER_CODES = {
     125: "DOCKER_INVOCATION_PROBLEM",
@@ -14,7 +14,7 @@ DOCKER_CODES = {
 
 ANSI = re.compile("\x1b\\[[^m]*m")
 def discard_ANSI(lines):
-    return ( ANSI.sub('',line) for line in lines )
+    return ( ANSI.sub('',line) if "\x1b" in line else line for line in lines )
 
 
 def truncate_message(m, length=205):
@@ -30,34 +30,59 @@ EXCEPTIONS = (
     re.compile("thread '[^']*' panicked at '([^']*)'"), # Rust
 )
 
-def exceptions(lines):
-    exceptions = set()
-    traceback = False
-    for line in lines:
-        if traceback:
+# The patterns of EXCEPTIONS as one alternation. Only lines containing one
+# of the literals tested in ExceptionScanner are matched against it, which
+# rules out most lines at the cost of a few substring tests.
+EXCEPTION = re.compile("|".join(f"(?:{e.pattern})" for e in EXCEPTIONS))
+
+class ExceptionScanner:
+    """Collects the exceptions in a log, fed line by line."""
+
+    def __init__(self):
+        self.exceptions = set()
+        self.traceback = False
+
+    def feed(self, line):
+        if (self.traceback or "Traceback" in line or "Killed" in line or "Segmentation fault" in line
+                or "Exception in thread" in line or "panicked at" in line):
+            self.match(line)
+
+    def feed_lines(self, lines):
+        # same as feed, without a method call per line
+        for line in lines:
+            if (self.traceback or "Traceback" in line or "Killed" in line or "Segmentation fault" in line
+                    or "Exception in thread" in line or "panicked at" in line):
+                self.match(line)
+
+    def match(self, line):
+        if self.traceback:
             if line and line[0] != " ":
-                exceptions.add(f"exception ({line})")
-                traceback = False
+                self.exceptions.add(f"exception ({line})")
+                self.traceback = False
         elif line.endswith(TRACEBACK):
-            traceback = True
+            self.traceback = True
         else:
-            for re_exception in EXCEPTIONS:
-                m = re_exception.match(line)
-                if m:
-                    exceptions.add(f"exception ({m[1]})")
-    return exceptions
+            m = EXCEPTION.match(line)
+            if m:
+                self.exceptions.add(f"exception ({m[m.lastindex]})")
 
 
-def add_match(matches, line, patterns):
-    for pattern in patterns:
-        m = pattern.match(line)
-        if m:
-            matches.add(m[1])
-            return True
-    return False
+def exceptions(lines):
+    scanner = ExceptionScanner()
+    scanner.feed_lines(lines)
+    return scanner.exceptions
 
 
 def errors_fails(exit_code, log, log_expected=True):
+    errors, fails = exit_code_errors_fails(exit_code)
+    if log:
+        fails.update(exceptions(log))
+    elif log_expected and not fails:
+        fails.add('execution failed')
+    return errors, fails
+
+
+def exit_code_errors_fails(exit_code):
     errors   = set() # errors detected and handled by the tool
     fails    = set() # exceptions not caught by the tool, or outside events leading to abortion
     if exit_code is None:
@@ -73,9 +98,95 @@ def errors_fails(exit_code, log, log_expected=True):
     else:
         # remove it for individual signals and tools, where it is not an error
         errors.add(f"EXIT_CODE_{exit_code}")
-    if log:
-        fails.update(exceptions(log))
-    elif log_expected and not fails:
-        fails.add('execution failed')
     return errors, fails
 
+
+
+class Scan:
+    """One pass over the log, for parsers of protocol 2.
+
+    Iterating over the scan yields the lines of the log, which are scanned
+    for exceptions on the way. The parser may stop iterating early; then
+    errors_fails() scans the remaining lines for exceptions only, and
+    classifies exit code and exceptions like the function errors_fails.
+    """
+
+    def __init__(self, exit_code, log, log_expected=True):
+        self.exit_code = exit_code
+        self.log = iter(log)
+        self.log_expected = log_expected
+        self.scanner = ExceptionScanner()
+        self.empty = True
+
+    def __iter__(self):
+        feed = self.scanner.feed
+        for line in self.log:
+            self.empty = False
+            feed(line)
+            yield line
+
+    def errors_fails(self):
+        # the lines the parser did not read are scanned for exceptions only
+        for line in self.log:
+            self.empty = False
+            self.scanner.feed(line)
+            self.scanner.feed_lines(self.log)
+        errors, fails = exit_code_errors_fails(self.exit_code)
+        if not self.empty:
+            fails.update(self.scanner.exceptions)
+        elif self.log_expected and not fails:
+            fails.add('execution failed')
+        return errors, fails
+
+
+
+
+class OutputFiles:
+    """Files in the output of a tool.
+
+    The output is either a tar archive (bytes, as stored in result.tar) or
+    the path of the directory the output was bind-mounted to (result.output,
+    for tools with 'output_mount'). In the archive, names start with the last
+    component of the tool's output path; in the directory, they are relative
+    to it. Parsers matching names by suffix work with both.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self.tar = tarfile.open(fileobj=io.BytesIO(output)) if isinstance(output, (bytes, bytearray)) else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.tar is not None:
+            self.tar.close()
+
+    def names(self):
+        if self.tar is not None:
+            return self.tar.getnames()
+        names = []
+        if self.output and os.path.isdir(self.output):
+            for path,dirs,fns in os.walk(self.output):
+                dirs.sort()
+                for fn in sorted(fns):
+                    names.append(os.path.relpath(os.path.join(path, fn), self.output))
+        return names
+
+    def open(self, name):
+        """Binary file object for the file name; raises KeyError if there is none."""
+        if self.tar is not None:
+            f = self.tar.extractfile(name)
+        else:
+            fn = os.path.join(self.output, name) if self.output else None
+            f = open(fn, "rb") if fn and os.path.isfile(fn) else None
+        if f is None:
+            raise KeyError(name)
+        return f
+
+    def read(self, name):
+        with self.open(name) as f:
+            return f.read()
@@ -1,5 +1,5 @@
 import os, importlib.util
-import sb.cfg, sb.errors
+import sb.cfg, sb.errors, sb.io
 
 tool_parsers = {}
 
@@ -20,6 +20,36 @@ def get_parser(tool):
 
 
 
+def stored_output(rdir):
+    """Tool output stored in the result dir rdir, as passed to the parsers.
+
+    This is the directory the output was bind-mounted to, or else the
+    contents of the tar archive, or None if the tool had no output.
+    """
+    fn_dir = os.path.join(rdir, sb.cfg.TOOL_OUTPUT_DIR)
+    if os.path.isdir(fn_dir):
+        return fn_dir
+    fn_tar = os.path.join(rdir, sb.cfg.TOOL_OUTPUT)
+    return sb.io.read_bin(fn_tar) if os.path.exists(fn_tar) else None
+
+
+
+def parser_log(tool_parser, tool_log):
+    """The log in the form the parser expects.
+
+    Parsers declaring PROTOCOL = 2 read the log once, as an iterator over its
+    lines, and may stop early (see sb.parse_utils.Scan). Other parsers get a
+    sequence they may iterate repeatedly and index: a list, or sb.io.LogLines,
+    which rereads the file for every pass.
+    """
+    if getattr(tool_parser, "PROTOCOL", 1) >= 2:
+        return iter(tool_log)
+    if isinstance(tool_log, (list, tuple, sb.io.LogLines)):
+        return tool_log
+    return list(tool_log)
+
+
+
 def parse(task_log, tool_log, tool_output):
     tool = task_log["tool"]
     filename = task_log["filename"]
@@ -28,7 +58,7 @@ def parse(task_log, tool_log, tool_output):
 
     tool_parser = get_parser(tool)
     try:
-        findings,infos,errors,fails = tool_parser.parse(exit_code, tool_log, tool_output)
+        findings,infos,errors,fails = tool_parser.parse(exit_code, parser_log(tool_parser, tool_log), tool_output)
         for finding in findings:
             # if FINDINGS is defined, ensure that the current finding is in FINDINGS
             # irrelevant for SmartBugs, but may be relevant for programs further down the line
@@ -36,7 +66,9 @@ def parse(task_log, tool_log, tool_output):
                 raise sb.errors.SmartBugsError(f"'{finding['name']}' not among the findings of {tool['id']}")
             # check that filename within docker corresponds to filename outside, before replacing it
             # splitting at "/" is ok, since it is a Linux path from within the docker container
-            assert not finding.get("filename") or filename.endswith(finding["filename"].split("/")[-1])
+            # for duplicates, the tool saw the contract the results were copied from
+            analysed = task_log.get("duplicate_of", filename)
+            assert not finding.get("filename") or analysed.endswith(finding["filename"].split("/")[-1])
             finding["filename"] = filename
     except Exception as e:
         raise
@@ -0,0 +1,71 @@
+"""Profiles of the processes of a run (--profile DIR), with cProfile.
+
+Each process profiles its main thread from start() on, and writes its stats
+to DIR as NAME-PID.prof when it stops: the main process (collecting files,
+assembling tasks, planning budget batches, and the asyncio engine's event
+loop), every analyser, the parser processes of the asyncio engine, and the
+processes of reparse. The stats load with pstats or snakeviz. Processes
+started by multiprocessing (with spawn) stop when they exit. The main
+process stops last and merges the stats of all processes of the run into
+SUMMARY, the PROFILE_TOP functions taking the most time of their own.
+
+Threads other than the main thread (the coordinator, the Docker threads of
+the asyncio engine) are not profiled. A sampling profiler like py-spy can
+be attached to the processes instead; their PIDs are in the file names.
+"""
+
+import cProfile, glob, io, multiprocessing, multiprocessing.util, os, pstats, time
+import sb.cfg
+
+SUMMARY = "summary.txt"
+
+# the profile of this process, its file, and the start of the run (main process)
+_profile = None
+_fn = None
+_start_time = None
+
+
+
+def start(directory, name):
+    """Profile the main thread of this process until stop(), if directory is set."""
+    global _profile, _fn, _start_time
+    if not directory or _profile is not None:
+        return
+    os.makedirs(directory, exist_ok=True)
+    _fn = os.path.join(directory, f"{name}-{os.getpid()}.prof")
+    _start_time = time.time()
+    _profile = cProfile.Profile()
+    if multiprocessing.parent_process() is not None:
+        # spawned processes do not run atexit handlers, but these finalizers
+        multiprocessing.util.Finalize(None, stop, exitpriority=10)
+    _profile.enable()
+
+
+def stop():
+    """Stop profiling, and write the stats of this process."""
+    global _profile
+    if _profile is None:
+        return
+    _profile.disable()
+    profile, _profile = _profile, None
+    profile.dump_stats(_fn)
+
+
+def summary(directory):
+    """Merge the stats written to directory since start() into SUMMARY; returns its name, or None.
+
+    Stats of earlier runs in the same directory are left out.
+    """
+    fns = [ fn for fn in glob.glob(os.path.join(directory, "*.prof"))
+        if _start_time is None or os.path.getmtime(fn) >= _start_time ]
+    if not fns:
+        return None
+    out = io.StringIO()
+    stats = pstats.Stats(*sorted(fns), stream=out)
+    print(f"{len(fns)} profiles merged: {', '.join(os.path.basename(fn) for fn in sorted(fns))}\n", file=out)
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(sb.cfg.PROFILE_TOP)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(sb.cfg.PROFILE_TOP)
+    fn = os.path.join(directory, SUMMARY)
+    with open(fn, "w", encoding="utf-8") as f:
+        f.write(out.getvalue())
+    return fn
@@ -1,54 +1,188 @@
-import os, argparse, multiprocessing, sys
-import sb.cfg, sb.io, sb.parsing, sb.sarif, sb.errors
+import os, argparse, multiprocessing, sys, json, sqlite3, tempfile, time
+import sb.cfg, sb.io, sb.parsing, sb.sarif, sb.errors, sb.index, sb.profiling
 
 
 
-def reparser(taskqueue, sarif, verbose):
+def parser_version(tool):
+    """VERSION of the parser currently installed for tool (a dict with id, mode, parser), or None."""
+    try:
+        return sb.parsing.get_parser(tool).VERSION
+    except Exception:
+        return None
+
+
+def manifest_entry(tool, version, d):
+    return {
+        "id": tool["id"],
+        "mode": tool["mode"],
+        "parser": tool["parser"],
+        "version": version,
+        "inputs": sb.index.inputs(d),
+    }
+
+
+def parsed_before(d, sbj, sarif):
+    """Manifest entry for d if its result.json is newer than the tool's log and
+    output and was produced by the current parser; None otherwise."""
+    fn_json = os.path.join(d, sb.cfg.PARSER_OUTPUT)
+    try:
+        mtime = os.path.getmtime(fn_json)
+        if sarif and not os.path.exists(os.path.join(d, sb.cfg.SARIF_OUTPUT)):
+            return None
+        for fn in (sb.cfg.TOOL_LOG, sb.cfg.TOOL_OUTPUT, sb.cfg.TOOL_OUTPUT_DIR):
+            fn = os.path.join(d, fn)
+            if os.path.exists(fn) and os.path.getmtime(fn) >= mtime:
+                return None
+        version = sb.io.read_json(fn_json)["parser"]["version"]
+    except (OSError, KeyError, TypeError, sb.errors.SmartBugsError):
+        return None
+    tool = sbj["tool"]
+    if version is None or version != parser_version(tool):
+        return None
+    return manifest_entry(tool, version, d)
+
+
+def reparser(taskqueue, resultqueue, sarif, tar, incremental, verbose, profile=None):
+    sb.profiling.start(profile, "reparser")
     while True:
-        d = taskqueue.get()
-        if d is None:
+        item = taskqueue.get()
+        if item is None:
             break
+        root, rel, index = item
+        status, entry = reparse(os.path.join(root, rel), sarif, tar, incremental, verbose, index)
+        resultqueue.put((root, rel, status, entry))
 
-        fn_sbj = os.path.join(d, sb.cfg.TASK_LOG)
-        fn_log = os.path.join(d, sb.cfg.TOOL_LOG)
-        fn_tar = os.path.join(d, sb.cfg.TOOL_OUTPUT)
-        fn_json = os.path.join(d, sb.cfg.PARSER_OUTPUT)
-        fn_sarif = os.path.join(d, sb.cfg.SARIF_OUTPUT)
 
-        if not os.path.exists(fn_sbj):
-            if verbose:
-                print(f"{d}: {sb.cfg.TASK_LOG} not found, skipping")
-            continue
+def reparse(d, sarif, tar, incremental, verbose, index=None):
+    """Parse the results in d; returns 'parsed', 'skipped' or 'failed', and the manifest entry.
 
-        for fn in (fn_json, fn_sarif):
-            try:
-                os.remove(fn)
-            except Exception:
-                pass
-        if os.path.exists(fn_json) or os.path.exists(fn_sarif):
-            print(f"{d}: Cannot clear old parse output, skipping")
-            continue
+    The parsed output is recorded in the index of the results tree at index, if given.
+    """
+    fn_sbj = os.path.join(d, sb.cfg.TASK_LOG)
+    fn_log = os.path.join(d, sb.cfg.TOOL_LOG)
+    fn_tar = os.path.join(d, sb.cfg.TOOL_OUTPUT)
+    fn_dir = os.path.join(d, sb.cfg.TOOL_OUTPUT_DIR)
+    fn_json = os.path.join(d, sb.cfg.PARSER_OUTPUT)
+    fn_sarif = os.path.join(d, sb.cfg.SARIF_OUTPUT)
 
+    if not os.path.exists(fn_sbj):
         if verbose:
-            print(d)
+            print(f"{d}: {sb.cfg.TASK_LOG} not found, skipping")
+        return "failed", None
+
+    try:
         sbj = sb.io.read_json(fn_sbj)
-        log = sb.io.read_lines(fn_log) if os.path.exists(fn_log) else []
-        tar = sb.io.read_bin(fn_tar) if os.path.exists(fn_tar) else None
+    except sb.errors.SmartBugsError as e:
+        print(f"{d}: {e}")
+        return "failed", None
+
+    if incremental:
+        entry = parsed_before(d, sbj, sarif)
+        if entry:
+            return "skipped", entry
+
+    for fn in (fn_json, fn_sarif):
         try:
-            parsed_result = sb.parsing.parse(sbj, log, tar)
+            os.remove(fn)
+        except Exception:
+            pass
+    if os.path.exists(fn_json) or os.path.exists(fn_sarif):
+        print(f"{d}: Cannot clear old parse output, skipping")
+        return "failed", None
+
+    if verbose:
+        print(d)
+    if tar and os.path.isdir(fn_dir) and not os.path.exists(fn_tar):
+        # archive for consumers of result.tar, named like Docker names it
+        output = (sbj.get("tool") or {}).get("output") or sb.cfg.TOOL_OUTPUT_DIR
+        try:
+            sb.io.write_tar(fn_tar, fn_dir, os.path.basename(output.rstrip("/")))
         except sb.errors.SmartBugsError as e:
-            print(e)
-            continue
-        except Exception as e:
-            print(f"Unexpected error while parsing {d}: {e}")
-            if verbose:
-                import traceback
-                traceback.print_exc()
-            continue
-        sb.io.write_json(fn_json, parsed_result)
-        if sarif:
-            sarif_result = sb.sarif.sarify(sbj["tool"], parsed_result["findings"])
-            sb.io.write_json(fn_sarif, sarif_result)
+            print(f"{d}: Cannot create {sb.cfg.TOOL_OUTPUT}: {e}")
+    start_time = time.perf_counter()
+    log = sb.io.LogLines(fn_log)
+    output = sb.parsing.stored_output(d)
+    try:
+        parsed_result = sb.parsing.parse(sbj, log, output)
+    except sb.errors.SmartBugsError as e:
+        print(e)
+        return "failed", None
+    except Exception as e:
+        print(f"Unexpected error while parsing {d}: {e}")
+        if verbose:
+            import traceback
+            traceback.print_exc()
+        return "failed", None
+    sb.io.write_json(fn_json, parsed_result)
+    if sarif:
+        sarif_result = sb.sarif.sarify(sbj["tool"], parsed_result["findings"])
+        sb.io.write_json(fn_sarif, sarif_result)
+    if isinstance(sbj.get("timings"), dict):
+        # keep the timings of the run, add the latest reparse
+        sbj["timings"]["reparse"] = round(time.perf_counter() - start_time, 6)
+        try:
+            sb.io.write_json(fn_sbj, sbj)
+        except sb.errors.SmartBugsError as e:
+            print(f"{d}: Cannot record timings: {e}")
+    if index:
+        rdir = os.path.relpath(d, index)
+        try:
+            sb.index.put(index, rdir, sbj)
+            sb.index.put_parsed(index, rdir, parsed_result, True, sarif)
+        except (sb.errors.SmartBugsError, sqlite3.Error) as e:
+            print(f"{d}: Cannot update index: {e}")
+    return "parsed", manifest_entry(sbj["tool"], parsed_result["parser"]["version"], d)
+
+
+
+def read_manifest(root):
+    """Entries of the manifest of root, by directory relative to root."""
+    fn = os.path.join(root, sb.cfg.REPARSE_MANIFEST)
+    try:
+        with open(fn, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        return manifest if isinstance(manifest, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(root, manifest):
+    fn = os.path.join(root, sb.cfg.REPARSE_MANIFEST)
+    try:
+        fd, tmp = tempfile.mkstemp(dir=root, prefix=".tmp-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, separators=(",",":"))
+        os.replace(tmp, fn)
+    except OSError as e:
+        print(f"Cannot write {fn}: {e}")
+
+
+def up_to_date(entry, d, files, sarif, versions):
+    """Whether the manifest entry of the directory d with the given files is
+    parsed by the current parser, from its current log and output."""
+    if sb.cfg.PARSER_OUTPUT not in files or (sarif and sb.cfg.SARIF_OUTPUT not in files):
+        return False
+    try:
+        key = (entry["id"], entry["mode"], entry["parser"])
+    except (KeyError, TypeError):
+        return False
+    if key not in versions:
+        versions[key] = parser_version({"id": key[0], "mode": key[1], "parser": key[2]})
+    return (versions[key] is not None and entry.get("version") == versions[key]
+        and entry.get("inputs") == sb.index.inputs(d))
+
+
+
+def indexed_up_to_date(row, d, sarif, versions):
+    """Whether the index row of the directory d records a result.json (and
+    result.sarif) written by the current parser, from its current log and output."""
+    if not row["result_json"] or (sarif and not row["result_sarif"]):
+        return False
+    key = (row["toolid"], row["mode"], row["parser"])
+    if key not in versions:
+        versions[key] = parser_version({"id": key[0], "mode": key[1], "parser": key[2]})
+    return (versions[key] is not None and row["parser_version"] == str(versions[key])
+        and row["inputs"] == sb.index.inputs(d))
 
 
 
@@ -59,11 +193,20 @@ def main():
     argparser.add_argument("--sarif",
         action="store_true",
         help=f"generate sarif output, {sb.cfg.SARIF_OUTPUT}, as well")
+    argparser.add_argument("--tar",
+        action="store_true",
+        help=f"archive bind-mounted output, {sb.cfg.TOOL_OUTPUT_DIR}, as {sb.cfg.TOOL_OUTPUT}")
+    argparser.add_argument("--incremental",
+        action="store_true",
+        help=f"skip directories whose {sb.cfg.PARSER_OUTPUT} is up to date with the tool output and the parser")
     argparser.add_argument("--processes",
         type=int,
         metavar="N",
         default=1,
         help="number of parallel processes (default 1)")
+    argparser.add_argument("--profile",
+        metavar="DIR",
+        help="profile all processes, writing their stats and a summary to DIR")
     argparser.add_argument("-v",
         action='store_true',
         help="show progress")
@@ -77,30 +220,83 @@ def main():
         sys.exit(1)
 
     args = argparser.parse_args()
+    sb.profiling.start(args.profile, "reparse")
 
-    results = set()
+    # The directories below a root covered by a complete index are taken from
+    # the index, and otherwise found by walking the tree. In incremental mode,
+    # directories are skipped if the index, or else the manifest of the root,
+    # lists them with the parser version of their result.json, and with the
+    # modification times and sizes their log and output still have. All
+    # others are handed to the reparsers.
+    counts = { "parsed": 0, "skipped": 0, "failed": 0 }
+    manifests = {}
+    queued = []
+    seen = set()
+    versions = {}
     for r in args.results:
+        index = sb.index.find(r)
+        if index and sb.index.complete(index):
+            for row in sb.index.rows(index, r):
+                path = os.path.join(index, row["rdir"])
+                real = os.path.realpath(path)
+                if real in seen:
+                    continue
+                seen.add(real)
+                if args.incremental and indexed_up_to_date(row, path, args.sarif, versions):
+                    counts["skipped"] += 1
+                else:
+                    queued.append((r, os.path.relpath(path, r), index))
+            continue
+        manifest = read_manifest(r) if args.incremental else {}
+        manifests[r] = {}
         for path,_,files in os.walk(r):
-            if sb.cfg.TASK_LOG in files:
-                results.add(path)
+            if sb.cfg.TASK_LOG not in files:
+                continue
+            real = os.path.realpath(path)
+            if real in seen:
+                continue
+            seen.add(real)
+            rel = os.path.relpath(path, r)
+            entry = manifest.get(rel)
+            if entry and up_to_date(entry, path, files, args.sarif, versions):
+                manifests[r][rel] = entry
+                counts["skipped"] += 1
+            else:
+                queued.append((r, rel, index))
 
     # spawn processes, instead of forking, to have same behavior under Linux and MacOS
     mp = multiprocessing.get_context("spawn")
 
     taskqueue = mp.Queue()
-    for r in sorted(results):
-        taskqueue.put(r)
+    resultqueue = mp.Queue()
+    for item in sorted(queued):
+        taskqueue.put(item)
     for _ in range(args.processes):
         taskqueue.put(None)
 
-    reparsers = [ mp.Process(target=reparser, args=(taskqueue,args.sarif,args.v)) for _ in range(args.processes) ]
+    reparsers = [ mp.Process(target=reparser, args=(taskqueue,resultqueue,args.sarif,args.tar,args.incremental,args.v,args.profile)) for _ in range(args.processes) ]
     for r in reparsers:
         r.start()
+    for _ in queued:
+        root, rel, status, entry = resultqueue.get()
+        counts[status] += 1
+        if entry and root in manifests:
+            manifests[root][rel] = entry
     for r in reparsers:
         r.join()
 
+    for r,manifest in manifests.items():
+        if os.path.isdir(r):
+            write_manifest(r, manifest)
+    print(f"{counts['parsed']} parsed, {counts['skipped']} skipped, {counts['failed']} failed")
+
+    if args.profile:
+        sb.profiling.stop()
+        fn = sb.profiling.summary(args.profile)
+        if fn:
+            print(f"Profiles written to {args.profile}, hot functions in {fn}")
+
 
 
 if __name__ == '__main__':
     main()
-
@@ -1,5 +1,5 @@
 import argparse, csv, os, sys
-import sb.cfg, sb.io, sb.utils, sb.vulnerability
+import sb.cfg, sb.index, sb.io
 
 FIELDS = (
     "filename", "basename", "toolid", "toolmode", "tool_args", "parser_version", "runid",
@@ -42,16 +42,42 @@ def main():
 
     fields = [ f for f in args.f if f not in args.x ]
 
-    results = set()
-    for r in args.results:
+    csv_out = csv.writer(sys.stdout)
+    csv_out.writerow(fields)
+    for row in collect(args.results, args.p, fields, args.v):
+        csv_out.writerow(row)
+
+
+
+def collect(results, postgres, fields, verbose=False):
+    """Rows of csv values for the result dirs below the directories results.
+
+    Directories covered by a complete index (sb.index) are read from the
+    index, the others from the result files.
+    """
+    indexed = []
+    walked = set()
+    for r in results:
+        root = sb.index.find(r)
+        if root and sb.index.complete(root):
+            indexed.append((root, r))
+            continue
         for path,_,files in os.walk(r):
             if sb.cfg.TASK_LOG in files:
-                results.add(path)
+                walked.add(path)
 
-    csv_out = csv.writer(sys.stdout)
-    csv_out.writerow(fields)
-    for r in sorted(results):
-        if args.v:
+    for root,r in indexed:
+        for row in sb.index.rows(root, r):
+            path = os.path.join(root, row["rdir"])
+            if verbose:
+                print(path, file=sys.stderr)
+            if row["parser_version"] is None:
+                print(f"{path}: No parsed output; use 'reparse' to generate it.", file=sys.stderr)
+                continue
+            yield row2csv(row, postgres, fields)
+
+    for r in sorted(walked):
+        if verbose:
             print(r, file=sys.stderr)
         try:
             task_log = sb.io.read_json(os.path.join(r,sb.cfg.TASK_LOG))
@@ -63,7 +89,7 @@ def main():
         except Exception as e:
             print(f"Cannot read parsed output; use 'reparse' to generate it.\n{e}", file=sys.stderr)
             continue
-        csv_out.writerow(data2csv(task_log, parser_output, args.p, fields))
+        yield data2csv(task_log, parser_output, postgres, fields)
 
 
 
@@ -97,20 +123,35 @@ def data2csv(task_log, parser_output, postgres, fields):
         "start": task_log["result"]["start"],
         "duration": task_log["result"]["duration"],
         "exit_code": task_log["result"]["exit_code"],
-        "findings": sorted({
-            (sb.utils.str2label(f.get("name", "")) +
-             (f"@{f['line']}" if str(f.get("line", "")).strip() else ""))
-            for f in parser_output["findings"]}),
-        "classified_findings": [],
+        "findings": sb.index.labels(parser_output["findings"]),
+        "classified_findings": sb.index.categories(task_log["tool"]["id"], parser_output),
         "infos": parser_output["infos"],
         "errors": parser_output["errors"],
         "fails": parser_output["fails"],
     }
+    return format_csv(csv, postgres, fields)
 
-    analyzer = sb.vulnerability.VulnerabilityAnalyzer()
-    classified = analyzer.analyze(csv["toolid"], parser_output)
-    csv["classified_findings"] = sorted({c for item in classified for c in item.get("categories", [])})
+def row2csv(row, postgres, fields):
+    csv = {
+        "filename": row["filename"],
+        "basename": os.path.basename(row["filename"]),
+        "toolid": row["toolid"],
+        "toolmode": row["mode"],
+        "tool_args": row["tool_args"],
+        "parser_version": row["parser_version"],
+        "runid": row["runid"],
+        "start": row["start"],
+        "duration": row["duration"],
+        "exit_code": row["exit_code"],
+        "findings": row["labels"],
+        "classified_findings": row["categories"],
+        "infos": row["infos"],
+        "errors": row["errors"],
+        "fails": row["fails"],
+    }
+    return format_csv(csv, postgres, fields)
 
+def format_csv(csv, postgres, fields):
     for f in ("findings", "classified_findings", "infos", "errors", "fails"):
         if postgres:
             csv[f] = list2postgres(csv[f])
@@ -0,0 +1,214 @@
+"""Order in which queued tasks are handed to the analysers (--schedule POLICY).
+
+    fifo    in the order of queueing: files by name, then tools (default)
+    lpt     longest expected task first, to shorten the makespan
+    sjf     shortest expected task first, for early results
+    fair    round robin over the contracts, each in the order of queueing
+
+Tasks routed dynamically are queued like all others, so with lpt, sjf and
+fair they need not wait for the core tasks of unrelated contracts.
+
+The expected duration of a task comes from the duration model (sb.durations).
+Without history, it is the cost hint of the tool ('cost' in config.yaml, in
+seconds for a contract of SCHEDULE_SIZE bytes), or else the task's timeout
+or SCHEDULE_COST, scaled by the size of the contract and capped at the timeout.
+
+Besides the number of analysers (--processes), an item is started only while
+fewer items of its tool run than the tool's 'concurrency' in config.yaml.
+With --resources, it also has to fit into the CPUs and memory of the host
+left by the items running (see footprint and capacity); an item too large
+for the host starts when nothing else runs.
+"""
+
+import heapq, itertools, os, threading
+import sb.cfg, sb.durations, sb.errors, sb.tasks, sb.utils
+
+
+
+def cost(task, model):
+    """Expected duration of task in seconds."""
+    expected = model.task_expected(task)
+    if expected is not None:
+        return expected
+    timeout = task.timeout or task.settings.timeout
+    hint = task.tool.cost or timeout or sb.cfg.SCHEDULE_COST
+    size = sb.durations.file_size(task.absfn) or 0
+    estimate = hint * max(1.0, size / sb.cfg.SCHEDULE_SIZE)
+    return min(estimate, timeout) if timeout else estimate
+
+
+def footprint(task):
+    """CPUs and bytes of memory used by the container of task.
+
+    The tool's 'cpus' and 'memory' from config.yaml, else the CPU quota and
+    memory limit of the container, else RESOURCE_CPUS and RESOURCE_MEMORY.
+    """
+    tool, settings = task.tool, task.settings
+    quota = settings.cpu_quota or tool.cpu_quota
+    limit = settings.mem_limit or tool.mem_limit
+    cpus = tool.cpus or (quota / sb.cfg.DOCKER_CPU_PERIOD if quota else sb.cfg.RESOURCE_CPUS)
+    memory = tool.memory or sb.utils.parse_size(limit or sb.cfg.RESOURCE_MEMORY)
+    return cpus, memory
+
+
+def capacity():
+    """CPUs and bytes of memory of the host available to containers; memory None if unknown."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        memory = int(os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") * sb.cfg.RESOURCE_MEMORY_FRACTION)
+    except (AttributeError, ValueError, OSError):
+        memory = None
+    return cpus, memory
+
+
+def tasks_of(item):
+    return item.tasks if isinstance(item, sb.tasks.Batch) else (item,)
+
+
+def key_of(item):
+    """Identifies a dispatched item when it is released."""
+    return tasks_of(item)[0].rdir
+
+
+
+class Queue:
+    """Tasks and batches, handed out by priority; shared by the threads of one process.
+
+    Items wait in one heap per tool, as all items of a tool take the same
+    resources; get() and pop() return the item of the highest priority among
+    the tools that may start another item. A dispatched item holds its slot
+    and resources until it is released.
+
+    The queue counts the items put and those handed on by the caller of get()
+    (see dispatched), so that the end of a batch can be detected (see drained).
+    """
+
+    def __init__(self, settings, model, slots):
+        if settings.schedule not in sb.cfg.SCHEDULES:
+            raise sb.errors.InternalError(f"Unknown scheduling policy {settings.schedule}")
+        self.policy = settings.schedule
+        self.model = model
+        self.slots = slots
+        self.capacity = capacity() if settings.resources else None
+        self.heaps = {} # {(toolid, toolmode): [(priority, seq, item), ...]}
+        self.seq = itertools.count()
+        self.turns = {} # fair: {absfn: tasks queued so far}
+        self.running = {} # {key of item: (tool, cpus, memory)}
+        self.running_tools = {} # {tool: items running}
+        self.cpus = 0.0
+        self.memory = 0
+        self.put_total = 0
+        self.dispatched_total = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+
+    def priority(self, item, seq):
+        if self.policy == "lpt":
+            return (-sum(cost(task, self.model) for task in tasks_of(item)), seq)
+        if self.policy == "sjf":
+            return (sum(cost(task, self.model) for task in tasks_of(item)), seq)
+        if self.policy == "fair":
+            absfn = tasks_of(item)[0].absfn
+            turn = self.turns.get(absfn, 0)
+            self.turns[absfn] = turn + 1
+            return (turn, seq)
+        return (seq,)
+
+
+    def put(self, item):
+        self.put_all((item,))
+
+
+    def put_all(self, items):
+        """Queue items at once, so none is handed out before the others are ranked."""
+        with self.condition:
+            for item in items:
+                task = tasks_of(item)[0]
+                seq = next(self.seq)
+                heap = self.heaps.setdefault((task.toolid, task.toolmode), [])
+                heapq.heappush(heap, (self.priority(item, seq), seq, item))
+                self.put_total += 1
+            self.condition.notify_all()
+
+
+    def admits(self, tool, item):
+        concurrency = tasks_of(item)[0].tool.concurrency
+        if concurrency and self.running_tools.get(tool, 0) >= concurrency:
+            return False
+        if not self.capacity or not self.running:
+            return True
+        cpus, memory = footprint(tasks_of(item)[0])
+        host_cpus, host_memory = self.capacity
+        return (self.cpus + cpus <= host_cpus and
+            (host_memory is None or self.memory + memory <= host_memory))
+
+
+    def pop(self):
+        """Item of the highest priority that may start now, or None."""
+        with self.condition:
+            if len(self.running) >= self.slots:
+                return None
+            best = None
+            for tool,heap in self.heaps.items():
+                if heap and (best is None or heap[0] < self.heaps[best][0]) and self.admits(tool, heap[0][-1]):
+                    best = tool
+            if best is None:
+                return None
+            item = heapq.heappop(self.heaps[best])[-1]
+            cpus, memory = footprint(tasks_of(item)[0]) if self.capacity else (0.0, 0)
+            self.running[key_of(item)] = (best, cpus, memory)
+            self.running_tools[best] = self.running_tools.get(best, 0) + 1
+            self.cpus += cpus
+            self.memory += memory
+            return item
+
+
+    def get(self):
+        """Item of the highest priority that may start, waiting for one; None once the queue is closed."""
+        with self.condition:
+            while not self.closed:
+                item = self.pop()
+                if item is not None:
+                    return item
+                self.condition.wait()
+            return None
+
+
+    def release(self, key):
+        """Return the slot and resources of the dispatched item with key (see key_of)."""
+        with self.condition:
+            tool, cpus, memory = self.running.pop(key)
+            self.running_tools[tool] -= 1
+            self.cpus -= cpus
+            self.memory -= memory
+            self.condition.notify_all()
+
+
+    def dispatched(self):
+        """Called after an item returned by get() has been handed on."""
+        with self.condition:
+            self.dispatched_total += 1
+            self.condition.notify_all()
+
+
+    def drained(self):
+        """Wait until all items put have been handed on; returns their number."""
+        with self.condition:
+            while self.dispatched_total < self.put_total:
+                self.condition.wait()
+            return self.put_total
+
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+    def __len__(self):
+        with self.condition:
+            return sum(len(heap) for heap in self.heaps.values())
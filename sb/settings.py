@@ -17,17 +17,52 @@ class Settings:
         # duplicates across different contracts. The mapping is
         # {absfn: {"tool|args", ...}}
         self.tool_keys = {}
-        # Track which argument values have been used per tool for subset checks
-        # e.g., {'mythril': {'--modules': {'ExternalCalls', 'DelegateCall'}}}
+        # Track which argument values have been used per file and tool for subset checks
+        # e.g., {(absfn, 'mythril'): {'--modules': {'ExternalCalls', 'DelegateCall'}}}
         self.tool_arg_history = {}
+        # Contracts identical to an analysed one, whose results are copied
+        # from it: {absfn of the analysed contract: [(absfn, relfn), ...]}
+        self.duplicates = {}
+        # Cluster near-duplicate contracts; members only run the core tools,
+        # unless their findings diverge from those of their representative
+        self.cluster = False
+        # {absfn of member: absfn of representative}
+        self.clusters = {}
+        # Tasks of members held back until promotion: {absfn of member: [Task, ...]}
+        self.deferred = {}
         # When True, a tool scheduled without arguments prevents further
         # executions of the same tool with any arguments.        
         self.skip_after_no_args = True
         # Enable or disable dynamic scheduling of additional tools
         self.dynamic = True
         self.runid = "d_${YEAR}${MONTH}${DAY}_${HOUR}${MIN}"
+        # Run id of an interrupted run to resume from its journal (sb.journal)
+        self.resume = None
         self.overwrite = False
         self.processes = 1
+        # Execution engine, one of sb.cfg.ENGINES
+        self.engine = "processes"
+        # Execution backend, one of sb.cfg.BACKENDS, and the configuration of the fake one (sb.fake)
+        self.backend = "docker"
+        self.fake_config = None
+        # Order of the queued tasks, one of sb.cfg.SCHEDULES
+        self.schedule = "fifo"
+        # Start tasks only while their CPUs and memory fit into the host's (sb.scheduler)
+        self.resources = False
+        # Reuse containers across tasks of the same image (sb.docker.WarmPool)
+        self.warm_pool = False
+        # Directory of the result cache shared across runs (sb.cache), and its size limit
+        self.cache = None
+        # Parent of the per-task directories mounted at /sb (e.g. a tmpfs), None for the system default
+        self.tmp_dir = None
+        self.cache_size = sb.cfg.CACHE_SIZE
+        # Timeline of the run in the trace event format (sb.trace), None for none
+        self.trace = None
+        # Live metrics (sb.metrics): local HTTP port, and file rewritten periodically
+        self.metrics_port = None
+        self.metrics_file = None
+        # Directory for the cProfile stats of the processes of the run (sb.profiling), None for none
+        self.profile = None
         self.timeout = None
         # Optional wall-clock budget (seconds) reserved for a second orchestration
         # phase that may run after the core orchestration completes.
@@ -61,6 +96,8 @@ class Settings:
 
         if not self.dynamic:
             self.runid = "${YEAR}${MONTH}${DAY}_${HOUR}${MIN}"
+        if self.resume:
+            self.runid = self.resume
 
         try:
             self.runid = string.Template(self.runid).substitute(env)
@@ -72,6 +109,30 @@ class Settings:
         except KeyError as e:
             raise sb.errors.SmartBugsError(f"Unknown variable '{e}' in name of log file")
 
+        if self.cache:
+            try:
+                self.cache = string.Template(self.cache).substitute(env)
+            except KeyError as e:
+                raise sb.errors.SmartBugsError(f"Unknown variable '{e}' in name of cache directory")
+
+        if self.trace:
+            try:
+                self.trace = string.Template(self.trace).substitute(env, RUNID=self.runid)
+            except KeyError as e:
+                raise sb.errors.SmartBugsError(f"Unknown variable '{e}' in name of trace file")
+
+        if self.metrics_file:
+            try:
+                self.metrics_file = string.Template(self.metrics_file).substitute(env, RUNID=self.runid)
+            except KeyError as e:
+                raise sb.errors.SmartBugsError(f"Unknown variable '{e}' in name of metrics file")
+
+        if self.profile:
+            try:
+                self.profile = string.Template(self.profile).substitute(env, RUNID=self.runid)
+            except KeyError as e:
+                raise sb.errors.SmartBugsError(f"Unknown variable '{e}' in name of profile directory")
+
         self.results = string.Template(self.results).safe_substitute(env, RUNID=self.runid)
         self.results = string.Template(self.results)
 
@@ -113,7 +174,7 @@ class Settings:
             k = k.replace("-", "_")
 
             # attributes accepting None as a value
-            if k in ("timeout", "time_budget", "cpu_quota", "mem_limit") and v in (None, 0, "0"):
+            if k in ("timeout", "time_budget", "cpu_quota", "mem_limit", "metrics_port") and v in (None, 0, "0"):
                setattr(self, k, None)
 
             elif k in ("timeout", "time_budget", "cpu_quota", "processes"):
@@ -124,6 +185,14 @@ class Settings:
                 except Exception:
                     raise sb.errors.SmartBugsError(f"'{k}' needs to be a positive integer (in {settings}).")
 
+            elif k == "metrics_port":
+                try:
+                    v = int(v)
+                    assert 0 < v < 65536
+                    setattr(self, k, v)
+                except Exception:
+                    raise sb.errors.SmartBugsError(f"'{k}' needs to be a port number (in {settings}).")
+
             elif k in ("tools"):
                 if not isinstance(v,list):
                     v = [v]
@@ -155,26 +224,47 @@ class Settings:
                     root_specs.append((root,spec))
                 setattr(self, k, root_specs)
 
-            elif k in ("main", "runtime", "overwrite", "quiet", "json", "sarif", "skip_after_no_args", "dynamic"):
+            elif k in ("main", "runtime", "overwrite", "quiet", "json", "sarif", "skip_after_no_args", "dynamic", "warm_pool", "cluster", "resources"):
                 try:
                     assert isinstance(v, bool)
                     setattr(self, k, v)
                 except Exception:
                     raise sb.errors.SmartBugsError(f"'{k}' needs to be a Boolean (in {settings}).")
 
-            elif k in ("results", "log"):
+            elif k == "engine":
+                if v not in sb.cfg.ENGINES:
+                    raise sb.errors.SmartBugsError(f"'{k}' needs to be one of {', '.join(sb.cfg.ENGINES)} (in {settings}).")
+                setattr(self, k, v)
+
+            elif k == "backend":
+                if v not in sb.cfg.BACKENDS:
+                    raise sb.errors.SmartBugsError(f"'{k}' needs to be one of {', '.join(sb.cfg.BACKENDS)} (in {settings}).")
+                setattr(self, k, v)
+
+            elif k == "schedule":
+                if v not in sb.cfg.SCHEDULES:
+                    raise sb.errors.SmartBugsError(f"'{k}' needs to be one of {', '.join(sb.cfg.SCHEDULES)} (in {settings}).")
+                setattr(self, k, v)
+
+            elif k in ("cache", "tmp_dir", "trace", "metrics_file", "profile", "fake_config") and v in (None, ""):
+                setattr(self, k, None)
+
+            elif k in ("results", "log", "cache", "tmp_dir", "trace", "metrics_file", "profile", "fake_config"):
                 try:
                     setattr(self, k, str(v).replace("/",os.path.sep))
                 except Exception:
                     raise sb.errors.SmartBugsError(f"'{k}' needs to be a path (in {settings}).")
 
-            elif k in ("runid"):
+            elif k == "resume" and v in (None, ""):
+                setattr(self, k, None)
+
+            elif k in ("runid", "resume"):
                 try:
                     setattr(self, k, str(v))
                 except Exception:
                     raise sb.errors.SmartBugsError(f"'{k}' needs to be a string (in {settings}).")
 
-            elif k == "mem_limit":
+            elif k in ("mem_limit", "cache_size"):
                 try:
                     v = str(v).replace(" ","")
                     if v[-1] in "kKmMgG":
@@ -1,5 +1,5 @@
-import glob, os, operator, time
-import sb.tools, sb.solidity, sb.tasks, sb.docker, sb.analysis, sb.colors, sb.logging, sb.cfg, sb.io, sb.settings, sb.errors
+import glob, hashlib, os, operator, time
+import sb.tools, sb.solidity, sb.tasks, sb.backend, sb.analysis, sb.colors, sb.logging, sb.cfg, sb.io, sb.settings, sb.errors, sb.cache, sb.clustering, sb.utils, sb.index, sb.journal, sb.durations, sb.timings, sb.trace, sb.metrics, sb.profiling
 
 def _parse_arg_map(arg_str: str):
     """Return a mapping of flag prefixes to sets of values.
@@ -69,6 +69,27 @@ def collect_files(patterns):
     return files
 
 
+def content_key(absfn, settings):
+    """Key identifying contracts that any tool analyses the same way.
+
+    Contents are normalized (line ends and trailing whitespace for Solidity,
+    case and 0x prefix for bytecode). With --main, the contract analysed is
+    named after the file, so the file name is part of the key.
+    """
+    with open(absfn, "rb") as f:
+        content = f.read().decode("utf8", errors="replace")
+    if absfn.endswith(".hex"):
+        content = content.strip().lower()
+        if content.startswith("0x"):
+            content = content[2:]
+        kind = "runtime" if absfn.endswith(".rt.hex") or settings.runtime else "bytecode"
+    else:
+        content = "\n".join(line.rstrip() for line in content.splitlines()).rstrip()
+        kind = "solidity"
+    name = os.path.basename(absfn) if settings.main else ""
+    return (hashlib.sha256(content.encode()).hexdigest(), kind, name)
+
+
 def collect_single_task(absfn, relfn, tool_name, settings, tool_args, timeout=None):
     """
     Creates a new Task object for a dynamically added tool if it hasn't already been scheduled.
@@ -84,17 +105,24 @@ def collect_single_task(absfn, relfn, tool_name, settings, tool_args, timeout=No
     """
     
     def ensure_loaded(image):
-        if not sb.docker.is_loaded(image):
+        backend = sb.backend.get(settings)
+        if not backend.is_loaded(image):
             sb.logging.message(f"Loading docker image {image}, may take a while ...")
-            sb.docker.load(image)
+            backend.load(image)
     
     try:
-        loaded = sb.tools.load([tool_name])
-        tool = next((t for t in loaded if t.id.split("-")[0] == tool_name), None)
-        if not tool:
+        loaded = [ t for t in sb.tools.load([tool_name]) if t.id.split("-")[0] == tool_name ]
+        if not loaded:
             raise sb.errors.SmartBugsError(f"No matching tool found for '{tool_name}' after loading.")
     except Exception as e:
         raise sb.errors.SmartBugsError(f"Could not load tool '{tool_name}': {e}")
+
+    is_sol = absfn[-4:] == ".sol"
+    is_byc = absfn[-4:] == ".hex" and not (absfn[-7:-4] == ".rt" or settings.runtime)
+    is_rtc = absfn[-4:] == ".hex" and (absfn[-7:-4] == ".rt" or settings.runtime)
+    mode = "solidity" if is_sol else "bytecode" if is_byc else "runtime" if is_rtc else None
+    # the mode of the tool matching the contract, e.g. bytecode for .hex files
+    tool = next((t for t in loaded if t.mode == mode), loaded[0])
     
     # Prevent duplicates based on (tool name, arguments) tuple
     base_tool_name = tool.id.split("-")[0]
@@ -118,7 +146,7 @@ def collect_single_task(absfn, relfn, tool_name, settings, tool_args, timeout=No
     # Skip scheduling if the argument set is a subset of a previously executed one
     existing_arg_history = getattr(settings, "tool_arg_history", {})
     new_arg_map = _parse_arg_map(clean_args)
-    old_map = existing_arg_history.get(base_tool_name, {})
+    old_map = existing_arg_history.get((absfn, base_tool_name), {})
     if new_arg_map:
         subset = True
         for flag, values in new_arg_map.items():
@@ -135,11 +163,6 @@ def collect_single_task(absfn, relfn, tool_name, settings, tool_args, timeout=No
         sb.logging.message(f"\033[93m[collect_single_task] Tool '{tool_name}' already scheduled without args. Skipping additional run.\033[0m","INFO")
         return None
 
-
-    is_sol = absfn[-4:] == ".sol"
-    is_byc = absfn[-4:] == ".hex" and not (absfn[-7:-4] == ".rt" or settings.runtime)
-    is_rtc = absfn[-4:] == ".hex" and (absfn[-7:-4] == ".rt" or settings.runtime)
-
     if not ((is_sol and tool.mode == "solidity") or
             (is_byc and tool.mode == "bytecode") or
             (is_rtc and tool.mode == "runtime")):
@@ -195,13 +218,15 @@ def collect_single_task(absfn, relfn, tool_name, settings, tool_args, timeout=No
             settings.tool_keys = tool_key_map
         tool_key_map.setdefault(absfn, set()).add(tool_key)
     if hasattr(settings, "tool_arg_history"):
-        hist = settings.tool_arg_history.setdefault(base_tool_name, {})
+        hist = settings.tool_arg_history.setdefault((absfn, base_tool_name), {})
         for flag, values in new_arg_map.items():
             hist.setdefault(flag, set()).update(values)
 
     # Return a Task object updated with the new tool
     rdir = settings.resultdir(tool.id, tool.mode, absfn, relfn, clean_args)
-    return sb.tasks.Task(absfn, relfn, rdir, solc_version, solc_path, tool, settings, tool_args, effective_timeout)
+    duplicates = [ (d_absfn, d_relfn, settings.resultdir(tool.id, tool.mode, d_absfn, d_relfn, clean_args))
+        for d_absfn,d_relfn in settings.duplicates.get(absfn, ()) ]
+    return sb.tasks.Task(absfn, relfn, rdir, solc_version, solc_path, tool, settings, tool_args, effective_timeout, duplicates)
 
 
 def collect_tasks(files, tools, settings):
@@ -249,20 +274,43 @@ def collect_tasks(files, tools, settings):
         return solc_version,solc_path
 
     def ensure_loaded(image):
-        if not sb.docker.is_loaded(image):
+        backend = sb.backend.get(settings)
+        if not backend.is_loaded(image):
             sb.logging.message(f"Loading docker image {image}, may take a while ...")
-            sb.docker.load(image)
+            backend.load(image)
 
 
     tasks = []
     exceptions = []
 
+    # Identical contracts are analysed once, the results are copied to the others
+    contracts = []
+    representatives = {}
+    duplicates = settings.duplicates
     last_absfn = None
     for absfn,relfn in sorted(files):
         if absfn == last_absfn:
             # ignore duplicate contracts
             continue
         last_absfn = absfn
+        rep_absfn = representatives.setdefault(content_key(absfn, settings), absfn)
+        if rep_absfn == absfn:
+            contracts.append((absfn,relfn))
+        else:
+            duplicates.setdefault(rep_absfn, []).append((absfn,relfn))
+    saved_tasks = 0
+
+    # Members of clusters of near-duplicates run the core tools first
+    clusters = settings.clusters
+    core_tools = {entry[0] for entry in sb.analysis.CORE_TOOLS}
+    if settings.cluster:
+        clusters.update(sb.clustering.cluster([absfn for absfn,_ in contracts if absfn.endswith(".sol")]))
+        fn_clusters = f"{os.path.splitext(settings.log)[0]}.clusters.json"
+        os.makedirs(os.path.dirname(fn_clusters) or ".", exist_ok=True)
+        sb.clustering.write_map(fn_clusters, clusters, dict(contracts))
+    deferred_tasks = 0
+
+    for absfn,relfn in contracts:
 
         is_sol = absfn[-4:]==".sol"
         is_byc = absfn[-4:]==".hex" and not (absfn[-7:-4]==".rt" or settings.runtime)
@@ -324,7 +372,16 @@ def collect_tasks(files, tools, settings):
                         if base_boost > 0:
                             task_timeout = max(int(task_timeout or 0), base_boost)
 
-                task = sb.tasks.Task(absfn,relfn,rdir,solc_version,solc_path,tool,settings,task_args,task_timeout)
+                task_duplicates = [ (d_absfn, d_relfn, disambiguate(settings.resultdir(tool.id,tool.mode,d_absfn,d_relfn,"")))
+                    for d_absfn,d_relfn in duplicates.get(absfn, ()) ]
+                saved_tasks += len(task_duplicates)
+
+                task = sb.tasks.Task(absfn,relfn,rdir,solc_version,solc_path,tool,settings,task_args,task_timeout,task_duplicates)
+                if absfn in clusters and base_tool_name not in core_tools:
+                    # held back, until the findings diverge from the representative's
+                    settings.deferred.setdefault(absfn, []).append(task)
+                    deferred_tasks += 1
+                    continue
                 tasks.append(task)
                 if hasattr(settings, "tool_keys"):
                     base_tool_name = tool.id.split("-")[0]
@@ -338,6 +395,15 @@ def collect_tasks(files, tools, settings):
                     tool_key_map.setdefault(absfn, set()).add(f"{base_tool_name}|")
 
     report_collisions()
+    if duplicates:
+        duplicate_files = sum(len(d) for d in duplicates.values())
+        sb.logging.message(
+            f"{duplicate_files} duplicate contract(s) share the results of {len(duplicates)} contract(s), saving {saved_tasks} task(s)")
+    if clusters:
+        sb.logging.message(
+            f"{len(clusters)} near-duplicate contract(s) in clusters of {len(set(clusters.values()))} representative(s), {deferred_tasks} task(s) deferred")
+        # representatives first
+        tasks.sort(key=lambda task: task.absfn in clusters)
     if exceptions:
         errors = "\n".join(sorted({str(e) for e in exceptions}))
         raise sb.errors.SmartBugsError(f"Error(s) while collecting tasks:\n{errors}")
@@ -345,21 +411,100 @@ def collect_tasks(files, tools, settings):
 
 
 
+def resume_tasks(replay, settings):
+    """Tasks of an interrupted run that are still to be done, from its journal.
+
+    Restores the duplicates, clusters, deferred tasks and scheduled tool keys
+    of the run. Only the images and compilers of the pending tasks are checked.
+    """
+    run = replay.run
+    for absfn,dups in run["duplicates"].items():
+        settings.duplicates[absfn] = [ tuple(d) for d in dups ]
+    settings.clusters.update(run["clusters"])
+    settings.deferred.update(replay.deferred())
+    for task in replay.enqueued.values():
+        base_tool_name = task.toolid.split("-")[0]
+        args = task.tool_args.strip()
+        settings.tool_keys.setdefault(task.absfn, set()).add(f"{base_tool_name}|{args}")
+        hist = settings.tool_arg_history.setdefault((task.absfn, base_tool_name), {})
+        for flag, values in _parse_arg_map(args).items():
+            hist.setdefault(flag, set()).update(values)
+
+    tasks = []
+    images = set()
+    backend = sb.backend.get(settings)
+    for task in replay.pending():
+        if task.tool.image not in images:
+            images.add(task.tool.image)
+            if not backend.is_loaded(task.tool.image):
+                sb.logging.message(f"Loading docker image {task.tool.image}, may take a while ...")
+                backend.load(task.tool.image)
+        if task.solc_path and not os.path.exists(task.solc_path):
+            # the run may resume on another machine
+            solc_path = sb.solidity.get_solc_path(task.solc_version)
+            if not solc_path:
+                sb.logging.message(sb.colors.warning(f"{task.relfn}: cannot load solc {task.solc_version} needed by {task.toolid}, skipping"), "")
+                continue
+            task = sb.tasks.replace(task, solc_path=solc_path)
+        tasks.append(task)
+    sb.logging.message(
+        f"Resuming run {settings.runid}: {len(replay.finished)} task(s) finished, "
+        f"{len(tasks)} pending ({replay.records} journal records)")
+    return tasks
+
+
+
 def main(settings: sb.settings.Settings):
     settings.freeze()
+    sb.profiling.start(settings.profile, "main")
+    try:
+        __main(settings)
+    finally:
+        if settings.profile:
+            __profiled(settings)
+
+
+def __profiled(settings):
+    sb.profiling.stop()
+    try:
+        fn = sb.profiling.summary(settings.profile)
+    except Exception as e:
+        sb.logging.message(sb.colors.warning(f"Warning: cannot summarise the profiles in {settings.profile}: {e}"))
+        return
+    if fn:
+        sb.logging.message(f"Profiles written to {settings.profile}, hot functions in {fn}")
+
+
+def __main(settings):
+    sb.tasks.bind(settings)
     sb.logging.quiet = settings.quiet
     sb.logging.message(
         sb.colors.success(f"Welcome to SmartBugs {sb.cfg.VERSION}!"),
         f"Settings: {settings}")
+    sb.backend.check(settings)
 
-    tools = sb.tools.load(settings.tools)
-    if not tools:
-        sb.logging.message(sb.colors.warning("Warning: no tools selected!"))
+    if settings.resume:
+        sb.logging.message(f"Reading the journal of run {settings.runid} ...")
+        replay = sb.journal.Replay(sb.journal.path(settings))
+        files = [ tuple(f) for f in replay.run["files"] ]
+    else:
+        tools = sb.tools.load(settings.tools)
+        if not tools:
+            sb.logging.message(sb.colors.warning("Warning: no tools selected!"))
 
-    sb.logging.message("Collecting files ...")
-    files = collect_files(settings.files)
+        sb.logging.message("Collecting files ...")
+        files = collect_files(settings.files)
     sb.logging.message(f"{len(files)} files to analyse")
 
+    # Create the index of the results tree before the first task completes,
+    # to tell whether it covers all results in the tree
+    index_root = sb.index.root(settings)
+    if index_root:
+        try:
+            sb.index.connect(index_root)
+        except sb.errors.SmartBugsError as e:
+            sb.logging.message(sb.colors.warning(f"Warning: {e}"))
+
     sb.logging.message("Assembling tasks ...")
     # If running in time-budget mode, compute a core timeout base to deepen the core run
     if getattr(settings, "time_budget", None) is not None:
@@ -382,11 +527,46 @@ def main(settings: sb.settings.Settings):
         setattr(settings, "budget_core_timeout_base", budget_core_timeout_base)
         sb.logging.message(f"Budget mode: core per-task base timeout set to ~{budget_core_timeout_base}s (from {contracts_count} file(s), {core_tools_count} core tool(s), fraction {core_fraction}).", "INFO")
 
-    tasks = collect_tasks(files, tools, settings)
+    if settings.resume:
+        tasks = resume_tasks(replay, settings)
+    else:
+        tasks = collect_tasks(files, tools, settings)
+        sb.journal.begin(settings, files)
     sb.logging.message(f"{len(tasks)} tasks to execute")
 
+    # One pool of analysers serves the core run and all budget batches
+    sb.trace.begin(settings)
+    sb.analysis.start(settings)
+    try:
+        orchestrate(files, tasks, settings)
+        # where the time went, while the log is still open
+        try:
+            summary = sb.timings.summary(settings)
+        except sb.errors.SmartBugsError as e:
+            summary = sb.colors.warning(f"Warning: no phase timings, {e}")
+        if summary:
+            sb.logging.message(summary, "INFO")
+    finally:
+        sb.analysis.stop()
+        sb.trace.end(settings)
+
+    try:
+        sb.durations.update(settings, files)
+    except sb.errors.SmartBugsError as e:
+        sb.logging.message(sb.colors.warning(f"Warning: {e}"))
+
+    if settings.cache:
+        evicted, evicted_bytes = sb.cache.gc(settings.cache, sb.utils.parse_size(settings.cache_size))
+        if evicted:
+            sb.logging.message(f"Cache: evicted {evicted} result(s), {evicted_bytes} bytes", "INFO")
+
+
+
+def orchestrate(files, tasks, settings):
     total_start = time.time()
     core_start = total_start
+    if getattr(settings, "time_budget", None) is not None:
+        sb.metrics.budget(total_start + settings.time_budget)
     # If a time budget is configured, label the completion of the core run accordingly
     if getattr(settings, "time_budget", None) is not None:
         sb.analysis.run(tasks, settings, label="Core analysis")
@@ -404,8 +584,6 @@ def main(settings: sb.settings.Settings):
         if remaining <= 0:
             sb.logging.message(sb.colors.warning(
                 f"Time budget exhausted by core orchestration (core took ~{int(core_duration)}s, budget {settings.time_budget}s). Skipping second phase."))
-            # Print overall summary as part of core run already completed
-            # (will not be flushed without a subsequent run)
             return
         sb.logging.message(f"Core orchestration took ~{int(core_duration)}s. Remaining budget for second phase: {remaining}s.")
         if sb_budget and hasattr(sb_budget, "run_budget_phase"):
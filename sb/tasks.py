@@ -1,15 +1,126 @@
+import os
+import sb.tools, sb.errors
+
+# Settings of the current run, bound once per process (see bind)
+_settings = None
+
+def bind(settings):
+    """Make settings available to the tasks executed by this process."""
+    global _settings
+    _settings = settings
+
+
 class Task:
-    def __init__(self, absfn, relfn, rdir, solc_version, solc_path, tool, settings, tool_args="", timeout=None):
-        self.absfn = absfn # absolute normalized path
-        self.relfn = relfn # path within project
-        self.rdir = rdir   # directory for results
-        self.solc_version = solc_version
-        self.solc_path = solc_path
-        self.tool = tool
-        self.settings = settings
-        self.tool_args = tool_args
-        self.timeout = timeout
+    """Compact, immutable description of a task.
+
+    Only ids, paths, arguments and the timeout are pickled when a task is
+    queued. The tool specification and the settings are resolved locally by
+    the process executing the task, via sb.tools.get and bind.
+    """
+
+    __slots__ = ("absfn", "relfn", "rdir", "solc_version", "solc_path",
+        "toolid", "toolmode", "tool_args", "timeout", "dynamic", "duplicates")
+
+    def __init__(self, absfn, relfn, rdir, solc_version, solc_path, tool, settings, tool_args="", timeout=None, duplicates=()):
+        sb.tools.registry.setdefault((tool.id, tool.mode), tool)
+        self.__setstate__((
+            absfn,     # absolute normalized path
+            relfn,     # path within project
+            rdir,      # directory for results
+            solc_version,
+            solc_path,
+            tool.id,
+            tool.mode,
+            tool_args,
+            timeout,
+            settings.dynamic, # whether findings are routed to follow-up tools
+            tuple(duplicates))) # (absfn, relfn, rdir) of identical contracts receiving a copy of the results
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Task is immutable, cannot set '{name}'")
+
+    def __getstate__(self):
+        return tuple(getattr(self, k) for k in Task.__slots__)
+
+    def __setstate__(self, state):
+        for k,v in zip(Task.__slots__, state):
+            object.__setattr__(self, k, v)
+
+    @property
+    def tool(self):
+        return sb.tools.get(self.toolid, self.toolmode)
+
+    @property
+    def settings(self):
+        if _settings is None:
+            raise sb.errors.InternalError("Settings accessed before being bound to the process")
+        return _settings
 
     def __str__(self):
-        s = [ f"{k}: {str(v)}" for k,v in self.__dict__.items() ]
+        s = [ f"{k}: {str(getattr(self, k))}" for k in Task.__slots__ ]
         return f"{{{', '.join(s)}}}"
+
+
+
+def replace(task, **changes):
+    """Copy of task with the given attributes changed."""
+    state = tuple(changes.pop(k, getattr(task, k)) for k in Task.__slots__)
+    if changes:
+        raise sb.errors.InternalError(f"Task has no attribute(s) {', '.join(changes)}")
+    copy = Task.__new__(Task)
+    copy.__setstate__(state)
+    return copy
+
+
+
+class Batch:
+    """Tasks of one tool executed in one container, one contract after the other.
+
+    Formed by batches() for tools configured with 'batch: K'.
+    """
+
+    __slots__ = ("tasks",)
+
+    def __init__(self, tasks):
+        self.tasks = tuple(tasks)
+
+    def __getstate__(self):
+        return self.tasks
+
+    def __setstate__(self, state):
+        self.tasks = state
+
+    def __str__(self):
+        return f"[{', '.join(str(task) for task in self.tasks)}]"
+
+
+
+def batches(tasks):
+    """Group the tasks of tools with a batch size into batches.
+
+    Tasks are grouped when they agree on everything but the contract: tool,
+    mode, arguments, timeout and compiler. Since contracts are placed side by
+    side in /sb, a batch never holds two files with the same name. Tasks of
+    other tools, and batches of a single task, are returned unchanged.
+    """
+    items = []
+    open_batches = {}
+    for task in tasks:
+        size = task.tool.batch
+        if not size or size < 2:
+            items.append(task)
+            continue
+        key = (task.toolid, task.toolmode, task.tool_args, task.timeout, task.solc_path)
+        batch, names = open_batches.setdefault(key, ([], set()))
+        name = os.path.basename(task.absfn)
+        if name in names or len(batch) >= size:
+            items.append(Batch(batch) if len(batch) > 1 else batch[0])
+            batch, names = open_batches[key] = ([], set())
+        batch.append(task)
+        names.add(name)
+    for batch,_ in open_batches.values():
+        if len(batch) > 1:
+            items.append(Batch(batch))
+        elif batch:
+            items.append(batch[0])
+    return items
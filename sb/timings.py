@@ -0,0 +1,146 @@
+"""Durations of the phases of a task, recorded in smartbugs.json under 'timings'.
+
+The code executing a task times its phases with
+
+    with sb.timings.phase("wait"):
+        ...
+
+which adds the duration to the recorder of the current thread, if any. The
+phases are
+
+    prepare     result directory, skip check, cache lookup
+    volume      directory mounted at /sb, staged scripts and compiler
+    run         creating and starting the container (or exec in a warm one)
+    wait        the tool running
+    logs        draining the log stream into result.log
+    output      fetching (get_archive) or pruning the output
+    remove      killing and removing the container, cleanup
+    store       writing smartbugs.json, result.log and result.tar, indexing
+    cache       adding the result to the cache
+    parse       parsing the output, writing result.json
+    sarif       writing result.sarif
+    fan_out     copying the results to identical contracts
+    route       classifying findings and routing follow-ups
+
+sb.reparse adds the duration of its latest parse as 'reparse'.
+
+Container phases of a batch are split evenly among its tasks. The timings
+are added to smartbugs.json when the task is done, and to the 'finished'
+record of the journal, from which summary() computes totals and percentiles
+per tool at the end of a run.
+"""
+
+import contextlib, math, os, threading, time
+import sb.cfg, sb.colors, sb.errors, sb.io, sb.journal, sb.logging, sb.trace
+
+PHASES = ("prepare", "volume", "run", "wait", "logs", "output", "remove",
+    "store", "cache", "parse", "sarif", "fan_out", "route")
+
+_local = threading.local()
+
+# timings of the tasks executed by this process, by result dir, until collected
+recorded = {}
+
+
+
+def recorders():
+    if not hasattr(_local, "recorders"):
+        _local.recorders = []
+    return _local.recorders
+
+
+def start():
+    """Start recording the phases of a task in the current thread, until stop().
+
+    Recorders nest: the phases of a task executed while recording a batch go
+    to the task's recorder.
+    """
+    recorders().append(({}, [0.0]))
+
+
+def stop():
+    """Stop the recorder started last; returns its timings."""
+    return recorders().pop()[0] if recorders() else {}
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Time the block as phase name, excluding the phases nested in it.
+
+    With --trace, the block is also a span of the timeline (sb.trace).
+    """
+    if not recorders():
+        yield
+        return
+    timings, nested = recorders()[-1]
+    outer = nested[0]
+    nested[0] = 0.0
+    wall = time.time() if sb.trace.path else None
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start_time
+        timings[name] = timings.get(name, 0.0) + elapsed - nested[0]
+        nested[0] = outer + elapsed
+        if wall is not None:
+            sb.trace.span(name, wall, elapsed)
+
+
+def add(timings, more):
+    for k,v in more.items():
+        timings[k] = timings.get(k, 0.0) + v
+    return timings
+
+
+def split(timings, n):
+    return { k: v/n for k,v in timings.items() }
+
+
+def record(task, timings):
+    """Keep the timings of task for the process collecting them (see collect)."""
+    recorded[task.rdir] = add(recorded.get(task.rdir, {}), timings)
+
+
+def collect(task):
+    return recorded.pop(task.rdir, {})
+
+
+def save(task, timings):
+    """Add timings to the smartbugs.json of task; reported, but not raised, on errors."""
+    fn = os.path.join(task.rdir, sb.cfg.TASK_LOG)
+    try:
+        task_log = sb.io.read_json(fn)
+        task_log["timings"] = { k: round(v, 6) for k,v in timings.items() }
+        sb.io.write_json(fn, task_log)
+    except (sb.errors.SmartBugsError, OSError, TypeError) as e:
+        sb.logging.message(sb.colors.warning(f"Cannot record timings in {fn}: {e}"), "ERROR")
+
+
+
+def percentile(values, p):
+    """p-th percentile of sorted values, by the nearest rank."""
+    return values[min(len(values), max(1, math.ceil(p/100 * len(values)))) - 1]
+
+
+def summary(settings):
+    """Lines with the total, median and 90th percentile of each phase per tool,
+    from the journal of the run; None if the journal has no timings."""
+    replay = sb.journal.Replay(sb.journal.path(settings))
+    per_tool = {}
+    for rdir,timings in replay.timings.items():
+        task = replay.enqueued.get(rdir)
+        tool = task.toolid.split("-")[0] if task else "?"
+        for k,v in timings.items():
+            per_tool.setdefault(tool, {}).setdefault(k, []).append(v)
+    if not per_tool:
+        return None
+    lines = [ "Phase timings [s], total/median/p90 per tool:" ]
+    for tool,phases in sorted(per_tool.items()):
+        cells = []
+        for k in PHASES:
+            if k in phases:
+                values = sorted(phases[k])
+                cells.append(f"{k} {sum(values):.1f}/{percentile(values, 50):.2f}/{percentile(values, 90):.2f}")
+        lines.append(f"  {tool}: {', '.join(cells)}")
+    return "\n".join(lines)
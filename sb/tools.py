@@ -1,10 +1,11 @@
 import os, string
-import sb.io, sb.cfg, sb.errors
+import sb.io, sb.cfg, sb.errors, sb.utils
 
 
 
 FIELDS = ("id","mode","image","name","origin","version","info","parser",
-    "output","bin", "default_params", "solc","cpu_quota","mem_limit","command","entrypoint")
+    "output","output_mount","output_include","output_exclude","log_head","log_tail",
+    "bin", "default_params", "solc","cpu_quota","mem_limit","command","entrypoint","batch","cost","cpus","memory","concurrency","stateless")
 
 class Tool():
 
@@ -18,7 +19,7 @@ class Tool():
                 v = str(v) if v is not None else ""
             
             if v is not None:
-                if k in ("solc"):
+                if k in ("solc", "output_mount", "stateless"):
                     try:
                         v = bool(v)
                     except Exception:
@@ -29,6 +30,40 @@ class Tool():
                         assert v >= 0
                     except Exception:
                         raise sb.errors.SmartBugsError(f"Tool: value of attribute '{k}' is not an integer>=0.\n{cfg}")
+                elif k == "batch":
+                    # number of contracts analysed in one container
+                    try:
+                        v = int(v)
+                        assert v >= 1
+                    except Exception:
+                        raise sb.errors.SmartBugsError(f"Tool: value of attribute '{k}' is not an integer>=1.\n{cfg}")
+                elif k in ("cost", "cpus"):
+                    # expected seconds per contract and CPUs used, for scheduling
+                    try:
+                        v = float(v)
+                        assert v > 0
+                    except Exception:
+                        raise sb.errors.SmartBugsError(f"Tool: value of attribute '{k}' is not a positive number.\n{cfg}")
+                elif k == "concurrency":
+                    # containers of the tool running at the same time
+                    try:
+                        v = int(v)
+                        assert v >= 1
+                    except Exception:
+                        raise sb.errors.SmartBugsError(f"Tool: value of attribute '{k}' is not an integer>=1.\n{cfg}")
+                elif k in ("output_include", "output_exclude"):
+                    # glob patterns, relative to the output directory
+                    if isinstance(v, str):
+                        v = v.split()
+                    if not isinstance(v, list) or not all(isinstance(p, str) for p in v):
+                        raise sb.errors.SmartBugsError(f"Tool: value of attribute '{k}' is not a list of patterns.\n{cfg}")
+                    v = tuple(v)
+                elif k in ("log_head", "log_tail", "memory"):
+                    # bytes of the log kept from its start and end, bytes of memory used
+                    try:
+                        v = sb.utils.parse_size(v)
+                    except Exception:
+                        raise sb.errors.SmartBugsError(f"Tool: value of attribute '{k}' is not a valid size.\n{cfg}")
                 elif k in ("mem_limit"):
                     try:
                         v = str(v).replace(" ","")
@@ -58,6 +93,8 @@ class Tool():
             raise sb.errors.SmartBugsError(f"Tool {self.id}/{self.mode}: extra field(s) {', '.join(extras)}")
         if not self._command and not self._entrypoint:
             raise sb.errors.SmartBugsError(f"Tool {self.id}/{self.mode}: neither command nor entrypoint specified.")
+        if self.output_mount and not self.output:
+            raise sb.errors.SmartBugsError(f"Tool {self.id}/{self.mode}: output_mount without output directory.")
         if not self.parser:
             self.parser = sb.cfg.TOOL_PARSER
         if self.bin:
@@ -207,6 +244,22 @@ def load(ids, tools = [], seen = set()):
 
 
 
+# tool specifications by (id, mode), loaded once per process
+registry = {}
+
+def get(tool_id, mode):
+    """Return the specification of a tool in the given mode."""
+    key = (tool_id, mode)
+    if key not in registry:
+        for tool in load([tool_id], [], set()):
+            registry.setdefault((tool.id, tool.mode), tool)
+    try:
+        return registry[key]
+    except KeyError:
+        raise sb.errors.SmartBugsError(f"Tool {tool_id}/{mode} not found")
+
+
+
 # the contents of tools/.../findings.yaml is cached, once per process
 info_findings = {}
 
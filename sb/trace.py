@@ -0,0 +1,145 @@
+"""Timeline of a run in the trace event format (--trace FILE), for Perfetto
+(ui.perfetto.dev) or chrome://tracing.
+
+Every process, and every thread running containers, gets a track: the
+analysers of the processes engine, and the Docker threads and parser
+processes of the asyncio engine. A track shows a span per task (or batch of
+tasks run in one container), with the phases of sb.timings nested in it.
+The track of the main process shows a span per call of sb.analysis.run (the
+core run, each budget batch) and instant events for routing decisions,
+promotions of cluster members and budget batch boundaries.
+
+Like the journal, the file is appended to by all processes, one event per
+line. begin() starts it as a JSON array, which trace viewers load even if
+the run is interrupted; end() rewrites it as one JSON document.
+"""
+
+import json, os, tempfile, threading, time
+import sb.cfg, sb.colors, sb.logging, sb.tasks
+
+# trace file and name of this process; None while not tracing
+path = None
+process = None
+
+# file descriptor of the trace, opened once per process in append mode (see attach)
+fd = None
+
+# (pid, tid) of the tracks named so far
+named = set()
+
+
+
+def begin(settings):
+    """Start the trace of a run, in the main process."""
+    if not settings.trace:
+        return
+    try:
+        os.makedirs(os.path.dirname(settings.trace) or ".", exist_ok=True)
+        with open(settings.trace, "w", encoding="utf-8") as f:
+            print("[", file=f)
+    except OSError as e:
+        sb.logging.message(sb.colors.warning(f"Warning: cannot write trace {settings.trace}: {e}"))
+        return
+    attach(settings, "smartbugs")
+
+
+def attach(settings, process_name):
+    """Add the events of this process, shown as process_name, to the trace of the run."""
+    global path, process, fd
+    if not settings.trace:
+        return
+    try:
+        fd = os.open(settings.trace, os.O_WRONLY | os.O_APPEND)
+    except OSError as e:
+        sb.logging.message(sb.colors.error(f"Cannot write trace {settings.trace}: {e}"), "ERROR")
+        return
+    path = settings.trace
+    process = process_name
+
+
+def write(event):
+    """Append event on the track of the calling thread; a trace that cannot be
+    written is reported once, and not written to anymore."""
+    global path
+    if not path:
+        return
+    pid, tid = os.getpid(), threading.get_native_id()
+    lines = []
+    if (pid, tid) not in named:
+        named.add((pid, tid))
+        thread = threading.current_thread()
+        if thread is threading.main_thread():
+            lines.append({"ph": "M", "name": "process_name", "pid": pid, "tid": tid, "args": {"name": process}})
+        lines.append({"ph": "M", "name": "thread_name", "pid": pid, "tid": tid,
+            "args": {"name": process if thread is threading.main_thread() else thread.name}})
+    event["pid"], event["tid"] = pid, tid
+    lines.append(event)
+    try:
+        # one write per call; appends of a few lines do not interleave
+        os.write(fd, "".join(json.dumps(e, separators=(",",":")) + ",\n" for e in lines).encode())
+    except OSError as e:
+        sb.logging.message(sb.colors.error(f"Cannot write trace {path}: {e}"), "ERROR")
+        path = None
+
+
+def span(name, start, duration, args=None, cat="phase"):
+    """Span from start (time.time()) lasting duration seconds."""
+    if not path:
+        return
+    event = {"ph": "X", "cat": cat, "name": name, "ts": int(start * 1e6), "dur": int(duration * 1e6)}
+    if args:
+        event["args"] = args
+    write(event)
+
+
+def instant(name, args=None, cat="route", scope="t"):
+    """Event at the current time, on the track of the thread (scope t) or of all tracks (scope g)."""
+    if not path:
+        return
+    event = {"ph": "i", "s": scope, "cat": cat, "name": name, "ts": int(time.time() * 1e6)}
+    if args:
+        event["args"] = args
+    write(event)
+
+
+def task_span(item, start, duration):
+    """Span of a task, or batch of tasks, from start on."""
+    if not path:
+        return
+    tasks = item.tasks if isinstance(item, sb.tasks.Batch) else (item,)
+    label = f"{tasks[0].toolid} {tasks[0].relfn}" if len(tasks) == 1 else f"{tasks[0].toolid} batch of {len(tasks)}"
+    span(label, start, duration, {"rdir": [ task.rdir for task in tasks ]}, cat="task")
+
+
+def call(item, fn, *args):
+    """fn(*args), traced as the span of item on the track of the calling thread."""
+    start = time.time()
+    try:
+        return fn(*args)
+    finally:
+        task_span(item, start, time.time() - start)
+
+
+def end(settings):
+    """Rewrite the trace of the run as one JSON document, once all processes are done."""
+    global path, fd
+    if not settings.trace or not os.path.exists(settings.trace):
+        return
+    if fd is not None:
+        os.close(fd)
+    path, fd = None, None
+    try:
+        with open(settings.trace, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()[1:]
+        events = [ json.loads(line.rstrip(",")) for line in lines if line.strip() ]
+        trace = {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"runid": settings.runid, "smartbugs": sb.cfg.VERSION},
+        }
+        tmp_fd, tmp = tempfile.mkstemp(dir=os.path.dirname(settings.trace) or ".", prefix=".tmp-")
+        with os.fdopen(tmp_fd, "w", encoding="utf-8") as f:
+            json.dump(trace, f, separators=(",",":"))
+        os.replace(tmp, settings.trace)
+    except (OSError, ValueError) as e:
+        sb.logging.message(sb.colors.warning(f"Warning: cannot complete trace {settings.trace}: {e}"))
@@ -1,3 +1,7 @@
+import sb.errors
+
+
+
 def str2label(s):
     """Convert string to label.
 
@@ -18,3 +22,19 @@ def str2label(s):
         else:
             separator = has_started
     return l
+
+
+
+def parse_size(size):
+    """Number of bytes in a size like 512m or 10g."""
+    size = str(size).replace(" ","")
+    factor = 1
+    if size and size[-1] in "kKmMgG":
+        factor = 1024 ** (" kmg".index(size[-1].lower()))
+        size = size[:-1]
+    try:
+        n = int(size) * factor
+        assert n > 0
+    except Exception:
+        raise sb.errors.SmartBugsError(f"Invalid size specification '{size}'")
+    return n
@@ -0,0 +1,55 @@
+import json, os, types
+import pytest
+import sb.settings, sb.smartbugs, sb.tasks, sb.tools
+
+MYTHRIL = { "id": "mythril-0.24.7", "mode": "bytecode" }
+
+
+
+def record(root, filename, issues, exit_code=1):
+    """Write a recorded Mythril result on filename, for the fake backend, below root."""
+    rdir = os.path.join(root, MYTHRIL["id"], "recorded", filename)
+    os.makedirs(rdir)
+    with open(os.path.join(rdir, "result.log"), "w") as f:
+        print(json.dumps({ "error": None, "issues": issues, "success": True }), file=f)
+    with open(os.path.join(rdir, "smartbugs.json"), "w") as f:
+        json.dump({ "filename": filename, "result": { "exit_code": exit_code, "duration": 0.0 }, "tool": MYTHRIL }, f)
+
+
+def run_settings(tmp_path, **values):
+    """Settings of a run with the fake backend below tmp_path."""
+    settings = sb.settings.Settings()
+    settings.update(dict({
+        "backend": "fake",
+        "fake_config": str(tmp_path / "fake.yaml"),
+        "results": str(tmp_path / "results" / "${TOOL}" / "${RUNID}" / "${FILENAME}"),
+        "log": str(tmp_path / "logs" / "${RUNID}.log"),
+        "runid": "test",
+        "quiet": True,
+    }, **values))
+    return settings
+
+
+@pytest.fixture
+def run(tmp_path):
+    """Settings of a run with the fake backend below tmp_path, and a function
+    writing contracts and returning their tasks."""
+    fixtures = tmp_path / "fixtures"
+    fixtures.mkdir()
+    (tmp_path / "fake.yaml").write_text(f"fixtures: {fixtures}\n")
+    settings = run_settings(tmp_path)
+
+    def tasks(contracts, tools=("mythril",)):
+        """Write the contracts, {file name: bytecode}, and collect their tasks."""
+        settings.freeze()
+        sb.tasks.bind(settings)
+        files = []
+        for name,code in contracts.items():
+            fn = tmp_path / "contracts" / name
+            fn.parent.mkdir(exist_ok=True)
+            fn.write_text(code)
+            files.append((str(fn), name))
+        # without the tools loaded by earlier runs in this process
+        return sb.smartbugs.collect_tasks(files, sb.tools.load(list(tools), [], set()), settings)
+
+    return types.SimpleNamespace(settings=settings, fixtures=str(fixtures), tasks=tasks, dir=tmp_path)
@@ -0,0 +1,32 @@
+import multiprocessing, queue
+import sb.analysis, sb.durations
+from conftest import record
+
+SELFDESTRUCT = { "title": "Unprotected Selfdestruct", "swc-id": "106", "severity": "High" }
+
+
+
+def analyse(settings, tasks):
+    """Run the tasks in an analyser in this thread; returns what it reports done."""
+    taskqueue, done, logqueue = queue.Queue(), queue.Queue(), queue.Queue()
+    for task in tasks:
+        taskqueue.put(task)
+    taskqueue.put(None)
+    progress = sb.analysis.Progress(multiprocessing.get_context("spawn"), sb.durations.Model())
+    progress.reset(tasks)
+    sb.analysis.analyser(0, settings, logqueue, taskqueue, done, progress, queue.Queue(), [queue.Queue()])
+    assert taskqueue.unfinished_tasks == 0
+    return [ done.get_nowait() for _ in tasks ]
+
+
+def test_analyser_survives_parser_error(run):
+    # the finding names another file than the one analysed, which the parser asserts
+    record(run.fixtures, "bad.hex", [ dict(SELFDESTRUCT, filename="/sb/other.hex") ])
+    record(run.fixtures, "good.hex", [ SELFDESTRUCT ])
+    run.settings.update({ "json": True, "dynamic": False })
+    tasks = run.tasks({ "bad.hex": "6080604052600a", "good.hex": "6080604052600b" })
+    assert [ task.relfn for task in tasks ] == [ "bad.hex", "good.hex" ]
+
+    reported = analyse(run.settings, tasks)
+    statuses = [ status for _,results in reported for _,status,_ in results ]
+    assert statuses == [ "failed", "ok" ]
@@ -0,0 +1,47 @@
+import os
+import sb.cache, sb.cfg, sb.io, sb.tasks
+
+CODE = "6080604052600a"
+
+
+
+def store(task, log):
+    """Write the results of an execution of task to its result dir."""
+    os.makedirs(task.rdir, exist_ok=True)
+    sb.io.write_txt(os.path.join(task.rdir, sb.cfg.TOOL_LOG), log)
+    sb.io.write_json(os.path.join(task.rdir, sb.cfg.TASK_LOG), {
+        "filename": task.relfn, "runid": "earlier", "result": { "exit_code": 0 } })
+
+
+def test_fetch_returns_what_was_put(run):
+    run.settings.update({ "cache": str(run.dir / "cache") })
+    task, = run.tasks({ "a.hex": CODE })
+    store(task, [ "analysed /sb/a.hex" ])
+    sb.cache.put(task)
+    sb.io.remove(task.rdir)
+    os.makedirs(task.rdir)
+
+    assert sb.cache.fetch(task)
+    assert sb.io.read_lines(os.path.join(task.rdir, sb.cfg.TOOL_LOG)) == [ "analysed /sb/a.hex" ]
+    task_log = sb.io.read_json(os.path.join(task.rdir, sb.cfg.TASK_LOG))
+    assert task_log["filename"] == "a.hex"
+    assert task_log["runid"] == "test"
+    assert task_log["cache"] == sb.cache.key(task)
+
+
+def test_same_contents_under_another_name_miss(run):
+    # the log names the file, so it does not fit a contract of another name
+    run.settings.update({ "cache": str(run.dir / "cache") })
+    a, = run.tasks({ "a.hex": CODE })
+    # identical contracts of one run are collected once, so b.hex stands for one of a later run
+    fn = run.dir / "contracts" / "b.hex"
+    fn.write_text(CODE)
+    b = sb.tasks.Task(str(fn), "b.hex", str(run.dir / "results" / "b.hex"), None, None,
+        a.tool, run.settings, a.tool_args, a.timeout)
+    os.makedirs(b.rdir)
+    store(a, [ "analysed /sb/a.hex" ])
+    sb.cache.put(a)
+
+    assert sb.cache.key(a) != sb.cache.key(b)
+    assert not sb.cache.fetch(b)
+    assert not os.path.exists(os.path.join(b.rdir, sb.cfg.TASK_LOG))
@@ -0,0 +1,44 @@
+import queue
+import sb.analysis
+
+REENTRANCY = { "name": "External Call To User-Supplied Address", "categories": [ "REENTRANCY" ] }
+SELFDESTRUCT = { "name": "Unprotected Selfdestruct", "categories": [ "ACCESS_CONTROL" ] }
+
+
+
+def coordinator(run):
+    """A coordinator for member.hex in the cluster of rep.hex, with one deferred task."""
+    rep,member = run.tasks({ "rep.hex": "6080604052600a", "member.hex": "6080604052600b" })
+    enqueued = []
+    run.settings.clusters = { member.absfn: rep.absfn }
+    run.settings.deferred = { member.absfn: [ member ] }
+    return sb.analysis.Coordinator(run.settings, enqueued.append), rep, member, enqueued
+
+
+def test_same_categories_keep_member_in_cluster(run):
+    c,rep,member,enqueued = coordinator(run)
+    c.complete(rep, [ dict(REENTRANCY, line=12) ])
+    c.complete(member, [ dict(REENTRANCY, line=14), REENTRANCY ])
+    assert not c.promoted
+    assert enqueued == []
+
+
+def test_diverging_categories_promote_member(run):
+    c,rep,member,enqueued = coordinator(run)
+    c.complete(member, [ REENTRANCY ])
+    c.complete(rep, [ REENTRANCY, SELFDESTRUCT ])
+    assert c.promoted == { member.absfn }
+    assert enqueued == [ member ]
+    assert member.absfn not in run.settings.deferred
+
+
+def test_serve_replies_after_error(run):
+    c,rep,member,enqueued = coordinator(run)
+    proposals, replies = queue.Queue(), [ queue.Queue() ]
+    proposals.put((0, rep, [ None ])) # not a finding
+    proposals.put((0, member, [ REENTRANCY ]))
+    proposals.put(None)
+    c.serve(proposals, replies)
+    assert replies[0].get_nowait() == []
+    assert replies[0].get_nowait() == []
+    assert (member.absfn, member.toolid.split("-")[0]) in c.findings
@@ -0,0 +1,81 @@
+import os, types
+import pytest
+import sb.cfg, sb.docker
+
+USER = 1000 # the user running SmartBugs, while the files are written by root
+
+
+
+class Containers:
+    """Stands in for the containers of the Docker client; run() executes chown on the host."""
+
+    def __init__(self):
+        self.runs = []
+
+    def run(self, **args):
+        self.runs.append(args)
+        chown, _, owner, mountpoint = args["entrypoint"]
+        (root, _), = args["volumes"].items()
+        uid, gid = (int(i) for i in owner.split(":"))
+        for path,dirs,fns in os.walk(root):
+            for fn in [ path ] + [ os.path.join(path, f) for f in dirs + fns ]:
+                os.lchown(fn, uid, gid)
+
+
+@pytest.fixture
+def docker(monkeypatch):
+    if not hasattr(os, "getuid") or os.getuid() != 0:
+        pytest.skip("writing files as another user needs root")
+    containers = Containers()
+    monkeypatch.setattr(sb.docker, "client", lambda: types.SimpleNamespace(containers=containers))
+    monkeypatch.setattr(os, "getuid", lambda: USER)
+    monkeypatch.setattr(os, "getgid", lambda: USER)
+    return containers
+
+
+def task(rdir, **tool):
+    tool = dict({ "image": "smartbugs/manticore:0.3.7", "output": "/output", "output_include": None, "output_exclude": None }, **tool)
+    return types.SimpleNamespace(rdir=str(rdir), tool=types.SimpleNamespace(**tool))
+
+
+def written_by_root(root, files):
+    for fn in files:
+        fn = os.path.join(root, fn)
+        os.makedirs(os.path.dirname(fn), exist_ok=True)
+        with open(fn, "w") as f:
+            f.write(fn)
+    for path,dirs,fns in os.walk(root):
+        for fn in [ path ] + [ os.path.join(path, f) for f in dirs + fns ]:
+            os.lchown(fn, 0, 0)
+
+
+
+def test_prune_files_of_another_user(docker, tmp_path):
+    t = task(tmp_path, output_exclude=("*.state",))
+    root = sb.docker.output_dir(t)
+    written_by_root(root, [ "mcore/global.summary", "mcore/user_0.state" ])
+
+    assert getattr(sb.docker, "__prune_output")(t) == root
+
+    assert [ run["entrypoint"][:3] for run in docker.runs ] == [ [ "chown", "-R", f"{USER}:{USER}" ] ]
+    assert docker.runs[0]["volumes"] == { root: { "bind": "/reclaim", "mode": "rw" } }
+    assert os.listdir(os.path.join(root, "mcore")) == [ "global.summary" ]
+    assert os.stat(os.path.join(root, "mcore", "global.summary")).st_uid == USER
+
+
+def test_remove_output_of_another_user(docker, tmp_path):
+    t = task(tmp_path)
+    root = sb.docker.output_dir(t)
+    written_by_root(root, [ "mcore/global.summary" ])
+    sb.docker.remove_output(t)
+    assert not os.path.exists(root)
+    assert len(docker.runs) == 1
+
+
+def test_own_files_need_no_container(docker, tmp_path):
+    t = task(tmp_path)
+    root = sb.docker.output_dir(t)
+    written_by_root(root, [ "mcore/global.summary" ])
+    getattr(sb.docker, "__reclaim")(t, root)
+    getattr(sb.docker, "__reclaim")(t, root)
+    assert len(docker.runs) == 1
@@ -0,0 +1,89 @@
+import json, os
+import sb.benchmark, sb.journal, sb.smartbugs, sb.tasks
+from conftest import run_settings
+
+
+
+def records(fn):
+    """The records of a journal, None for one cut off."""
+    result = []
+    with open(fn) as f:
+        for line in f:
+            try:
+                result.append(json.loads(line))
+            except ValueError:
+                result.append(None)
+    return result
+
+
+def test_resume_after_crash(run):
+    sb.benchmark.fixtures(run.fixtures) # Mythril findings routed to Maian
+    sb.benchmark.contracts(str(run.dir / "contracts"), 3, 0)
+    run.settings.update({ "files": [ str(run.dir / "contracts" / "*.hex") ], "tools": [ "mythril" ], "processes": 1 })
+    sb.smartbugs.main(run.settings)
+    fn = sb.journal.path(run.settings)
+    done = sb.journal.Replay(fn)
+    assert done.pending() == []
+    assert len(done.finished) == 6
+
+    # crash while writing the record after the second Mythril task finished
+    with open(fn) as f:
+        lines = f.readlines()
+    finished = [ i for i,line in enumerate(lines) if '"finished"' in line and "mythril" in line ]
+    cut = finished[1] + 1
+    with open(fn, "w") as f:
+        f.writelines(lines[:cut])
+        f.write(lines[cut][:len(lines[cut]) // 2])
+    crashed = sb.journal.Replay(fn)
+    assert crashed.records == cut
+    # the follow-ups routed by finished tasks are on record before their finish
+    pending = sorted(os.path.relpath(task.rdir, run.dir / "results") for task in crashed.pending())
+    assert pending == [
+        "maian/test/c000000.hex/-c 0",
+        "maian/test/c000001.hex/-c 0",
+        "mythril-0.24.7/test/c000002.hex" ]
+
+    sb.journal.fds.clear()
+    sb.smartbugs.main(run_settings(run.dir, resume="test", processes=1))
+    resumed = sb.journal.Replay(fn)
+    assert resumed.pending() == []
+    assert resumed.finished == done.finished
+    # the pending tasks ran once more, with no record lost to the cut-off one
+    after = records(fn)[cut:]
+    assert after[0] is None and None not in after[1:]
+    rerun = sorted(rdir for rdir in done.finished if rdir not in crashed.finished)
+    for event in (sb.journal.ENQUEUED, sb.journal.STARTED, sb.journal.FINISHED):
+        rdirs = [ sb.journal.task_from_state(r["task"]).rdir if "task" in r else r["rdir"] for r in after[1:] if r["event"] == event ]
+        assert sorted(rdirs) == rerun
+
+
+def test_replay_orders_enqueued_and_finished(run, tmp_path):
+    a,b = run.tasks({ "a.hex": "6080604052600a", "b.hex": "6080604052600b" })
+    promoted = sb.tasks.replace(b, rdir=b.rdir + "-promoted")
+    deferred = sb.tasks.replace(b, rdir=b.rdir + "-deferred")
+    start = { "event": "run", "runid": "test", "files": [], "duplicates": {}, "clusters": { b.absfn: a.absfn },
+        "deferred": [ sb.journal.task_state(t) for t in (promoted, deferred) ] }
+    journal = [
+        dict(start, clusters={}, deferred=[]), # an earlier start, superseded
+        { "event": "enqueued", "task": sb.journal.task_state(b) },
+        start,
+        { "event": "enqueued", "task": sb.journal.task_state(a) },
+        { "event": "enqueued", "task": sb.journal.task_state(b) },
+        { "event": "finished", "rdir": a.rdir, "ok": False },
+        { "event": "finished", "rdir": b.rdir, "ok": True },
+        { "event": "enqueued", "task": sb.journal.task_state(promoted) },
+        { "event": "enqueued", "task": sb.journal.task_state(a) }, # retried, now last
+    ]
+    fn = tmp_path / "journal.jsonl"
+    fn.write_text("".join(json.dumps(r) + "\n" for r in journal))
+
+    replay = sb.journal.Replay(str(fn))
+    assert [ t.rdir for t in replay.pending() ] == [ promoted.rdir, a.rdir ]
+    assert replay.finished == { b.rdir }
+    assert { absfn: [ t.rdir for t in ts ] for absfn,ts in replay.deferred().items() } == { b.absfn: [ deferred.rdir ] }
+
+    tasks = sb.smartbugs.resume_tasks(replay, run.settings)
+    assert [ t.rdir for t in tasks ] == [ promoted.rdir, a.rdir ]
+    assert run.settings.clusters == { b.absfn: a.absfn }
+    assert [ t.rdir for t in run.settings.deferred[b.absfn] ] == [ deferred.rdir ]
+    assert "mythril|" in run.settings.tool_keys[b.absfn]
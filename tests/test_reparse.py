@@ -0,0 +1,52 @@
+import json, os
+import sb.cfg, sb.index, sb.reparse
+from conftest import MYTHRIL, record
+
+SELFDESTRUCT = { "title": "Unprotected Selfdestruct", "swc-id": "106", "severity": "High" }
+
+
+
+def result_dir(root):
+    """A result dir of Mythril on a.hex below root, not parsed yet."""
+    record(root, "a.hex", [ SELFDESTRUCT ])
+    d = os.path.join(root, MYTHRIL["id"], "recorded", "a.hex")
+    fn = os.path.join(d, sb.cfg.TASK_LOG)
+    with open(fn) as f:
+        task_log = json.load(f)
+    task_log["tool"]["parser"] = sb.cfg.TOOL_PARSER
+    with open(fn, "w") as f:
+        json.dump(task_log, f)
+    return d
+
+
+def touch(fn):
+    st = os.stat(fn)
+    os.utime(fn, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+
+def test_manifest_entry_is_stale_after_log_changes(tmp_path):
+    d = result_dir(str(tmp_path))
+    status, entry = sb.reparse.reparse(d, False, False, True, False)
+    assert status == "parsed"
+    assert sb.reparse.up_to_date(entry, d, os.listdir(d), False, {})
+    assert sb.reparse.reparse(d, False, False, True, False)[0] == "skipped"
+
+    touch(os.path.join(d, sb.cfg.TOOL_LOG))
+    assert not sb.reparse.up_to_date(entry, d, os.listdir(d), False, {})
+    assert sb.reparse.reparse(d, False, False, True, False)[0] == "parsed"
+
+
+def test_index_row_is_stale_after_log_changes(tmp_path):
+    d = result_dir(str(tmp_path))
+    sb.index.rebuild(str(tmp_path))
+    sb.reparse.reparse(d, False, False, True, False, str(tmp_path))
+    row, = sb.index.rows(str(tmp_path))
+    assert sb.reparse.indexed_up_to_date(row, d, False, {})
+
+    touch(os.path.join(d, sb.cfg.TOOL_LOG))
+    assert not sb.reparse.indexed_up_to_date(row, d, False, {})
+    # a rebuilt index does not vouch for a result.json older than the log
+    sb.index.rebuild(str(tmp_path))
+    row, = sb.index.rows(str(tmp_path))
+    assert not sb.reparse.indexed_up_to_date(row, d, False, {})
@@ -0,0 +1,8 @@
+import sb.smartbugs
+
+
+
+def test_follow_up_runs_the_mode_of_the_contract(run):
+    task, = run.tasks({ "a.hex": "6080604052600a" })
+    follow_up = sb.smartbugs.collect_single_task(task.absfn, task.relfn, "maian", run.settings, "-c 0")
+    assert (follow_up.toolid, follow_up.toolmode) == ("maian", "bytecode")
@@ -1,6 +1,4 @@
-import io
 import json
-import tarfile
 import sb.parse_utils
 
 VERSION = "2022/12/31"
@@ -45,9 +43,10 @@ def parse(exit_code, log, output):
 
     if output:
         try:
-            with io.BytesIO(output) as o, tarfile.open(fileobj=o) as tar:
-                file = tar.extractfile("results.json")
-                results = json.load(file)
+            with sb.parse_utils.OutputFiles(output) as files:
+                # results.json in older archives, results/results.json when archived from the mount
+                fn = next(fn for fn in files.names() if fn == "results.json" or fn.endswith("/results.json"))
+                results = json.loads(files.read(fn))
 
                 for contract, data in results.items():
                     for errs in data['errors'].values():
@@ -7,7 +7,7 @@ MAIN="$4"
 ARGS="${5:-}"
 
 export PATH="$BIN:$PATH"
-chmod +x "$BIN/solc"
+[ -x "$BIN/solc" ] || chmod +x "$BIN/solc"
 
 CONTRACT="${FILENAME%.sol}"
 CONTRACT="${CONTRACT##*/}"
@@ -33,5 +33,6 @@ if [ "$TIMEOUT" -gt 0 ] && [ $TO -ge 10 ]; then
     OPT_TIMEOUT="--timeout $TO"
 fi
 
-touch /root/results.json
-python3 fuzzer/main.py -s "$FILENAME" --evm byzantium --results results.json --seed 1427655 $OPT_TIMEOUT $OPT_CONTRACT $ARGS
+mkdir -p /results
+touch /results/results.json
+python3 fuzzer/main.py -s "$FILENAME" --evm byzantium --results /results/results.json --seed 1427655 $OPT_TIMEOUT $OPT_CONTRACT $ARGS
@@ -1,4 +1,4 @@
-import io, tarfile, yaml
+import yaml
 import sb.parse_utils
 
 VERSION = "2022/11/17"
@@ -39,13 +39,13 @@ def parse(exit_code, log, output):
         errors.add("solc error")
 
     try:
-        with io.BytesIO(output) as o, tarfile.open(fileobj=o) as tar:
-            for fn in tar.getnames():
+        with sb.parse_utils.OutputFiles(output) as files:
+            for fn in files.names():
                 if not fn.endswith("/global.findings"):
                     continue
 
                 try:
-                    contents = tar.extractfile(fn).read()
+                    contents = files.read(fn)
                     manticore_findings = parse_file(contents.splitlines())
                 except Exception as e:
                     fails.add(f"problem extracting {fn} from output archive: {e}")
@@ -54,7 +54,7 @@ def parse(exit_code, log, output):
                 cmd = None
                 try:
                     fn = fn.replace("/global.findings","/manticore.yml")
-                    cmd = yaml.safe_load(tar.extractfile(fn).read())
+                    cmd = yaml.safe_load(files.read(fn))
                 except Exception as e:
                     infos.add(f"manticore.yml not found")
 
@@ -5,9 +5,9 @@ BIN="$2"
 ARGS="${3:-}"
 
 export PATH="$BIN:$PATH"
-chmod +x "$BIN/solc"
+[ -x "$BIN/solc" ] || chmod +x "$BIN/solc"
 
-mkdir /results
+mkdir -p /results
 
 for c in `python3 "$BIN/printContractNames.py" "${FILENAME}"`; do 
         if [ -n "$ARGS" ]; then
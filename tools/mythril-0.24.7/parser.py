@@ -3,6 +3,8 @@ import sb.parse_utils
 
 VERSION = "2024/03/24"
 
+PROTOCOL = 2
+
 FINDINGS = {
     "Jump to an arbitrary instruction (SWC 127)",
     "Write to an arbitrary storage location (SWC 124)",
@@ -27,7 +29,14 @@ FINDINGS = {
 def parse(exit_code, log, output):
 
     findings, infos = [], set()
-    errors, fails = sb.parse_utils.errors_fails(exit_code, log)
+    scan = sb.parse_utils.Scan(exit_code, log)
+    aborted, last = False, None
+    for line in scan:
+        if "Exception occurred, aborting analysis." in line:
+            aborted = True
+        last = line
+
+    errors, fails = scan.errors_fails()
     errors.discard("EXIT_CODE_1") # exit code = 1 just means that a weakness has been found
 
     # Mythril catches all exceptions, prints a message "please report", and then prints the traceback.
@@ -37,15 +46,13 @@ def parse(exit_code, log, output):
             fails.remove(f)
             fails.add("exception (mythril.laser.ethereum.transaction.transaction_models.TransactionEndSignal)")
 
-    for line in log:
-        if "Exception occurred, aborting analysis." in line:
-            infos.add("analysis incomplete")
-            if not fails and not errors:
-                fails.add("execution failed")
-                break
+    if aborted:
+        infos.add("analysis incomplete")
+        if not fails and not errors:
+            fails.add("execution failed")
 
     try:
-        result = json.loads(log[-1])
+        result = json.loads(last)
     except:
         result = None
     if result:
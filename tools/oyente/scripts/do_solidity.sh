@@ -7,7 +7,7 @@ MAIN="$4"
 ARGS="${5:-}"
 
 export PATH="$BIN:$PATH"
-chmod +x "$BIN/solc"
+[ -x "$BIN/solc" ] || chmod +x "$BIN/solc"
 
 CONTRACT="${FILENAME%.sol}"
 CONTRACT="${CONTRACT##*/}"
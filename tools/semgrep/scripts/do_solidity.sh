@@ -6,6 +6,6 @@ BIN="$3"
 ARGS="${4:-}"
 
 export PATH="$BIN:$PATH"
-chmod +x "$BIN/solc"
+[ -x "$BIN/solc" ] || chmod +x "$BIN/solc"
 
 semgrep --config ./solidity "$FILENAME" $ARGS
@@ -7,6 +7,6 @@ ARGS="$4"
 
 
 export PATH="$BIN:$PATH"
-chmod +x "$BIN/solc"
+[ -x "$BIN/solc" ] || chmod +x "$BIN/solc"
 
 slither "$FILENAME" --json /output.json $ARGS
@@ -2,6 +2,8 @@ import sb.parse_utils
 
 VERSION = "2022/11/14"
 
+PROTOCOL = 2
+
 FINDINGS = {
     "SOLIDITY_ADDRESS_HARDCODED",
     "SOLIDITY_ARRAY_LENGTH_MANIPULATION",
@@ -53,9 +55,9 @@ FINDINGS = {
 
 def parse(exit_code, log, output):
     findings, infos = [], set()
-    errors, fails = sb.parse_utils.errors_fails(exit_code, log)
+    scan = sb.parse_utils.Scan(exit_code, log)
 
-    for line in log:
+    for line in scan:
         i = line.find(": ")
         if i >= 0:
             k = line[0:i].strip()
@@ -68,4 +70,5 @@ def parse(exit_code, log, output):
             elif k in ("severity", "line", "column"):
                 finding[k] = v
 
+    errors, fails = scan.errors_fails()
     return findings, infos, errors, fails
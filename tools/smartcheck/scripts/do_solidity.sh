@@ -5,7 +5,7 @@ BIN="$2"
 ARGS="${3:-}"
 
 export PATH="$BIN:$PATH"
-chmod +x "$BIN/solc"
+[ -x "$BIN/solc" ] || chmod +x "$BIN/solc"
 
 if [ -n "$ARGS" ]; then
     smartcheck -p "$FILENAME" $ARGS
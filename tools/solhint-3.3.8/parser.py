@@ -2,6 +2,8 @@ import sb.parse_utils
 
 VERSION = "2023/02/12"
 
+PROTOCOL = 2
+
 FINDINGS = {
     "array-declaration-spaces",
     "avoid-call-value",
@@ -63,9 +65,9 @@ FINDINGS = {
 
 def parse(exit_code, log, output):
     findings, infos = [], set()
-    errors, fails = sb.parse_utils.errors_fails(exit_code, log)
+    scan = sb.parse_utils.Scan(exit_code, log)
 
-    for line in log:
+    for line in scan:
         if ":" in line:
             s_result = line.split(":")
             if len(s_result) != 4:
@@ -85,4 +87,5 @@ def parse(exit_code, log, output):
                 "name": name
             })
 
+    errors, fails = scan.errors_fails()
     return findings, infos, errors, fails
@@ -5,6 +5,6 @@ BIN="$2"
 ARGS="${3:-}"
 
 export PATH="$BIN:$PATH"
-chmod +x "$BIN/solc"
+[ -x "$BIN/solc" ] || chmod +x "$BIN/solc"
 
 solhint -f unix "$FILENAME" $ARGS